@@ -0,0 +1,320 @@
+"""Offline benchmarks for net-dl.
+
+Serves generated files from the test suite's local HTTP server, run in a
+separate process so that its CPU time isn't counted, and times downloads
+made with Download.get_file, get_content, stream_to and get_text. Results
+are written as JSON so they can be compared across releases.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_download --output results.json
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from queue import Queue
+
+from src.net_dl import __version__
+from src.net_dl.download import Download
+from src.net_dl.ratelimit import parse_rate
+from src.net_dl.retry import RetryPolicy
+from src.net_dl.session import Session
+
+METHODS = ('file', 'content', 'stream', 'text')
+# Server behaviour for each scenario; see LocalServer.add_file.
+SCENARIOS = {
+    'plain': dict(),
+    'chunked': {'chunked': True},
+    'latency': {'latency': 0.05},
+    'bandwidth': {'bandwidth': 50 * 1024**2},
+    'drops': {'drops': 2},
+}
+DEFAULT_SIZES = ('1M', '16M', '64M')
+DEFAULT_CHUNK_SIZES = ('auto', '8k', '64k', '1M')
+
+
+def make_content(size):
+    """Return size bytes of reproducible random data."""
+    return random.Random(size).getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def serve(conn, files):
+    """Run a LocalServer in this process until told to stop.
+
+    files maps paths to (size, options). Sends back the server's base URL.
+    """
+    from test.server import LocalServer
+    server = LocalServer().start()
+    contents = dict()
+    for path, (size, options) in files.items():
+        if size not in contents:
+            contents[size] = make_content(size)
+        options = dict(options)
+        drops = options.pop('drops', 0)
+        if drops:
+            # Cut the connection after each equal share of the file.
+            options['faults'] = [('drop', size // (drops + 1))] * drops
+        options.setdefault('accept_ranges', True)
+        server.add_file(path, contents.get(size), **options)
+    conn.send(server.url(''))
+    conn.recv()  # wait for stop
+    server.stop()
+
+
+class _TimedDownload(Download):
+    """Records when the first byte of content arrives."""
+    first_byte = None
+
+    def _update_progress(self, nbytes):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+        super()._update_progress(nbytes)
+
+    def _iter_response(self, r):
+        for chunk in super()._iter_response(r):
+            if self.first_byte is None:
+                self.first_byte = time.perf_counter()
+            yield chunk
+
+
+class _HashSink:
+    """Writable sink that only hashes the data written to it."""
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.hasher.update(data)
+
+
+def _get_sha256(data):
+    if data is None:
+        return None
+    if isinstance(data, bytes):
+        data = hashlib.sha256(data)
+    return data.hexdigest()
+
+
+def _read_io_counts():
+    """Return the number of read and write syscalls made so far by this
+    process, or (None, None) where /proc isn't available.
+    """
+    try:
+        stats = dict(
+            line.split(':') for line in Path('/proc/self/io').read_text().splitlines()  # noqa: E501
+        )
+    except OSError:
+        return None, None
+    return int(stats.get('syscr')), int(stats.get('syscw'))
+
+
+def run_once(url, method, chunk_size, destdir, trace_memory=False):
+    """Download url once; return the measurements."""
+    d = _TimedDownload(
+        url,
+        destdir=destdir,
+        chunk_size=chunk_size,
+        progress_queue=Queue(),
+        retries=RetryPolicy(backoff=0.01),
+        session=Session(),
+    )
+    if trace_memory:
+        tracemalloc.start()
+    reads, writes = _read_io_counts()
+    cpu = time.process_time()
+    d.started = time.perf_counter()
+    if method == 'file':
+        d.get()
+        data = d.dest.path.read_bytes()
+        d.dest.path.unlink()
+    elif method == 'content':
+        data = d.get_content()
+    elif method == 'stream':
+        sink = _HashSink()
+        d.stream_to(sink)
+        data = sink.hasher
+    else:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            d.get_text()
+        data = None
+    seconds = time.perf_counter() - d.started
+    cpu = time.process_time() - cpu
+    reads2, writes2 = _read_io_counts()
+    result = {
+        'seconds': seconds,
+        'ttfb': d.first_byte - d.started if d.first_byte else None,
+        'cpu_seconds': cpu,
+        'syscalls_read': reads2 - reads if reads is not None else None,
+        'syscalls_write': writes2 - writes if writes is not None else None,
+        'sha256': _get_sha256(data),
+    }
+    if trace_memory:
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    d.session.close()
+    return result
+
+
+def run_benchmarks(sizes, chunk_sizes, methods, scenarios, repeat=1):
+    """Run every combination of the given parameters; return a list of
+    result dicts.
+    """
+    files = dict()
+    cases = list()
+    for scenario in scenarios:
+        options = SCENARIOS.get(scenario)
+        for size in sizes:
+            for method in methods:
+                if options.get('drops') and method != 'file':
+                    continue  # only get_file reconnects
+                for chunk_size in chunk_sizes:
+                    cases.append((scenario, size, method, chunk_size))
+                    # Each run gets its own path, since injected faults are
+                    # used up by the first request that hits them.
+                    for i in range(repeat + 1):
+                        path = _get_path(scenario, size, method, chunk_size, i)  # noqa: E501
+                        files[path] = (size, dict(options))
+                        if method == 'text':
+                            files[path][1]['content_type'] = 'text/plain'
+
+    ctx = multiprocessing.get_context('spawn')
+    conn, child_conn = ctx.Pipe()
+    server = ctx.Process(target=serve, args=(child_conn, files), daemon=True)
+    server.start()
+    base_url = conn.recv()
+    results = list()
+    try:
+        with tempfile.TemporaryDirectory() as destdir:
+            for scenario, size, method, chunk_size in cases:
+                expected = hashlib.sha256(make_content(size)).hexdigest()
+                urls = [
+                    base_url + _get_path(scenario, size, method, chunk_size, i)
+                    for i in range(repeat + 1)
+                ]
+                runs = [
+                    run_once(url, method, chunk_size, destdir)
+                    for url in urls[:-1]
+                ]
+                best = min(runs, key=lambda r: r.get('seconds'))
+                # Memory is traced in a separate run; tracing slows it down.
+                memory = run_once(
+                    urls[-1], method, chunk_size, destdir, trace_memory=True
+                )
+                result = {
+                    'method': method,
+                    'scenario': scenario,
+                    'size': size,
+                    'chunk_size': chunk_size or 'auto',
+                    'repeat': repeat,
+                    'seconds': best.get('seconds'),
+                    'throughput': size / best.get('seconds'),
+                    'ttfb': best.get('ttfb'),
+                    'cpu_per_gb': best.get('cpu_seconds') / size * 1e9,
+                    'peak_memory': memory.get('peak_memory'),
+                    'syscalls_read': best.get('syscalls_read'),
+                    'syscalls_write': best.get('syscalls_write'),
+                    'ok': best.get('sha256') in (expected, None),
+                }
+                results.append(result)
+                print(_format_result(result), file=sys.stderr)
+    finally:
+        conn.send('stop')
+        server.join(timeout=10)
+    return results
+
+
+def _get_path(scenario, size, method, chunk_size, run):
+    ext = '.txt' if method == 'text' else '.bin'
+    return f"/{scenario}-{size}-{method}-{chunk_size or 'auto'}-{run}{ext}"
+
+
+def _format_result(r):
+    ttfb = f"{r.get('ttfb') * 1000:.1f} ms" if r.get('ttfb') else '-'
+    return (
+        f"{r.get('method'):7} {r.get('scenario'):9} {r.get('size'):>10} B "
+        f"chunk={r.get('chunk_size'):<7} "
+        f"{r.get('throughput') / 1024**2:8.1f} MiB/s ttfb={ttfb:>9} "
+        f"cpu/GB={r.get('cpu_per_gb'):.2f} s "
+        f"peak={(r.get('peak_memory') or 0) / 1024**2:.1f} MiB "
+        f"{'ok' if r.get('ok') else 'MISMATCH'}"
+    )
+
+
+def _parse_size(value):
+    if value == 'auto':
+        return None
+    return int(parse_rate(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_download",
+        description="Benchmark net-dl against a local HTTP server.",
+    )
+    parser.add_argument(
+        '--sizes', nargs='+', default=DEFAULT_SIZES,
+        help=f"file sizes to download [default={' '.join(DEFAULT_SIZES)}]",
+    )
+    parser.add_argument(
+        '--chunk-sizes', nargs='+', default=DEFAULT_CHUNK_SIZES,
+        help=f"read sizes to use; 'auto' is adaptive [default={' '.join(DEFAULT_CHUNK_SIZES)}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--methods', nargs='+', default=METHODS, choices=METHODS,
+        help="Download methods to time [default=all]",
+    )
+    parser.add_argument(
+        '--scenarios', nargs='+', default=list(SCENARIOS),
+        choices=list(SCENARIOS),
+        help="server behaviours to test [default=all]",
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="runs per case; the fastest is reported [default=3]",
+    )
+    parser.add_argument(
+        '-o', '--output', type=Path,
+        help="write JSON results to this file instead of stdout",
+    )
+    args = parser.parse_args()
+    # Injected faults would otherwise log a retry warning on every run.
+    logging.basicConfig(level=logging.ERROR)
+
+    results = run_benchmarks(
+        sizes=[_parse_size(s) for s in args.sizes],
+        chunk_sizes=[_parse_size(c) for c in args.chunk_sizes],
+        methods=args.methods,
+        scenarios=args.scenarios,
+        repeat=args.repeat,
+    )
+    report = {
+        'net_dl_version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    }
+    text = json.dumps(report, indent=1)
+    if args.output:
+        args.output.write_text(text + '\n')
+    else:
+        print(text)
+    return 0 if all(r.get('ok') for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
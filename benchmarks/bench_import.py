@@ -0,0 +1,115 @@
+"""Import-time benchmark for net-dl.
+
+Times fresh interpreters that import net_dl or run `net-dl --version`,
+compared with one that does nothing, and lists any heavy dependencies that
+were loaded along the way. Exits with status 1 if a limit given with
+--max-ms is exceeded or a heavy dependency is loaded, so that it can guard
+against regressions in CI.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import --max-ms 50
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules that should only be imported once a transfer starts.
+HEAVY_MODULES = ('aiohttp', 'charset_normalizer', 'requests', 'urllib3')
+
+CASES = {
+    'baseline': "pass",
+    'import': "import src.net_dl",
+    'version': (
+        "import sys; sys.argv = ['net-dl', '--version']\n"
+        "import src.net_dl\n"
+        "try:\n"
+        "    src.net_dl.main()\n"
+        "except SystemExit:\n"
+        "    pass"
+    ),
+}
+
+
+def time_case(code, repeat):
+    """Return the median wall time of running code in a new interpreter."""
+    times = list()
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def get_loaded_modules(code):
+    """Return the heavy modules that are loaded after running code."""
+    check = (
+        f"{code}\n"
+        "import json, sys\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"  # noqa: E501
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', check],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def run_benchmarks(repeat=10):
+    """Time each case; return a list of result dicts."""
+    results = list()
+    baseline = time_case(CASES.get('baseline'), repeat)
+    for name, code in CASES.items():
+        if name == 'baseline':
+            continue
+        seconds = time_case(code, repeat)
+        results.append({
+            'case': name,
+            'seconds': seconds,
+            'overhead': max(0.0, seconds - baseline),
+            'heavy_modules': get_loaded_modules(code),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench_import",
+        description="Measure how long net-dl takes to import.",
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=10,
+        help="runs per case; the median is reported [default=10]",
+    )
+    parser.add_argument(
+        '--max-ms', type=float,
+        help="fail if a case takes more than this many ms longer than an empty interpreter",  # noqa: E501
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(repeat=args.repeat)
+    status = 0
+    for r in results:
+        overhead = r.get('overhead') * 1000
+        heavy = ', '.join(r.get('heavy_modules')) or '-'
+        print(
+            f"{r.get('case'):<8} {r.get('seconds') * 1000:7.1f} ms "
+            f"(+{overhead:.1f} ms) heavy modules: {heavy}",
+            file=sys.stderr,
+        )
+        if r.get('heavy_modules'):
+            status = 1
+        if args.max_ms is not None and overhead > args.max_ms:
+            status = 1
+    print(json.dumps(results, indent=1))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
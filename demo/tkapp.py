@@ -42,7 +42,7 @@ class Win(ttk.Frame):
         self.get_thread.start()
 
     def update_progress(self, evt):
-        self.progv.set(self.progq.get())
+        self.progv.set(self.progq.get().percent or 0)
 
 
 def run():
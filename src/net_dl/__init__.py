@@ -5,45 +5,254 @@ depends on the value of 'Content-Type' in the URL's response headers.
 """
 
 import argparse
+import json
 import logging
+from importlib import import_module
 from pathlib import Path
 from os import getcwd
 from sys import exit as sys_exit
 from sys import stderr
+from sys import stdin
+from sys import stdout
 
 from . import config
-from .download import Download
+from .checksum import parse_checksum
+from .ratelimit import RateLimiter
+from .ratelimit import parse_rate
+from .writer import parse_fsync
 
-__all__ = ('Download')
+__all__ = (
+    'AsyncDownload',
+    'ContentStore',
+    'DaemonClient',
+    'Download',
+    'DownloadDaemon',
+    'DownloadGroup',
+    'DownloadStats',
+    'Manifest',
+    'Progress',
+    'RateLimiter',
+    'RecursiveDownload',
+    'Session',
+    'ValidatorCache',
+)
 __version__ = '0.2.3'
 
+# Public classes and the modules they're imported from on first use, so that
+# importing net_dl (or running `net-dl --help`) doesn't load requests or
+# aiohttp until a download actually needs them.
+_LAZY_IMPORTS = {
+    'AsyncDownload': 'aio',
+    'ContentStore': 'store',
+    'DaemonClient': 'daemon',
+    'Download': 'download',
+    'DownloadDaemon': 'daemon',
+    'DownloadGroup': 'group',
+    'DownloadStats': 'stats',
+    'Manifest': 'manifest',
+    'Progress': 'progress',
+    'RateLimiter': 'ratelimit',
+    'RecursiveDownload': 'recursive',
+    'Session': 'session',
+    'ValidatorCache': 'cache',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = import_module(f".{_LAZY_IMPORTS.get(name)}", __name__)
+        return getattr(module, name)
+    if not name.startswith('_'):
+        # Submodules, e.g. net_dl.download, are loaded on first use too.
+        try:
+            return import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
+
+def read_url_list(path):
+    """Return the URLs listed in a file, skipping blank and comment lines.
+
+    A line may list several mirrors of the same file, separated by spaces or
+    tabs; these are returned as a tuple.
+    """
+    if path == '-':
+        lines = stdin.read().splitlines()
+    else:
+        lines = Path(path).read_text().splitlines()
+    urls = list()
+    for line in lines:
+        if not line.strip() or line.strip().startswith('#'):
+            continue
+        mirrors = tuple(line.split())
+        urls.append(mirrors[0] if len(mirrors) == 1 else mirrors)
+    return urls
+
+
+def write_stats(path, stats):
+    """Append each DownloadStats (or dict of stats) in stats to a file as a
+    line of JSON ("-" writes to stdout).
+    """
+    lines = ''.join(
+        f"{json.dumps(s) if isinstance(s, dict) else s.to_json()}\n"
+        for s in stats
+    )
+    if path == '-':
+        stdout.write(lines)
+        stdout.flush()
+        return
+    with Path(path).open('a') as f:
+        f.write(lines)
+
 
 def main():
     parser = argparse.ArgumentParser(prog="net-dl")
     parser.add_argument(
-        'url', metavar='URL', type=str, nargs='?',
+        'url', metavar='URL', type=str, nargs='*',
         help="source URL(s) to download from",
     )
+    parser.add_argument(
+        '-A', '--accept', metavar='PATTERN', action='append', default=list(),
+        help="with --recursive, only download files whose name or relative path matches PATTERN, e.g. '*.iso' (can be repeated)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--cache', metavar='FILE', nargs='?', const=True,
+        help=f"skip files unchanged on the server since they were last downloaded, using validators stored in FILE [default={config.VALIDATOR_CACHE_FILE}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--checksum', type=str,
+        help="verify the downloaded file against ALGORITHM:HEXDIGEST (md5, sha256, sha512)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--compressed', action='store_true',
+        help="ask the server to compress the transfer; the file is saved decompressed",  # noqa: E501
+    )
     parser.add_argument(
         '-c', '--continue-download', action='store_true',
         help="attempt to resume a partially-downloaded file"
     )
+    parser.add_argument(
+        '--delta', metavar='INDEX_URL', nargs='?', const=True,
+        help=f"update an existing copy of the file by downloading only the blocks that changed, using the block index at INDEX_URL [default=URL{config.DELTA_INDEX_SUFFIX}]",  # noqa: E501
+    )
     parser.add_argument(
         '-d', '--output-directory', type=Path,
         help="destination folder for downloaded file(s)",
     )
     parser.add_argument(
-        '-H', '--header', action='append', default=dict(),
+        '--extract', metavar='DIR', type=Path,
+        help="unpack the downloaded tar (optionally gzip, bzip2 or xz compressed) or zip archive into DIR while it downloads; the archive itself is deleted unless --keep-archive is given",  # noqa: E501
+    )
+    parser.add_argument(
+        '--fsync', type=str, default=config.FSYNC,
+        help=f"when to sync downloaded data to disk: none, end, or every SIZE bytes (e.g. 64M) [default={config.FSYNC}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '-H', '--header', action='append', default=list(),
         help="add header to the server request (can be repeated): \"X-First-Name: Joe\""  # noqa: E501
     )
+    parser.add_argument(
+        '-i', '--input-file', type=str,
+        help="read URLs from file, one per line (\"-\" reads from stdin)",
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=config.GROUP_WORKERS,
+        help=f"max. simultaneous downloads of multiple URLs [default={config.GROUP_WORKERS}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--keep-archive', action='store_true',
+        help="with --extract, keep the downloaded archive too",
+    )
+    parser.add_argument(
+        '-l', '--level', type=int, default=config.RECURSIVE_DEPTH,
+        help=f"with --recursive, max. number of folder levels to follow; -1 for no limit [default={config.RECURSIVE_DEPTH}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--limit-rate', type=str,
+        help="cap the combined download rate in bytes/s; k, M, G suffixes are accepted (e.g. 2M)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--make-delta-index', metavar='FILE',
+        help=f"write the block index of FILE to FILE{config.DELTA_INDEX_SUFFIX}, for publishing next to it (see --delta), and exit",  # noqa: E501
+    )
+    parser.add_argument(
+        '--manifest', metavar='FILE',
+        help="verify the files listed in a checksum manifest (e.g. SHA256SUMS, given as a path or URL) and download those that are missing or don't match; files are fetched relative to the manifest's URL, or to URL if given",  # noqa: E501
+    )
+    parser.add_argument(
+        '-m', '--mirror', action='append', default=list(),
+        help="another URL of the same file (can be repeated); the fastest mirrors are used and failing ones dropped",  # noqa: E501
+    )
     parser.add_argument(
         '-n', '--filename', type=str,
         help="downloaded file's name (overrides name given by server)",
     )
+    parser.add_argument(
+        '-r', '--recursive', action='store_true',
+        help="mirror a directory listing (e.g. an Apache or nginx index page) and its subfolders, skipping files whose size and modification time already match",  # noqa: E501
+    )
+    parser.add_argument(
+        '-R', '--reject', metavar='PATTERN', action='append', default=list(),
+        help="with --recursive, skip files and folders whose name or relative path matches PATTERN (can be repeated)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--retries', type=int, default=config.RETRIES,
+        help=f"max. number of times to reconnect after a failed transfer [default={config.RETRIES}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '-s', '--segments', type=int, default=1,
+        help="download file in N parallel byte-range segments [default=1]",
+    )
+    parser.add_argument(
+        '--serve', metavar='ADDRESS', nargs='?', const=True,
+        help=f"run as a daemon that downloads URLs sent by 'net-dl --use-daemon', sharing connections and the -j, --per-host and --limit-rate limits; ADDRESS is a Unix socket path (only usable by this user) or a localhost port (clients must send the token written to {config.DAEMON_TOKEN_FILE}) [default={config.DAEMON_SOCKET}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--speed-limit', type=str, default=str(config.SPEED_LIMIT),
+        help=f"reconnect if the rate stays below this many bytes/s for --speed-time seconds; 0 disables [default={config.SPEED_LIMIT}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--speed-time', type=float, default=config.SPEED_TIME,
+        help=f"see --speed-limit [default={config.SPEED_TIME}]",
+    )
+    parser.add_argument(
+        '--stats-json', metavar='FILE',
+        help="append timings and transfer statistics of each download to FILE as JSON lines (\"-\" writes to stdout)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--store', metavar='DIR', nargs='?', const=True,
+        help=f"reuse identical files already downloaded (matched by digest) from a content store in DIR, and add new downloads to it [default={config.STORE_DIR}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--store-max-size', type=str,
+        help="max. total size of the content store; k, M, G suffixes are accepted [default=10G]",  # noqa: E501
+    )
     parser.add_argument(
         '-t', '--timeout', type=int,
         help=f"set server timeout in seconds [default={config.HTTP_TIMEOUT}]",
     )
+    parser.add_argument(
+        '--per-host', type=int, default=config.GROUP_PER_HOST,
+        help=f"max. simultaneous downloads from one host [default={config.GROUP_PER_HOST}]",  # noqa: E501
+    )
+    parser.add_argument(
+        '--no-head', action='store_true',
+        help="skip the HEAD request and take file details from the download's own response",  # noqa: E501
+    )
+    parser.add_argument(
+        '--no-keepalive', action='store_true',
+        help="close each connection after its request instead of reusing it",
+    )
+    parser.add_argument(
+        '--use-daemon', metavar='ADDRESS', nargs='?', const=True,
+        help="have a running 'net-dl --serve' daemon download the URL(s) and wait for them; content is always saved as a file",  # noqa: E501
+    )
     parser.add_argument(
         '-v', '--verbose', action='store_true',
         help="verbose output",
@@ -56,6 +265,18 @@ def main():
     )
 
     args = parser.parse_args()
+    # Imported only now, so that --help and --version stay quick.
+    from .daemon import JOB_OPTIONS
+    from .daemon import DaemonClient
+    from .daemon import DaemonError
+    from .daemon import DownloadDaemon
+    from .download import Download
+    from .group import DownloadGroup
+    from .manifest import Manifest
+    from .recursive import RecursiveDownload
+    from .session import Session
+    from .store import ContentStore
+
     destdir = getcwd()
     resume = False
 
@@ -81,18 +302,196 @@ def main():
     destname = None
     if args.filename:
         destname = args.filename
+    urls = list(args.url)
+    if args.input_file:
+        urls.extend(read_url_list(args.input_file))
+    if args.make_delta_index:
+        from .delta import BlockIndex
+        path = Path(args.make_delta_index)
+        index_path = path.with_name(f"{path.name}{config.DELTA_INDEX_SUFFIX}")
+        try:
+            BlockIndex.build(path).save(index_path)
+        except OSError as e:
+            logging.error(f"Could not write block index: {e}")
+            return 1
+        logging.info(f"Block index saved as: {index_path}")
+        return 0
+    if not urls and not args.manifest and not args.serve:
+        parser.error("no URL given")
+    if args.manifest and len(urls) > 1:
+        parser.error("--manifest can only be used with a single base URL")
+    if args.checksum and len(urls) > 1:
+        parser.error("--checksum can only be used with a single URL")
+    if args.recursive and len(urls) > 1:
+        parser.error("--recursive can only be used with a single URL")
+    if isinstance(args.delta, str) and len(urls) > 1:
+        parser.error("--delta INDEX_URL can only be used with a single URL")
+    if args.mirror and len(urls) > 1:
+        parser.error("--mirror can only be used with a single URL")
+    mirrors = list(args.mirror)
+    if len(urls) == 1 and not isinstance(urls[0], str):
+        # Mirrors of a single file listed in the input file.
+        mirrors.extend(urls[0][1:])
+        urls[0] = urls[0][0]
+    if args.checksum:
+        try:
+            parse_checksum(args.checksum)
+        except ValueError as e:
+            parser.error(str(e))
+    rate_limiter = None
+    if args.limit_rate:
+        try:
+            rate_limiter = RateLimiter(args.limit_rate)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        fsync = parse_fsync(args.fsync)
+    except ValueError as e:
+        parser.error(str(e))
+    speed_limit = 0
+    if args.speed_limit.strip() != '0':
+        try:
+            speed_limit = parse_rate(args.speed_limit)
+        except ValueError as e:
+            parser.error(str(e))
+    store = None
+    if args.store:
+        store_kwargs = dict()
+        if args.store is not True:
+            store_kwargs['path'] = args.store
+        if args.store_max_size:
+            try:
+                store_kwargs['max_size'] = int(parse_rate(args.store_max_size))
+            except ValueError:
+                parser.error(f"Invalid size: {args.store_max_size}")
+        store = ContentStore(**store_kwargs)
+    session = Session(
+        pool_size=max(config.POOL_SIZE, args.segments, args.per_host),
+        keep_alive=not args.no_keepalive,
+    )
     headers = {}
     for hstr in args.header:
-        k, v = hstr.split(':')
+        k, v = hstr.split(':', 1)
         headers[k.strip()] = v.strip()
+    download_kwargs = dict(
+        destdir=destdir,
+        request_headers=headers,
+        resume=resume,
+        segments=args.segments,
+        rate_limit=rate_limiter,
+        retries=args.retries,
+        speed_limit=speed_limit,
+        speed_time=args.speed_time,
+        fsync=fsync,
+        validator_cache=args.cache,
+        store=store,
+        head_request=not args.no_head,
+        compress=args.compressed,
+        delta=args.delta,
+        extract_to=args.extract,
+        keep_archive=args.keep_archive,
+    )
+    task = None
     try:
-        return Download(
-            url=args.url,
-            destdir=destdir,
+        if args.serve:
+            download_kwargs.pop('destdir')  # each job has its own
+            try:
+                daemon = DownloadDaemon(
+                    None if args.serve is True else args.serve,
+                    workers=args.jobs,
+                    per_host=args.per_host,
+                    session=session,
+                    **download_kwargs,
+                )
+                daemon.serve_forever()
+            except (OSError, ValueError) as e:
+                logging.error(f"Could not start daemon: {e}")
+                return 1
+            return 0
+        if args.use_daemon:
+            options = {
+                k: v for k, v in download_kwargs.items() if k in JOB_OPTIONS
+            }
+            options['destdir'] = str(destdir)
+            if len(urls) == 1:
+                options.update(
+                    destname=destname,
+                    checksum=args.checksum,
+                    mirrors=mirrors,
+                )
+            try:
+                task = DaemonClient(
+                    None if args.use_daemon is True else args.use_daemon
+                )
+                with task:
+                    return task.get(urls, **options)
+            except (DaemonError, ValueError) as e:
+                logging.error(str(e))
+                return 1
+        if args.manifest:
+            base_url = None
+            if urls:
+                # The URL of the folder holding the listed files.
+                base_url = urls[0] if urls[0].endswith('/') else f"{urls[0]}/"
+            try:
+                manifest = Manifest.load(
+                    args.manifest, base_url=base_url, session=session
+                )
+            except config.HTTP_ERRORS as e:
+                logging.error(f"Failed to read manifest: {e}")
+                return 1
+            task = manifest
+            status = manifest.get(
+                workers=args.jobs,
+                per_host=args.per_host,
+                session=session,
+                **download_kwargs,
+            )
+            for name, result in manifest.results.items():
+                print(f"{name}: {result.upper()}")
+            return status
+        if args.recursive:
+            task = RecursiveDownload(
+                urls[0],
+                depth=args.level if args.level >= 0 else None,
+                include=args.accept,
+                exclude=args.reject,
+                workers=args.jobs,
+                per_host=args.per_host,
+                session=session,
+                **download_kwargs,
+            )
+            return task.get()
+        if len(urls) > 1:
+            task = DownloadGroup(
+                urls,
+                workers=args.jobs,
+                per_host=args.per_host,
+                session=session,
+                **download_kwargs,
+            )
+            return task.get()
+        task = Download(
+            url=urls[0],
+            mirrors=mirrors,
             destname=destname,
-            request_headers=headers,
-            resume=resume,
-        ).get()
+            checksum=args.checksum,
+            session=session,
+            **download_kwargs,
+        )
+        return task.get()
     except KeyboardInterrupt:
         print("Cancelled with Ctrl+C", file=stderr)
         sys_exit(1)
+    finally:
+        if args.stats_json and task is not None:
+            if isinstance(task, (DownloadGroup, RecursiveDownload, DaemonClient)):  # noqa: E501
+                stats = [
+                    task.stats.get(url) for url in task.results
+                    if url in task.stats
+                ]
+            elif isinstance(task, Manifest):
+                stats = list(task.stats.values())
+            else:
+                stats = [task.stats]
+            write_stats(args.stats_json, stats)
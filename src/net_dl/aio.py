@@ -0,0 +1,402 @@
+"""Contains the AsyncDownload class
+
+Requires the optional 'aiohttp' dependency: pip install net-dl[async]
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import requests
+import sys
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from .chunking import aiter_chunks
+from .download import Download
+from .retry import HTTPStatusError
+from .retry import StallError
+from .stats import DownloadStats
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+try:
+    from aiohttp import compression_utils as aiohttp_compression
+except ImportError:  # no aiohttp, or one too old to report brotli/zstd
+    aiohttp_compression = None
+
+
+class _HeadResponse:
+    """Wraps an aiohttp response so that Url can read it like a requests one.
+    """
+    def __init__(self, response):
+        self.headers = requests.structures.CaseInsensitiveDict(
+            response.headers
+        )
+        self.history = response.history
+        self.reason = response.reason
+        self.status_code = response.status
+        self.url = str(response.url)
+
+
+class AsyncDownload(Download):
+    """The download task object for use within an asyncio event loop.
+
+    Takes the same arguments as Download, except that `session` is an
+    optional aiohttp.ClientSession (one is opened per call if not given),
+    `progress_queue` may be an asyncio.Queue, and `segments`, `mirrors`,
+    `head_request`, `delta` and `extract_to` are ignored. With `compress`,
+    aiohttp decodes the response and progress counts decoded bytes, against
+    an unknown total. The HEAD probe, resume logic, streaming write and
+    integrity check all run as coroutines, so many downloads can share one
+    event loop; disk writes and hashing run in the loop's default executor,
+    so that verifying a large file doesn't hold up the other downloads.
+
+    Progress events can be followed by iterating over the object; the exit
+    status is then available as `status`:
+
+    >>> dl = AsyncDownload(url)
+    >>> async for progress in dl:
+    ...     print(progress.percent)
+    >>> dl.status
+    0
+    """
+    def __init__(self, url=None, session=None, **kwargs):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncDownload requires aiohttp: pip install net-dl[async]"
+            )
+        super().__init__(url, **kwargs)
+        self.extract_to = None  # not supported
+        self.session = session
+        self.url.session = None  # not used; HEAD requests are made here
+        self.status = None
+        self._session = None
+        self._client_timeout = aiohttp.ClientTimeout(
+            sock_connect=self.timeout,
+            sock_read=self.timeout,
+        )
+        self._retry_errors = (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            StallError,
+        )
+
+    async def __aiter__(self):
+        if self.progress_queue is None:
+            self.progress_queue = asyncio.Queue()
+        task = asyncio.ensure_future(self.get())
+        while not task.done() or not self.progress_queue.empty():
+            getter = asyncio.ensure_future(self.progress_queue.get())
+            await asyncio.wait(
+                (getter, task),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        task.result()  # re-raise any exception from the download
+
+    async def get(self):
+        """Coroutine version of Download.get."""
+        start = monotonic()
+        self.stats = DownloadStats(self.url.path)
+        self.status = 1
+        try:
+            async with self._use_session():
+                self._set_conditional_headers()
+                with self.stats.timer('head'):
+                    await self._ensure_head_response()
+                if self._is_not_modified():
+                    self.status = 0
+                elif self._check_head_response():
+                    if self._saves_file():
+                        self.status = 0 if await self.get_file() else 1
+                    else:
+                        await self.get_text()
+                        self.status = 0
+        finally:
+            self._finish_stats(self.status, monotonic() - start)
+        return self.status
+
+    async def get_content(self):
+        """Coroutine version of Download.get_content."""
+        return b''.join([chunk async for chunk in self.iter_content()])
+
+    async def get_text(self):
+        """Coroutine version of Download.get_text."""
+        try:
+            with self.stats.timer('transfer'):
+                async with self._open_stream() as r:
+                    decoder = self._get_text_decoder(r.charset)
+                    async for chunk in self._iter_response(r):
+                        sys.stdout.write(decoder.decode(chunk))
+                    sys.stdout.write(decoder.decode(b'', final=True))
+        except (*self._retry_errors, HTTPStatusError) as e:
+            logging.error(f"{type(e)}: {e}")
+            return
+        print()
+
+    async def iter_content(self):
+        """Async generator version of Download.iter_content."""
+        with self.stats.timer('transfer'):
+            async with self._open_stream() as r:
+                async for chunk in self._iter_response(r):
+                    yield chunk
+
+    async def stream_to(self, sink):
+        """Coroutine version of Download.stream_to; sink.write() may also be
+        a coroutine.
+        """
+        size = 0
+        async for chunk in self.iter_content():
+            result = sink.write(chunk)
+            if inspect.isawaitable(result):
+                await result
+            size += len(chunk)
+        return size
+
+    async def get_file(self, file_mode='wb'):
+        """Coroutine version of Download.get_file.
+
+        Returns True if the file is downloaded (or was already) and it passes
+        the integrity check.
+        """
+        if self.progress_queue is None:
+            self.progress_queue = asyncio.Queue()
+        async with self._use_session():
+            await self._ensure_head_response()
+            if not self._check_head_response():
+                return False
+            self._set_dest()
+
+            accepts = False
+            if (
+                self.url.size
+                and self.url.head_response.headers.get('Accept-Ranges') == 'bytes'  # noqa: E501
+                and (
+                    self.part.path.is_file()
+                    or (
+                        self.dest.path.is_file()
+                        and self._can_resume(self.dest.get_size())
+                    )
+                )
+            ):
+                accepts = await self._check_server_accepts_range()
+            # Segmented downloads aren't supported here, so a segmented
+            # journal means starting afresh.
+            # Checking an existing file hashes it.
+            file_mode = await _in_thread(
+                self._prepare_dest,
+                file_mode,
+                accepts_range=lambda: accepts,
+                segmented=False,
+            )
+            if file_mode is None:
+                self._cache_validators()
+                return True  # already downloaded
+            if await _in_thread(self._get_from_store):
+                self._cache_validators()
+                return True
+
+            if not self._check_disk_space():
+                logging.critical("Not enough disk space.")
+                return False
+            self.stats.resumed_bytes = (
+                (self.url.size or 0) - self.remaining_size
+            )
+
+            with self.stats.timer('transfer'):
+                await self._get_stream_request(file_mode=file_mode)
+
+        if not await _in_thread(self._finish_file):
+            return False
+        await _in_thread(self._add_to_store)
+        self._cache_validators()
+        return True
+
+    async def _check_server_accepts_range(self):
+        # Ref: https://stackoverflow.com/a/50635525
+        request_headers = {**self.request_headers, 'Range': 'bytes=0-1'}
+        r = await self._get_head_response(request_headers=request_headers)
+        if r is None:
+            return False
+        logging.debug(f"Accepts Range check: {r.status_code=}; {r.headers=}")
+        return r.status_code == 206 and 'Content-Range' in r.headers.keys()
+
+    async def _ensure_head_response(self):
+        if self.url.head_response is None:
+            head_response = await self._get_head_response()
+            if head_response is not None:
+                self.url._set_head_response(head_response)
+
+    async def _get_head_response(self, request_headers=None):
+        if request_headers is None:
+            request_headers = self.url.request_headers
+        logging.debug(f"Getting headers from {self.url}.")
+        try:
+            async with self._session.head(
+                str(self.url),
+                headers=request_headers,
+                timeout=self._client_timeout,
+                allow_redirects=True,
+            ) as r:
+                head_response = _HeadResponse(r)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"{type(e)}: {e}")
+            return None
+        logging.debug(f"head_response headers:{head_response.headers}")
+        return head_response
+
+    async def _get_stream_request(self, file_mode='wb'):
+        logging.debug(f"AsyncDownload._get_stream_request for: {self.url}")
+        logging.debug(f"{self.request_headers=}")
+        logging.debug(f"{self.chunk_size=}")
+        # Resuming hashes the part of the file that's already on disk.
+        await _in_thread(self._start_hashers, file_mode)
+        self._start_progress(initial=self._get_part_size(file_mode))
+        attempt = 0
+        while True:
+            try:
+                url_mtime = await self._stream_to_part(file_mode)
+                break
+            except (*self._retry_errors, HTTPStatusError) as e:
+                if sys.stdout.isatty():
+                    print()
+                attempt += 1
+                delay = self._get_retry_delay(e, attempt)
+                if delay is None:
+                    logging.error(f"{type(e)}: {e}")
+                    self._handle_transfer_error()
+                    return
+                logging.warning(f"{e}; retrying in {delay:.1f} s")
+                self.stats.retries += 1
+                await asyncio.sleep(delay)
+                file_mode = self._get_retry_mode()
+
+        self._finish_transfer(url_mtime)
+
+    async def _stream_to_part(self, file_mode):
+        sent = monotonic()
+        async with self._session.get(
+            str(self.url),
+            headers=self.request_headers,
+            timeout=self._get_client_timeout(),
+            allow_redirects=True,
+        ) as r:
+            self.stats.record_ttfb(monotonic() - sent)
+            logging.debug(f"Response {r.headers=}")
+            self._check_response_status(r.status, r.reason, r.headers)
+            self._set_content_encoding(r.headers)
+            if file_mode == 'ab' and (
+                r.status != 206 or self._content_encoding
+            ):
+                logging.debug("Range not honored; restarting download.")
+                file_mode = 'wb'
+                self._restart_transfer()
+            if self._content_encoding:
+                # aiohttp doesn't count the encoded bytes it receives.
+                self._wire_size = None
+                self.progress_meter.total = None
+            # Opening reserves disk space, and writes may sync to disk.
+            f = await _in_thread(self._open_part, file_mode)
+            try:
+                self._start_journal(committed=f.tell())
+                stall_detector = self._get_stall_detector()
+                try:
+                    async for chunk in self._iter_chunks(r):
+                        await _in_thread(self._store_chunk, f, chunk)
+                        self._update_progress(len(chunk))
+                        waited = await self._throttle(len(chunk))
+                        stall_detector.update(len(chunk), idle=waited)
+                finally:
+                    await _in_thread(self._checkpoint, f)
+            finally:
+                await _in_thread(f.close)
+            return r.headers.get('Last-Modified')
+
+    def _get_accept_encoding(self):
+        if not self.compress:
+            return 'identity'
+        codings = ['gzip', 'deflate']
+        if getattr(aiohttp_compression, 'HAS_BROTLI', False):
+            codings.append('br')
+        if getattr(aiohttp_compression, 'HAS_ZSTD', False):
+            codings.append('zstd')
+        return ','.join(codings)
+
+    def _get_client_timeout(self):
+        timeout = self._get_timeout()
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(
+                sock_connect=timeout[0],
+                sock_read=timeout[1],
+            )
+        return self._client_timeout
+
+    def _iter_chunks(self, r):
+        if self.chunk_size:
+            return r.content.iter_chunked(self.chunk_size)
+        return aiter_chunks(r.content.read, self._get_chunk_sizer())
+
+    async def _throttle(self, nbytes):
+        if self.rate_limiter is None:
+            return 0.0
+        delay = self.rate_limiter.reserve(nbytes)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    async def _iter_response(self, r):
+        async for chunk in self._iter_chunks(r):
+            self.stats.add_bytes(len(chunk))  # decoded size, if compressed
+            yield chunk
+
+    @asynccontextmanager
+    async def _open_stream(self):
+        async with self._use_session() as session:
+            sent = monotonic()
+            async with session.get(
+                str(self.url),
+                headers=self.request_headers,
+                timeout=self._client_timeout,
+                allow_redirects=True,
+            ) as r:
+                self.stats.record_ttfb(monotonic() - sent)
+                self._check_response_status(r.status, r.reason, r.headers)
+                yield r
+
+    def _put_progress(self, progress):
+        self.progress_queue.put_nowait(progress)
+
+    @asynccontextmanager
+    async def _use_session(self):
+        if self._session is not None:  # already opened by the calling method
+            yield self._session
+            return
+        if self.session is not None:
+            self._session = self.session
+            try:
+                yield self._session
+            finally:
+                self._session = None
+            return
+        async with aiohttp.ClientSession() as session:
+            self._session = session
+            try:
+                yield self._session
+            finally:
+                self._session = None
+
+
+async def _in_thread(func, *args, **kwargs):
+    """Run a blocking call (disk I/O, hashing) in the event loop's default
+    executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs)
+    )
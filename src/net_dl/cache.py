@@ -0,0 +1,136 @@
+"""Contains the ValidatorCache class"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from . import config
+
+
+class ValidatorCache:
+    """On-disk record of the ETag and Last-Modified validators of completed
+    downloads.
+
+    On the next download of the same URL into the same folder (and under
+    the same name, if one was given), the validators are sent as
+    If-None-Match/If-Modified-Since so that a "304 Not Modified" response
+    can skip the transfer entirely. An entry is only used while the local
+    file still has the size and mtime it had when the entry was recorded.
+
+    :ivar path: JSON file where the cache is stored
+    :ivar autosave: write the file after every change; otherwise call save()
+    """
+    def __init__(self, path=None, autosave=True):
+        if path is None:
+            path = config.VALIDATOR_CACHE_FILE
+        self.path = Path(path).expanduser()
+        self.autosave = autosave
+        self.entries = dict()
+        self._lock = threading.RLock()
+        self._dirty = False
+        self.load()
+
+    def get(self, url, destdir, destname=None):
+        """Return the entry for url in destdir (saved as destname, if
+        given) if its file is unchanged.
+        """
+        with self._lock:
+            entry = self.entries.get(str(url), dict()).get(
+                _key(destdir, destname)
+            )
+        if entry is None:
+            return None
+        dest = Path(entry.get('dest'))
+        try:
+            stat = dest.stat()
+        except OSError:
+            return None
+        if (
+            stat.st_size != entry.get('size')
+            or stat.st_mtime != entry.get('mtime')
+        ):
+            logging.debug(f"Local file changed since it was cached: {dest}")
+            return None
+        return entry
+
+    def get_request_headers(self, url, destdir, destname=None):
+        """Return conditional request headers for url, if any are cached."""
+        headers = dict()
+        entry = self.get(url, destdir, destname)
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry.get('etag')
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry.get('last_modified')
+        return headers
+
+    def load(self):
+        if not self.path.is_file():
+            return
+        try:
+            with self.path.open() as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache file {self.path}: {e}")
+            return
+        with self._lock:
+            self.entries = entries
+
+    def record(self, url, dest, response_headers, destname=None):
+        """Store the validators from response_headers for url's file dest;
+        destname is the name it was asked to be saved as, if any.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        dest = Path(dest).resolve()
+        stat = dest.stat()
+        with self._lock:
+            key = _key(dest.parent, destname)
+            self.entries.setdefault(str(url), dict())[key] = {
+                'dest': str(dest),
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+            }
+            self._dirty = True
+            if self.autosave:
+                self.save()
+
+    def save(self):
+        """Write the cache file if anything has changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with tmp.open('w') as f:
+                json.dump(self.entries, f, indent=1)
+            tmp.replace(self.path)  # atomic, so readers never see half a file
+            self._dirty = False
+
+
+def _key(destdir, destname=None):
+    # Files saved under a given name are kept apart from the one saved under
+    # the server's name, and from each other.
+    if destname:
+        return str(Path(destdir).resolve() / destname)
+    return str(Path(destdir).resolve())
+
+
+def get_validator_cache(validator_cache):
+    """Return a ValidatorCache for validator_cache, which may be True (use the
+    default file), a file path, or already a ValidatorCache.
+    """
+    if not validator_cache:
+        return None
+    if isinstance(validator_cache, ValidatorCache):
+        return validator_cache
+    if validator_cache is True:
+        return ValidatorCache()
+    return ValidatorCache(validator_cache)
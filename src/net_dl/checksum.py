@@ -0,0 +1,57 @@
+"""Helpers for user-supplied checksums"""
+
+import hashlib
+import mmap
+import os
+
+from . import config
+
+ALGORITHMS = ('md5', 'sha256', 'sha512')
+
+
+def parse_checksum(checksum):
+    """Split a checksum string like 'sha256:<hex digest>' into its parts.
+
+    Returns a tuple (algorithm, hexdigest); raises ValueError if the string
+    is malformed or uses an unsupported algorithm.
+    """
+    algorithm, sep, hexdigest = str(checksum).partition(':')
+    algorithm = algorithm.strip().lower()
+    hexdigest = hexdigest.strip().lower()
+    if not sep or algorithm not in ALGORITHMS:
+        raise ValueError(
+            f"Checksum must look like '<algorithm>:<hex digest>' with one of "
+            f"{', '.join(ALGORITHMS)}: {checksum}"
+        )
+    expected_length = hashlib.new(algorithm).digest_size * 2
+    try:
+        bytes.fromhex(hexdigest)
+    except ValueError:
+        raise ValueError(f"Checksum is not hexadecimal: {hexdigest}")
+    if len(hexdigest) != expected_length:
+        raise ValueError(
+            f"{algorithm} checksum should have {expected_length} hex "
+            f"characters: {hexdigest}"
+        )
+    return algorithm, hexdigest
+
+
+def hash_file(path, algorithm='md5'):
+    """Hash the file at path; return the hashlib object.
+
+    The file is memory-mapped and hashed in one call, which avoids copying
+    it through Python in small reads and lets other threads run meanwhile.
+    Files that can't be mapped are read in blocks instead.
+    """
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    hasher.update(m)
+                return hasher
+            except (OSError, ValueError):
+                pass  # e.g. a special file or a filesystem without mmap
+        for chunk in iter(lambda: f.read(config.READ_SIZE), b''):
+            hasher.update(chunk)
+    return hasher
@@ -0,0 +1,71 @@
+"""Adaptive read sizes for streamed downloads"""
+
+from time import monotonic
+
+from . import config
+
+
+class ChunkSizer:
+    """Grows or shrinks the read size based on measured throughput.
+
+    Each pass through the download loop (read, write, hash, report) should
+    take about `target_time` seconds: long enough that Python's per-chunk
+    overhead is negligible on fast links, but short enough that progress and
+    error handling stay responsive on slow ones.
+
+    :ivar size: the read size to use for the next chunk
+    :ivar minimum: smallest read size allowed
+    :ivar maximum: largest read size allowed
+    :ivar target_time: desired number of seconds per loop iteration
+    """
+    def __init__(
+        self,
+        initial=config.CHUNK_SIZE,
+        minimum=config.MIN_CHUNK_SIZE,
+        maximum=config.MAX_CHUNK_SIZE,
+        target_time=config.CHUNK_TARGET_TIME,
+    ):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.target_time = target_time
+
+    def update(self, nbytes, requested, elapsed):
+        """Adjust size after a loop iteration that received nbytes of the
+        requested number of bytes in elapsed seconds.
+        """
+        if elapsed > self.target_time * 2:
+            self.size = max(self.size // 2, self.minimum)
+        elif nbytes >= requested and elapsed < self.target_time / 2:
+            self.size = min(self.size * 2, self.maximum)
+
+
+def iter_chunks(read, sizer):
+    """Yield chunks from read(n) until it returns no data, letting sizer
+    choose n. The time spent by the caller on each chunk counts towards the
+    measured iteration time.
+    """
+    last = monotonic()
+    while True:
+        requested = sizer.size
+        chunk = read(requested)
+        if not chunk:
+            return
+        yield chunk
+        now = monotonic()
+        sizer.update(len(chunk), requested, now - last)
+        last = now
+
+
+async def aiter_chunks(read, sizer):
+    """Async version of iter_chunks for a coroutine read(n)."""
+    last = monotonic()
+    while True:
+        requested = sizer.size
+        chunk = await read(requested)
+        if not chunk:
+            return
+        yield chunk
+        now = monotonic()
+        sizer.update(len(chunk), requested, now - last)
+        last = now
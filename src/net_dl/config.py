@@ -1,5 +1,5 @@
-from requests.exceptions import ConnectionError
-from requests.exceptions import Timeout
+from os import environ
+from pathlib import Path
 from socket import timeout
 
 
@@ -7,9 +7,101 @@ DATE_FMT = '%Y-%m-%d %H:%M:%S'
 MSG_FMT = '%(asctime)s %(levelname)s: %(message)s'
 
 HTTP_TIMEOUT = 30
-HTTP_ERRORS = (
-    Timeout,
-    ConnectionError,
-    timeout,
-    Exception,
-)
+# Max. number of pooled connections kept open per host.
+POOL_SIZE = 10
+
+# Batch downloads: max. simultaneous downloads, overall and per host.
+GROUP_WORKERS = 8
+GROUP_PER_HOST = 4
+
+# Retries after a failed transfer: max. attempts, seconds before the first
+# retry (doubled each time) and max. seconds between retries.
+RETRIES = 5
+RETRY_BACKOFF = 1.0
+RETRY_MAX_DELAY = 60
+# Response statuses that are worth retrying.
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# A connection is dropped and retried if its rate stays below SPEED_LIMIT
+# bytes/s for SPEED_TIME seconds (0 disables the check).
+SPEED_LIMIT = 1024
+SPEED_TIME = 20
+
+# Min. number of seconds between progress updates.
+PROGRESS_INTERVAL = 0.2
+
+# Adaptive read sizes for streamed downloads: initial, min. and max. number of
+# bytes per read, and the desired number of seconds per read.
+CHUNK_SIZE = 64 * 1024
+MIN_CHUNK_SIZE = 8 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNK_TARGET_TIME = 0.1
+
+# Downloaded data is written in blocks of at least this many bytes.
+WRITE_BUFFER_SIZE = 1024 * 1024
+# When to sync written data to disk: 'none', 'end' (before the file is moved
+# into place) or every so many bytes.
+FSYNC = 'end'
+
+# Number of bytes written between journal checkpoints of a partial download.
+JOURNAL_INTERVAL = 16 * 1024 * 1024
+
+# Read size used when hashing local files.
+READ_SIZE = 1024 * 1024
+
+# Smallest byte range worth its own connection in a segmented download.
+SEGMENT_MIN_SIZE = 1024 * 1024
+
+# Delta updates: block size of new block indexes, suffix of the index
+# published next to a file, and max. number of byte ranges per request.
+DELTA_BLOCK_SIZE = 64 * 1024
+DELTA_INDEX_SUFFIX = '.blocks.json'
+DELTA_MAX_RANGES = 32
+
+# Max. number of downloaded bytes held for an archive's extractor before the
+# download waits for it to catch up.
+EXTRACT_BUFFER_SIZE = 16 * 1024 * 1024
+
+# Number of segments per connection when downloading from several mirrors, so
+# that faster mirrors can take on more of the file.
+MIRROR_SEGMENTS = 4
+# Number of bytes fetched from each mirror to measure its rate, for ranking
+# mirrors by throughput as well as latency.
+MIRROR_PROBE_SIZE = 256 * 1024
+
+# Max. number of folder levels below the starting URL followed when
+# mirroring a directory listing.
+RECURSIVE_DEPTH = 5
+
+# Where ETag/Last-Modified validators of completed downloads are kept.
+CACHE_DIR = Path(environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'net-dl'  # noqa: E501
+VALIDATOR_CACHE_FILE = CACHE_DIR / 'validators.json'
+
+# Content-addressed store of downloaded files, and its max. size in bytes.
+STORE_DIR = CACHE_DIR / 'store'
+STORE_MAX_SIZE = 10 * 1024**3
+
+# Where the download daemon (net-dl --serve) listens: a Unix socket, or this
+# port on localhost where Unix sockets aren't available.
+DAEMON_SOCKET = Path(environ.get('XDG_RUNTIME_DIR', CACHE_DIR)) / 'net-dl.sock'  # noqa: E501
+DAEMON_PORT = 8786
+# Where a daemon listening on a port keeps the token that clients must send,
+# readable only by its user.
+DAEMON_TOKEN_FILE = CACHE_DIR / 'daemon.token'
+# Number of seconds the daemon keeps resolved host addresses.
+DNS_TTL = 300
+
+
+def __getattr__(name):
+    # HTTP_ERRORS is built on first use, so that importing net_dl doesn't
+    # import requests.
+    if name == 'HTTP_ERRORS':
+        from requests.exceptions import ConnectionError
+        from requests.exceptions import Timeout
+        return (
+            Timeout,
+            ConnectionError,
+            timeout,
+            Exception,
+        )
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,588 @@
+"""Contains the DownloadDaemon and DaemonClient classes"""
+
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+from time import monotonic
+from urllib.parse import urlsplit
+
+from . import config
+from .cache import get_validator_cache
+from .download import Download
+from .ratelimit import get_rate_limiter
+from .session import Session
+from .store import get_content_store
+
+# Download options that a client can set for each job; the others, like
+# rate_limit, store and validator_cache, are the daemon's.
+JOB_OPTIONS = (
+    'checksum',
+    'compress',
+    'delta',
+    'destdir',
+    'destname',
+    'extract_to',
+    'fsync',
+    'head_request',
+    'keep_archive',
+    'mirrors',
+    'request_headers',
+    'resume',
+    'retries',
+    'segments',
+    'speed_limit',
+    'speed_time',
+)
+# Max. number of finished jobs kept for status requests.
+JOB_HISTORY = 1000
+
+
+class DaemonError(Exception):
+    """The daemon couldn't be reached, or it refused a request."""
+
+
+def get_address(address=None):
+    """Return the daemon address for address: a Unix socket path, a port
+    number or 'localhost:PORT' (returned as a (host, port) tuple).
+
+    Defaults to config.DAEMON_SOCKET, or config.DAEMON_PORT on localhost
+    where Unix sockets aren't available.
+    """
+    if address is None:
+        if hasattr(socket, 'AF_UNIX'):
+            return str(config.DAEMON_SOCKET)
+        return ('127.0.0.1', config.DAEMON_PORT)
+    if isinstance(address, tuple):
+        host, port = address
+    else:
+        address = str(address)
+        host, sep, port = address.rpartition(':')
+        if not port.isdigit():
+            return address  # a socket path
+        host = host or '127.0.0.1'
+    if host not in ('127.0.0.1', 'localhost'):
+        raise ValueError(f"The daemon only listens on localhost, not: {host}")
+    return (host, int(port))
+
+
+class DnsCache:
+    """Keeps the results of socket.getaddrinfo for ttl seconds, so that new
+    connections to a host skip the lookup.
+
+    install() applies it to the whole process; the daemon does so while it
+    runs.
+
+    :ivar ttl: number of seconds that a result is reused
+    """
+    def __init__(self, ttl=config.DNS_TTL):
+        self.ttl = ttl
+        self._entries = dict()
+        self._lock = threading.Lock()
+        self._getaddrinfo = None
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            return list(entry[1])
+        result = (self._getaddrinfo or socket.getaddrinfo)(*args, **kwargs)
+        with self._lock:
+            self._entries[key] = (now, result)
+        return list(result)
+
+    def install(self):
+        if self._getaddrinfo is None:
+            self._getaddrinfo = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if self._getaddrinfo is not None:
+            socket.getaddrinfo = self._getaddrinfo
+            self._getaddrinfo = None
+
+
+class Job:
+    """A download submitted to the daemon.
+
+    :ivar id: the job's ID, unique while the daemon runs
+    :ivar url: the source URL
+    :ivar options: keyword arguments for the Download (see JOB_OPTIONS)
+    :ivar state: 'queued', 'running', 'done' or 'failed'
+    :ivar status: exit status of the download, or None until it finishes
+    :ivar progress: the latest net_dl.Progress of the download, if any
+    :ivar stats: net_dl.DownloadStats of the download once it has started
+    :ivar error: description of an unexpected error, if any
+    """
+    def __init__(self, id, url, options=None):
+        self.id = id
+        self.url = url
+        self.options = dict(options or dict())
+        self.state = 'queued'
+        self.status = None
+        self.progress = None
+        self.stats = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def put(self, progress):
+        """Take a Progress event; the job serves as the download's progress
+        queue.
+        """
+        self.progress = progress
+
+    def to_dict(self):
+        progress = self.progress
+        return {
+            'id': self.id,
+            'url': self.url,
+            'state': self.state,
+            'status': self.status,
+            'bytes_done': progress.bytes_done if progress else 0,
+            'total': progress.total if progress else None,
+            'percent': progress.percent if progress else None,
+            'rate': progress.rate if progress else 0.0,
+            'eta': progress.eta if progress else None,
+            'error': self.error,
+            'stats': self.stats.to_dict() if self.stats else None,
+        }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        token = self.server.token
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if token is not None and not hmac.compare_digest(
+                    str(request.get('token', '')), token
+                ):
+                    response = {'ok': False, 'error': "Invalid or missing token."}  # noqa: E501
+                else:
+                    response = self.server.daemon.handle_request(request)
+            except (ValueError, TypeError, AttributeError) as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class DownloadDaemon:
+    """A long-running process that downloads URLs submitted by clients over
+    a local socket.
+
+    All jobs share one pooled Session (so connections and resolved
+    addresses stay warm between jobs), one rate limit and one cap on
+    concurrent downloads, overall and per host. A URL submitted for the same
+    destination as a job that's still queued or running joins that job
+    instead of being downloaded twice.
+
+    Clients send requests as lines of JSON and get a line of JSON back for
+    each one: {"ok": true, ...} or {"ok": false, "error": "..."}. Requests
+    are:
+
+    - {"action": "submit", "url": URL, "options": {...}}: queue a download;
+      options are those in JOB_OPTIONS, and 'destdir' (an absolute path) is
+      required; 'extract_to' must be an absolute path too. Answers with the
+      "job".
+    - {"action": "status", "job": ID}: answers with the "job".
+    - {"action": "wait", "job": ID, "timeout": SECONDS}: answers with the
+      "job" once it's finished or the timeout has passed.
+    - {"action": "jobs"}: answers with all known "jobs".
+    - {"action": "shutdown"}: stops the daemon.
+
+    Content is always saved as a file, since there's no stdout to print it
+    to.
+
+    Whoever can send requests can have files written anywhere the daemon's
+    user can write, so only that user is let in. A Unix socket is created
+    with owner-only permissions. A port on localhost is open to every local
+    user, so there each request must also carry the "token" that the daemon
+    writes to token_file, which only its user can read. DaemonClient sends
+    it automatically.
+
+    :ivar address: Unix socket path, or (host, port) on localhost, that the
+        daemon listens on
+    :ivar workers: max. number of simultaneous downloads
+    :ivar per_host: max. number of simultaneous downloads from any one host
+    :ivar rate_limit: net_dl.RateLimiter capping the combined rate of all
+        jobs, or None
+    :ivar session: Session shared by all jobs
+    :ivar dns_cache: DnsCache used while the daemon runs, or None
+    :ivar token_file: where the token for clients is written when listening
+        on a port
+    :ivar jobs: Job of each ID
+    :ivar download_kwargs: defaults for each Download; a `validator_cache`
+        and content `store` given here are shared by all jobs
+    """
+    def __init__(
+        self,
+        address=None,
+        workers=config.GROUP_WORKERS,
+        per_host=config.GROUP_PER_HOST,
+        rate_limit=None,
+        session=None,
+        dns_ttl=config.DNS_TTL,
+        token_file=config.DAEMON_TOKEN_FILE,
+        **download_kwargs,
+    ):
+        self.address = get_address(address)
+        self.token_file = Path(token_file)
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.rate_limit = get_rate_limiter(rate_limit)
+        if session is None:
+            session = Session(pool_size=max(config.POOL_SIZE, self.per_host))
+        self.session = session
+        self.dns_cache = DnsCache(dns_ttl) if dns_ttl else None
+        self.download_kwargs = download_kwargs
+        self.validator_cache = get_validator_cache(
+            self.download_kwargs.get('validator_cache')
+        )
+        if self.validator_cache is not None:
+            self.validator_cache.autosave = False
+            self.download_kwargs['validator_cache'] = self.validator_cache
+        self.download_kwargs['store'] = get_content_store(
+            self.download_kwargs.get('store')
+        )
+        self.jobs = dict()
+        self._active = dict()
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._host_limits = dict()
+        self._executor = None
+        self._server = None
+        self._thread = None
+
+    def handle_request(self, request):
+        """Carry out a client's request; return the response."""
+        action = request.get('action')
+        if action == 'submit':
+            job = self.submit(request.get('url'), **request.get('options', {}))
+            return {'ok': True, 'job': job.to_dict()}
+        if action in ('status', 'wait'):
+            job = self.jobs.get(str(request.get('job')))
+            if job is None:
+                return {'ok': False, 'error': f"No such job: {request.get('job')}"}  # noqa: E501
+            if action == 'wait':
+                job.finished.wait(request.get('timeout'))
+            return {'ok': True, 'job': job.to_dict()}
+        if action == 'jobs':
+            jobs = list(self.jobs.values())
+            return {'ok': True, 'jobs': [j.to_dict() for j in jobs]}
+        if action == 'shutdown':
+            # From another thread, so that this response can still be sent.
+            threading.Thread(target=self.shutdown).start()
+            return {'ok': True}
+        return {'ok': False, 'error': f"Unknown action: {action}"}
+
+    def serve_forever(self):
+        """Listen for clients until shutdown() is called."""
+        self._listen()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+    def shutdown(self):
+        """Stop listening; running downloads are finished first."""
+        server, thread = self._server, self._thread
+        if server is not None:
+            server.shutdown()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def start(self):
+        """Serve clients in a background thread; return the daemon."""
+        self._listen()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, url, **options):
+        """Queue a download of url; return its Job, or the job already
+        downloading url to the same place.
+        """
+        if not url:
+            raise ValueError("No URL given.")
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unsupported options: {', '.join(sorted(unknown))}")  # noqa: E501
+        destdir = options.get('destdir')
+        if destdir is None or not Path(destdir).is_absolute():
+            raise ValueError("destdir must be given as an absolute path.")
+        extract_to = options.get('extract_to')
+        if extract_to is not None and not Path(extract_to).is_absolute():
+            raise ValueError("extract_to must be given as an absolute path.")
+        key = (url, str(Path(destdir)), options.get('destname'))
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                logging.info(f"Joining job {job.id}: {url}")
+                return job
+            job = Job(str(next(self._ids)), url, options)
+            self.jobs[job.id] = job
+            self._active[key] = job
+            self._prune_jobs()
+        logging.info(f"Queued job {job.id}: {url}")
+        self._executor.submit(self._run, job, key)
+        return job
+
+    def _close(self):
+        self._server.server_close()
+        self._server = None
+        self._executor.shutdown(wait=True)
+        if self.dns_cache is not None:
+            self.dns_cache.uninstall()
+        if isinstance(self.address, tuple):
+            self.token_file.unlink(missing_ok=True)
+        else:
+            Path(self.address).unlink(missing_ok=True)
+        logging.info("Daemon stopped.")
+
+    def _get_host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits.get(host)
+
+    def _listen(self):
+        if isinstance(self.address, tuple):
+            server = _TCPServer(self.address, _Handler)
+            self.address = server.server_address[:2]
+            server.token = secrets.token_hex(32)
+            try:
+                _write_private_file(self.token_file, server.token)
+            except OSError:
+                server.server_close()
+                raise
+        else:
+            path = Path(self.address)
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if path.exists():
+                try:
+                    with DaemonClient(self.address) as client:
+                        client.request('jobs')
+                except DaemonError:
+                    path.unlink()  # left by a daemon that didn't stop cleanly
+                else:
+                    raise DaemonError(f"A daemon is already listening on: {path}")  # noqa: E501
+            # Only this user may connect, from the moment the socket exists.
+            umask = os.umask(0o177)
+            try:
+                server = _UnixServer(str(path), _Handler)
+            finally:
+                os.umask(umask)
+            server.token = None
+        server.daemon = self
+        self._server = server
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        if self.dns_cache is not None:
+            self.dns_cache.install()
+        logging.info(f"Listening on: {self.address}")
+
+    def _prune_jobs(self):
+        finished = [j for j in self.jobs.values() if j.finished.is_set()]
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self.jobs[job.id]
+
+    def _run(self, job, key):
+        with self._get_host_limit(job.url):
+            job.state = 'running'
+            d = None
+            try:
+                d = Download(
+                    job.url,
+                    is_file=True,
+                    progress_queue=job,
+                    rate_limit=self.rate_limit,
+                    session=self.session,
+                    **{**self.download_kwargs, **job.options},
+                )
+                job.status = d.get()
+            except SystemExit as e:  # e.g. failed integrity check
+                job.status = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                logging.error(f"{job.url}: {type(e)}: {e}")
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = 1
+            finally:
+                if d is not None:
+                    job.stats = d.stats
+                job.state = 'done' if job.status == 0 else 'failed'
+                with self._lock:
+                    self._active.pop(key, None)
+                    if self.validator_cache is not None:
+                        self.validator_cache.save()
+                job.finished.set()
+        logging.info(f"Job {job.id} {job.state}: {job.url}")
+
+    def _serve(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+
+class DaemonClient:
+    """Submits downloads to a running DownloadDaemon and follows them.
+
+    :ivar address: the daemon's address (see get_address)
+    :ivar timeout: number of seconds to wait for the daemon to answer,
+        besides any time that a 'wait' request is asked to wait
+    :ivar token_file: file holding the token of a daemon that listens on a
+        port (see DownloadDaemon)
+    :ivar results: exit status of each URL's download after get() is run
+    :ivar stats: stats of each URL's download after get() is run, as dicts
+        (see net_dl.DownloadStats.to_dict)
+    """
+    def __init__(
+        self,
+        address=None,
+        timeout=config.HTTP_TIMEOUT,
+        token_file=config.DAEMON_TOKEN_FILE,
+    ):
+        self.address = get_address(address)
+        self.timeout = timeout
+        self.token_file = Path(token_file)
+        self._token = None
+        self.results = dict()
+        self.stats = dict()
+        self._sock = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def get(self, urls, **options):
+        """Have the daemon download urls, and wait for them to finish;
+        return 0 if all succeeded, otherwise 1.
+
+        An item of urls may also be a list of mirror URLs for the same file.
+        options are passed on for each job (see JOB_OPTIONS); destdir
+        defaults to the current folder.
+        """
+        options['destdir'] = str(Path(options.get('destdir') or os.getcwd()).resolve())  # noqa: E501
+        if options.get('extract_to'):
+            options['extract_to'] = str(Path(options.get('extract_to')).resolve())  # noqa: E501
+        self.results = dict()
+        self.stats = dict()
+        jobs = dict()
+        for url in urls:
+            job_options = dict(options)
+            if not isinstance(url, str):
+                url, job_options['mirrors'] = url[0], list(url[1:])
+            jobs[url] = self.submit(url, **job_options).get('id')
+        for url, job_id in jobs.items():
+            job = self.wait(job_id)
+            self.results[url] = job.get('status')
+            if job.get('stats'):
+                self.stats[url] = job.get('stats')
+            if job.get('status') != 0:
+                logging.error(f"Download failed: {url}")
+        return 1 if any(s != 0 for s in self.results.values()) else 0
+
+    def jobs(self):
+        return self.request('jobs').get('jobs')
+
+    def request(self, action, **params):
+        """Send a request to the daemon; return its response, or raise
+        DaemonError if the request failed.
+        """
+        if self._file is None:
+            self._connect()
+        timeout = self.timeout
+        if action == 'wait':
+            timeout = None if params.get('timeout') is None else timeout + params.get('timeout')  # noqa: E501
+        self._sock.settimeout(timeout)
+        if self._token is not None:
+            params['token'] = self._token
+        try:
+            self._file.write(json.dumps({'action': action, **params}).encode() + b'\n')  # noqa: E501
+            self._file.flush()
+            line = self._file.readline()
+        except OSError as e:
+            self.close()
+            raise DaemonError(f"Lost connection to daemon: {e}") from e
+        if not line:
+            self.close()
+            raise DaemonError("Daemon closed the connection.")
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error'))
+        return response
+
+    def shutdown(self):
+        self.request('shutdown')
+        self.close()
+
+    def status(self, job_id):
+        return self.request('status', job=job_id).get('job')
+
+    def submit(self, url, **options):
+        """Queue a download of url; return the job's details."""
+        return self.request('submit', url=url, options=options).get('job')
+
+    def wait(self, job_id, timeout=None):
+        """Return the job's details once it's finished, or after timeout
+        seconds.
+        """
+        return self.request('wait', job=job_id, timeout=timeout).get('job')
+
+    def _connect(self):
+        if isinstance(self.address, tuple):
+            try:
+                self._token = self.token_file.read_text().strip()
+            except OSError as e:
+                raise DaemonError(f"Can't read the daemon's token: {e}") from e  # noqa: E501
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except OSError as e:
+            sock.close()
+            raise DaemonError(f"Can't connect to daemon at {self.address}: {e}") from e  # noqa: E501
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+
+
+def _write_private_file(path, text):
+    """Write text to a new file at path that only this user can read."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Never write through a file or link that someone else put there.
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
@@ -0,0 +1,241 @@
+"""Contains the BlockIndex class, used for delta updates of files
+
+A block index lists a weak (rolling) and a strong checksum for each
+fixed-size block of a file, like a zsync control file. With it, the blocks
+that an older copy of the file already has can be found wherever they've
+moved to, so that only the changed blocks need to be downloaded.
+"""
+
+import hashlib
+import json
+import mmap
+import re
+import zlib
+from pathlib import Path
+
+from . import config
+from .checksum import hash_file
+
+# Modulus of the Adler-32 sums.
+_ADLER_MOD = 65521
+
+
+def get_weak_checksum(data):
+    """Return the rolling checksum of a block (Adler-32)."""
+    return zlib.adler32(data)
+
+
+def get_strong_checksum(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def roll_weak_checksum(checksum, out_byte, in_byte, block_size):
+    """Return the weak checksum of the block one byte further on, i.e.
+    without out_byte at its start and with in_byte added at its end.
+    """
+    a = checksum & 0xffff
+    b = checksum >> 16
+    a = (a - out_byte + in_byte) % _ADLER_MOD
+    b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+    return (b << 16) | a
+
+
+class BlockIndex:
+    """Weak and strong checksums of each block of a file.
+
+    Publish the index next to the file (see config.DELTA_INDEX_SUFFIX) as
+    written by to_json(); `net-dl --make-delta-index FILE` creates one.
+
+    :ivar size: size of the file in bytes
+    :ivar block_size: size of each block in bytes (the last one may be
+        shorter)
+    :ivar sha256: hex digest of the whole file
+    :ivar blocks: list of (weak checksum, strong checksum) of each block
+    """
+    def __init__(self, size=0, block_size=config.DELTA_BLOCK_SIZE, sha256=None, blocks=None):  # noqa: E501
+        self.size = size
+        self.block_size = block_size
+        self.sha256 = sha256
+        self.blocks = list(blocks or list())
+
+    def build(path, block_size=config.DELTA_BLOCK_SIZE):
+        """Return the BlockIndex of the file at path."""
+        path = Path(path)
+        blocks = list()
+        with path.open('rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                blocks.append(
+                    (get_weak_checksum(block), get_strong_checksum(block))
+                )
+        return BlockIndex(
+            size=path.stat().st_size,
+            block_size=block_size,
+            sha256=hash_file(path, 'sha256').hexdigest(),
+            blocks=blocks,
+        )
+
+    def from_json(text):
+        """Return the BlockIndex in a JSON document, or raise ValueError if
+        it isn't a valid one.
+        """
+        try:
+            data = json.loads(text)
+            index = BlockIndex(
+                size=int(data['size']),
+                block_size=int(data['block_size']),
+                sha256=str(data['sha256']).lower(),
+                blocks=[(int(w), str(s).lower()) for w, s in data['blocks']],
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid block index: {e}") from e
+        if (
+            index.block_size <= 0
+            or not re.fullmatch(r'[0-9a-f]{64}', index.sha256)
+            or len(index.blocks) != -(-index.size // index.block_size)
+        ):
+            raise ValueError("Invalid block index: inconsistent sizes")
+        return index
+
+    def find_blocks(self, path):
+        """Find the blocks that the file at path already has, at any offset.
+
+        Returns the offset in that file of each block found, keyed by block
+        number.
+        """
+        found = dict()
+        size = Path(path).stat().st_size
+        if not size or not self.blocks:
+            return found
+        with Path(path).open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:  # noqa: E501
+            self._find_full_blocks(data, size, found)
+            self._find_last_block(data, size, found)
+        return found
+
+    def get_block_size(self, number):
+        """Return the size of the given block; the last one may be short."""
+        return min(self.block_size, self.size - number * self.block_size)
+
+    def get_ranges(self, numbers):
+        """Return the byte ranges (start, end), inclusive, that cover the
+        given blocks, with neighbouring blocks merged.
+        """
+        ranges = list()
+        for number in sorted(numbers):
+            start = number * self.block_size
+            end = start + self.get_block_size(number) - 1
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def save(self, path):
+        Path(path).write_text(self.to_json())
+
+    def to_json(self):
+        return json.dumps({
+            'size': self.size,
+            'block_size': self.block_size,
+            'sha256': self.sha256,
+            'blocks': [list(b) for b in self.blocks],
+        }, separators=(',', ':'))
+
+    def _find_full_blocks(self, data, size, found):
+        """Slide a window of block_size bytes over data, rolling the weak
+        checksum a byte at a time, and jump a whole block at each match.
+        """
+        block_size = self.block_size
+        candidates = dict()
+        for number, (weak, strong) in enumerate(self.blocks):
+            if self.get_block_size(number) == block_size:
+                candidates.setdefault(weak, list()).append(number)
+        if not candidates:
+            return
+        wanted = sum(len(n) for n in candidates.values())
+        last = size - block_size
+        pos = 0
+        weak = None
+        while pos <= last and len(found) < wanted:
+            if weak is None:
+                weak = get_weak_checksum(data[pos:pos + block_size])
+            numbers = candidates.get(weak)
+            if numbers:
+                strong = get_strong_checksum(data[pos:pos + block_size])
+                matches = [n for n in numbers if self.blocks[n][1] == strong]
+                if matches:
+                    for number in matches:
+                        found.setdefault(number, pos)
+                    pos += block_size
+                    weak = None
+                    continue
+            if pos == last:
+                break
+            weak = roll_weak_checksum(
+                weak, data[pos], data[pos + block_size], block_size
+            )
+            pos += 1
+
+    def _find_last_block(self, data, size, found):
+        """A short last block is looked for where it was before, and at the
+        end of the file.
+        """
+        number = len(self.blocks) - 1
+        length = self.get_block_size(number)
+        if length == self.block_size or number in found:
+            return
+        for pos in (number * self.block_size, size - length):
+            if 0 <= pos and pos + length <= size:
+                if get_strong_checksum(data[pos:pos + length]) == self.blocks[number][1]:  # noqa: E501
+                    found[number] = pos
+                    return
+
+
+def iter_byteranges(chunks, headers):
+    """Yield (offset, data) for the body of a 206 response, given as chunks
+    of bytes, whether it holds one range or several (multipart/byteranges).
+    """
+    content_type = headers.get('Content-Type', '')
+    m = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not content_type.lower().startswith('multipart/byteranges') or not m:
+        offset = _parse_content_range(headers.get('Content-Range', ''))[0]
+        for chunk in chunks:
+            yield offset, chunk
+            offset += len(chunk)
+        return
+
+    delimiter = b'--' + m.group(1).encode()
+    buffer = bytearray()
+    offset = remaining = None
+    for chunk in chunks:
+        buffer += chunk
+        while buffer:
+            if remaining:
+                data = bytes(buffer[:remaining])
+                del buffer[:len(data)]
+                yield offset, data
+                offset += len(data)
+                remaining -= len(data)
+                continue
+            # Expecting the next part's delimiter and headers.
+            start = buffer.find(delimiter)
+            if start < 0 or len(buffer) < start + len(delimiter) + 2:
+                break
+            if buffer[start + len(delimiter):start + len(delimiter) + 2] == b'--':  # noqa: E501
+                return  # closing delimiter
+            end = buffer.find(b'\r\n\r\n', start)
+            if end < 0:
+                break
+            part_headers = bytes(buffer[start + len(delimiter):end]).decode('latin-1')  # noqa: E501
+            m_range = re.search(r'(?im)^content-range:\s*(.+?)\s*$', part_headers)  # noqa: E501
+            if not m_range:
+                raise ValueError("Byte range part without Content-Range")
+            first, last = _parse_content_range(m_range.group(1))
+            offset, remaining = first, last - first + 1
+            del buffer[:end + 4]
+
+
+def _parse_content_range(value):
+    m = re.match(r'\s*bytes\s+(\d+)-(\d+)/', value)
+    if not m:
+        raise ValueError(f"Invalid Content-Range: {value}")
+    return int(m.group(1)), int(m.group(2))
@@ -1,20 +1,66 @@
 """Contains the Download class"""
 
+import codecs
+import hashlib
 import logging
+import re
 import requests
 import shutil
 import sys
 import threading
+import urllib3
+from base64 import b64decode
 from os import getcwd
 from pathlib import Path
 from queue import Empty
 from queue import Queue
+from time import monotonic
 from time import sleep
-from urllib.parse import unquote
+from urllib3.util.request import ACCEPT_ENCODING
 
 from . import config
+from .cache import get_validator_cache
+from .checksum import parse_checksum
+from .delta import BlockIndex
+from .delta import iter_byteranges
+from .extract import ExtractError
+from .extract import StreamExtractor
+from .extract import extract_file
+from .chunking import ChunkSizer
+from .chunking import iter_chunks
+from .journal import Journal
+from .mirrors import accepts_ranges
+from .mirrors import probe_mirrors
+from .mirrors import rank_mirrors
+from .mirrors import same_file
 from .props import LocalFile
+from .progress import ProgressMeter
+from .progress import format_size
+from .progress import format_time
 from .props import Url
+from .ratelimit import get_rate_limiter
+from .retry import HTTPStatusError
+from .retry import StallDetector
+from .retry import StallError
+from .retry import get_retry_policy
+from .session import get_default_session
+from .stats import DownloadStats
+from .store import get_content_store
+from .store import link_or_copy
+from .writer import FileWriter
+from .writer import allocate
+from .writer import parse_fsync
+
+# Errors after which it's worth reconnecting.
+RETRY_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+    urllib3.exceptions.HTTPError,
+    StallError,
+)
 
 
 class Download:
@@ -25,90 +71,268 @@ class Download:
 
     :ivar url: the source URL to download from
     :ivar destdir: the local destination folder
-    :ivar resume: attempt to resume an incomplete download
+    :ivar destname: name to save the file as, instead of the one given by
+        the server or the URL; text content is then saved too, rather than
+        printed
+    :ivar is_file: True to always save the content as a file, False to always
+        print it to stdout; if None, get() decides from the 'Content-Type'
+        of the response
+    :ivar mirrors: other URLs of the same file; all are probed, ranges are
+        fetched from those that serve the same file (fastest first), and a
+        failing or stalled mirror is dropped in favor of the others
+    :ivar resume: attempt to resume an incomplete download that has no
+        journal, e.g. one left by another program (downloads are written to
+        a '.part' file with a journal and resumed automatically)
+    :ivar overwrite: download the file again even if a complete copy of it
+        is already in destdir; the copy is only replaced once the new one
+        is complete and verified
+    :ivar remove_on_error: delete the partial download if the transfer fails
+        and it can't be resumed later
+    :ivar chunk_size: fixed number of bytes to read at a time; if not given,
+        the read size adapts to the measured throughput, between
+        min_chunk_size and max_chunk_size
+    :ivar progress_queue: queue that receives throttled net_dl.Progress
+        events (bytes done, total, rate, ETA); a progress bar is shown if not
+        given
+    :ivar progress_interval: min. number of seconds between progress events
+        (and calls to callback)
+    :ivar segments: number of concurrent byte-range connections to use when
+        downloading a file (requires server support for 'Range' requests)
+    :ivar rate_limit: max. transfer rate in bytes/s (e.g. 2097152 or '2M'),
+        or a net_dl.RateLimiter shared with other downloads to cap their
+        combined rate
+    :ivar retries: max. number of times to reconnect after a failed transfer,
+        or a net_dl.retry.RetryPolicy; reconnections continue from the last
+        byte on disk when the server supports 'Range' requests
+    :ivar speed_limit: min. transfer rate in bytes/s; a connection that stays
+        slower for speed_time seconds is dropped and retried (0 disables)
+    :ivar speed_time: see speed_limit
+    :ivar fsync: when to sync downloaded data to disk: 'none', 'end' (before
+        the file is moved into place) or a number of bytes between syncs
+    :ivar checksum: expected digest of the file, as '<algorithm>:<hex digest>'
+        where algorithm is one of md5, sha256, sha512
+    :ivar validator_cache: a net_dl.ValidatorCache (or True for the default
+        cache file, or a file path) used to skip re-downloading files the
+        server reports as not modified
+    :ivar store: a net_dl.ContentStore (or True for the default folder, or a
+        folder path) holding files by digest; a matching file is linked from
+        it instead of being downloaded, and finished downloads are added
+    :ivar head_request: learn the URL's size, type and filename from a HEAD
+        request before downloading; if False, they're taken from the
+        response to the GET request itself, saving a round trip (HEAD is
+        still used to check 'Range' support when resuming)
+    :ivar delta: update an existing copy of the file by downloading only the
+        blocks that changed, using the block index (see net_dl.delta) at
+        this URL, or next to the file if True; the whole file is downloaded
+        if there's no index or the update fails
+    :ivar extract_to: folder to unpack the file into as it downloads, if
+        it's a tar (plain, or compressed with gzip, bzip2 or xz) or zip
+        archive; the file is then fetched in a single stream, and members
+        that would end up outside of the folder stop the extraction
+    :ivar keep_archive: with extract_to, keep the downloaded archive in
+        destdir instead of removing it once it's unpacked
+    :ivar compress: ask the server to compress the transfer (gzip, deflate,
+        and br or zstd if their decoders are installed); the file is saved
+        decompressed, progress counts compressed bytes, and a compressed
+        transfer can't be resumed or segmented
+    :ivar session: a net_dl.Session (or requests.Session) to share pooled
+        connections with other downloads; the module-wide default is used if
+        not given
+    :ivar stats: net_dl.DownloadStats of the latest run of get() (timings,
+        redirects, bytes transferred, retries, rates)
     """
     def __init__(
         self,
         url=None,
+        mirrors=None,
         destdir=getcwd(),
         destname=None,
+        is_file=None,
         request_headers=None,
         chunk_size=None,
+        min_chunk_size=config.MIN_CHUNK_SIZE,
+        max_chunk_size=config.MAX_CHUNK_SIZE,
         progress_queue=None,
+        progress_interval=config.PROGRESS_INTERVAL,
         remove_on_error=True,
+        overwrite=False,
         resume=None,
+        segments=1,
         timeout=config.HTTP_TIMEOUT,
         callback=None,
         callback_args=list(),
         callback_kwargs=dict(),
+        checksum=None,
+        rate_limit=None,
+        retries=config.RETRIES,
+        speed_limit=config.SPEED_LIMIT,
+        speed_time=config.SPEED_TIME,
+        fsync=config.FSYNC,
+        validator_cache=None,
+        store=None,
+        head_request=True,
+        compress=False,
+        delta=None,
+        extract_to=None,
+        keep_archive=False,
+        session=None,
     ):
-        self.url = Url(url)
-        self.is_file = None
+        if session is None:
+            session = get_default_session()
+        self.session = session
+        self.is_file = is_file
         self.destdir = Path(destdir)
+        self.destname = destname
+        self.compress = compress
         self.request_headers = dict()
         if request_headers:
-            self.request_headers = request_headers
+            self.request_headers = dict(request_headers)
         if not self.request_headers.get('Accept-Encoding'):
-            self.request_headers['Accept-Encoding'] = 'identity'
+            self.request_headers['Accept-Encoding'] = self._get_accept_encoding()  # noqa: E501
+        self.url = Url(
+            url,
+            request_headers=dict(self.request_headers),
+            session=self.session,
+        )
+        self.mirrors = list(mirrors) if mirrors else list()
+        self.source = self.url  # where data is actually fetched from
+        self.sources = list()  # usable mirrors, fastest first
+        self._live_sources = set()
+        self._segments_left = 0
         self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
         self.progress_queue = progress_queue
+        self.progress_interval = progress_interval
+        self.progress_meter = None
         self.remove_on_error = remove_on_error
+        self.overwrite = overwrite
         self.resume = resume
+        self.segments = segments
         self.timeout = timeout
         self.callback = callback
         self.callback_args = callback_args
         self.callback_kwargs = callback_kwargs
+        self.checksum = None
+        if checksum:
+            self.checksum = parse_checksum(checksum)
+        self._hashers = list()
+        self.rate_limiter = get_rate_limiter(rate_limit)
+        self.retries = get_retry_policy(retries)
+        self.speed_limit = speed_limit
+        self.speed_time = speed_time
+        self.fsync = parse_fsync(fsync)
+        self._retry_errors = RETRY_ERRORS
+        self.validator_cache = get_validator_cache(validator_cache)
+        self.store = get_content_store(store)
+        self.head_request = head_request
+        self.delta = delta
+        self._block_index = None
+        self.extract_to = Path(extract_to) if extract_to else None
+        self.keep_archive = keep_archive
+        self._extractor = None
+        self._response = None
+        self.dest = None
+        self.part = None
+        self.journal = None
+        self._journal_lock = threading.Lock()
+        self._transfer_failed = False
+        self._content_encoding = None
+        self._wire_bytes = None
+        self._wire_size = None
+        self.stats = DownloadStats(self.url.path)
 
     def get(self):
         """The typical way to start the download task.
 
         Whether the URL is downloaded as a file or it's content is printed to
         stdout depends on the value of 'Content-Type' in the URL's response
-        headers.
+        headers, unless `is_file` or `destname` is given.
+
+        Returns 0 on success, otherwise 1; details of the run are then in
+        `stats`.
         """
-        self.url._ensure_head_response()
-        if self.url.head_response is None:
-            logging.error(f"No header response from \"{self.url}\"")
-            return 1
-        if self.url.head_response.status_code != 200:
-            if self.url.head_response.status_code == 404:
-                logging.error(
-                    f"{self.url.head_response.status_code}: "
-                    f"{self.url.head_response.reason}"
-                )
-                return 1
-            else:
-                logging.debug(self.url.head_response.__dict__)
-                logging.error(
-                    f"{self.url.head_response.status_code}: "
-                    f"{self.url.head_response.reason}"
-                )
-                return 1
-        if self.chunk_size is None:
-            # Ensure at least 2 chunks so that progress queue doesn't hang.
-            if self.url.size is None:
-                self.chunk_size = 10*1024  # fallback, small value
+        start = monotonic()
+        self.stats = DownloadStats(self.url.path)
+        status = 1
+        self._set_conditional_headers()
+        try:
+            if self.mirrors:
+                with self.stats.timer('head'):
+                    self._probe_mirrors()
+            elif self.head_request:
+                with self.stats.timer('head'):
+                    self.url._ensure_head_response()
             else:
-                self.chunk_size = min(round(self.url.size / 2), 100*1024)
-        if self.url.is_file:
-            self.get_file()
-        else:
-            self.get_text()
-        return 0
+                self._open_response()
+            if self._is_not_modified():
+                status = 0
+            elif self._check_head_response():
+                if self._saves_file():
+                    self.get_file()
+                else:
+                    self.get_text()
+                status = 0
+            return status
+        finally:
+            self._close_response()
+            self._finish_stats(status, monotonic() - start)
 
     def get_content(self):
         """Explicitly download the URL's content, regardless of 'Content-Type'.
+
+        All of the content is held in memory; use iter_content() or
+        stream_to() for large responses.
         """
-        return self._get_completed_request_obj()._content
+        return b''.join(self.iter_content())
 
     def get_text(self):
         """Explicitly download the URL's text content.
 
-        This method is automatically used if Content-Type is "text-like".
+        This method is automatically used if Content-Type is "text-like". The
+        text is decoded and written to stdout as it arrives, so memory use
+        stays bounded.
         """
-        r = self._get_completed_request_obj()
-        if r:
-            print(r.text)
+        try:
+            with self.stats.timer('transfer'), self._open_stream() as r:
+                # Not r.encoding: requests assumes ISO-8859-1 for text
+                # without a charset.
+                decoder = self._get_text_decoder(_get_charset(r.headers))
+                for chunk in self._iter_response(r):
+                    sys.stdout.write(decoder.decode(chunk))
+                sys.stdout.write(decoder.decode(b'', final=True))
+        except config.HTTP_ERRORS as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                logging.error(e)
+            else:
+                logging.error(f"{type(e)}: {e}")
+            return
+        print()
+
+    def iter_content(self):
+        """Explicitly download the URL's content, yielding it in chunks as it
+        arrives, regardless of 'Content-Type'.
+
+        Memory use is bounded by the chunk size (see `chunk_size` and
+        `max_chunk_size`) however large the content is. Compressed content
+        (see `compress`) is decoded.
+        """
+        with self.stats.timer('transfer'), self._open_stream() as r:
+            yield from self._iter_response(r)
+
+    def stream_to(self, sink):
+        """Explicitly download the URL's content into sink, any object with a
+        write() method that takes bytes (e.g. a file opened in binary mode),
+        regardless of 'Content-Type'.
+
+        Memory use stays bounded however large the content is. Returns the
+        number of bytes written.
+        """
+        size = 0
+        for chunk in self.iter_content():
+            sink.write(chunk)
+            size += len(chunk)
+        return size
 
     def get_file(self, file_mode='wb'):
         """Explicitly download the URL as a file.
@@ -126,103 +350,156 @@ class Download:
         else:
             use_own_queue = False
 
-        # Determine output filename.
-        # TODO: Make filename an attribute of the Url object.
-        filename = self.url._get_content_disposition_filename()
-        if filename is None:  # get from URL
-            filename = unquote(self.url.final_url.split('/')[-1])
-        self.dest = LocalFile(self.destdir / filename)
-        logging.debug(f"{str(self.dest)=}")
-
-        # If file exists try to resume download.
-        if self.url.size:
-            self.remaining_size = self.url.size
-        else:
-            self.resume = False  # can't resume if filesize is unknown
-            self.remaining_size = 0
-        if self.dest.path.is_file():
-            logging.debug(f"Destination file exists: {self.dest.path}")
-            local_size = self.dest.get_size()
-            logging.debug(f"Current downloaded size [B]: {local_size}")
-            if (
-                self.resume
-                and local_size < self.url.size
-                and self.url.head_response.headers.get('Accept-Ranges') == 'bytes'  # noqa: E501
-                and self._check_server_accepts_range()
-            ):
-                logging.debug("Resuming download.")
-                file_mode = 'ab'
-                if isinstance(self.url.size, int):
-                    self.remaining_size = self.url.size - local_size
-                    self.request_headers['Range'] = f'bytes={local_size}-{self.url.size}'  # noqa: E501
-                else:
-                    self.requeset_headers['Range'] = f'bytes={local_size}-'
-            elif self.url.size and local_size == self.url.size:
-                logging.debug("File already downloaded. Verifying integrity.")
-                sum_type = None
-                if self.url.md5:
-                    sum_type = 'md5'
-                if self._check_integrity(sum_type=sum_type):
-                    logging.info(f"File already exists: {self.dest.path}")
-                    return
-                else:
-                    logging.debug("Redownloading file.")
-            else:
-                if self.url.size:
-                    logging.debug("Local file size mismatch; restarting download.")  # noqa: E501
-                else:
-                    logging.debug("File size unknown; starting download.")
-
-        # Log download type.
-        if 'Range' in self.request_headers.keys():
-            verb = "Continuing"
-        else:
-            verb = "Starting new"
-        logging.info(f"{verb} download from: {self.url.path}")
+        self._set_dest()
+        if self.delta and not self.extract_to:
+            self._set_block_index()
+        # Data must reach the extractor in order.
+        file_mode = self._prepare_dest(file_mode, segmented=not self.extract_to)  # noqa: E501
+        if file_mode is None:
+            self._close_response()
+            self._cache_validators()
+            if not self._extract_file():
+                sys.exit(1)
+            return  # already downloaded
+        if self._get_from_store():
+            self._close_response()
+            self._cache_validators()
+            if not self._extract_file():
+                sys.exit(1)
+            self._remove_archive()
+            return
 
         # Check for available disk space.
         if not self._check_disk_space():
             logging.critical("Not enough disk space.")
             # sys.exit(1)
             return
+        self.stats.resumed_bytes = (self.url.size or 0) - self.remaining_size
+
+        if file_mode == 'wb' and self._can_update_delta():
+            self._close_response()
+            self._run_transfer(self._get_delta_request, file_mode, use_own_queue)  # noqa: E501
+            if self._check_delta():
+                if not self._finish_file():
+                    sys.exit(1)
+                self._add_to_store()
+                self._cache_validators()
+                return
+            self._set_dest()  # fall back to downloading the whole file
 
         # Start download thread.
-        t = threading.Thread(
-            target=self._get_stream_request,
-            kwargs={'file_mode': file_mode},
-            daemon=True,
-        )
-        logging.debug("Starting stream request download thread.")
-        t.start()
-        # Show download progress.
-        while t.is_alive():
-            if use_own_queue:
-                try:
-                    p = self.progress_queue.get(timeout=10)
-                except Empty:
-                    continue  # checks to see if thread is still alive
-                self._write_progress_bar(p)
-            else:
-                sleep(0.1)
-        if use_own_queue and sys.stdout.isatty():
-            print()  # newline after progress bar is done
+        if file_mode == 'r+b' or (file_mode == 'wb' and self._use_segments()):
+            target = self._get_segmented_request
+        else:
+            target = self._get_stream_request
+        if file_mode != 'wb' or target != self._get_stream_request:
+            self._close_response()  # can't be used for this transfer
+        self._run_transfer(target, file_mode, use_own_queue)
 
-        logging.info(f"File saved as: {self.dest.path}")
-        if not self._check_integrity():
-            logging.critical("Integrity check failed")
+        if not self._finish_file():
             sys.exit(1)
+        self._add_to_store()
+        self._cache_validators()
+        self._remove_archive()
+
+    def _check_head_response(self):
+        if self.url.head_response is None:
+            logging.error(f"No header response from \"{self.url}\"")
+            return False
+        if self.url.head_response.status_code != 200:
+            if self.url.head_response.status_code != 404:
+                logging.debug(self.url.head_response.__dict__)
+            logging.error(
+                f"{self.url.head_response.status_code}: "
+                f"{self.url.head_response.reason}"
+            )
+            return False
+        return True
+
+    def _check_response_status(self, status, reason, headers):
+        if status >= 400:
+            raise HTTPStatusError(
+                status,
+                reason,
+                retry_after=headers.get('Retry-After'),
+            )
 
     def _check_server_accepts_range(self):
         # Ref: https://stackoverflow.com/a/50635525
         accepts = False
-        request_headers = {'Range': 'bytes=0-1'}
-        url = Url(self.url.path, request_headers=request_headers)
-        r = url.get_head_response()
+        request_headers = {**self.request_headers, 'Range': 'bytes=0-1'}
+        r = Url.get_head_response(
+            self.source.path,
+            request_headers=request_headers,
+            timeout=self.timeout,
+            session=self.session,
+        )
+        if r is None:
+            return accepts
         logging.debug(f"Accepts Range check: {r.status_code=}; {r.headers=}")
         if r.status_code == 206 and 'Content-Range' in r.headers.keys():
             accepts = True
         return accepts
 
+    def _close_response(self):
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def _add_to_store(self):
+        if self.store is None:
+            return
+        # Only store the file under digests it actually has.
+        keys = [
+            (algorithm, digest) for algorithm, digest in self._get_store_keys()
+            if (
+                self.dest.digests.get(algorithm)
+                or self.dest.get_digest(algorithm)
+            ) == digest
+        ]
+        if keys:
+            self.store.add(keys, self.dest.path)
+
+    def _cache_validators(self):
+        if self.validator_cache is None:
+            return
+        self.validator_cache.record(
+            self.url.path,
+            self.dest.path,
+            self.url.head_response.headers,
+            destname=self.destname,
+        )
+
+    def _can_resume(self, local_size):
+        return (
+            self.resume
+            and not self.url.encoding
+            and local_size < self.url.size
+            and self.url.head_response.headers.get('Accept-Ranges') == 'bytes'
+        )
+
+    def _can_update_delta(self):
+        return (
+            self._block_index is not None
+            and self.dest.path.is_file()
+            and not self._content_encoding
+            and not self.url.encoding
+        )
+
+    def _check_delta(self):
+        """Return True if the delta update produced the expected file."""
+        if self._transfer_failed:
+            self._transfer_failed = False
+            logging.warning("Delta update failed; downloading the whole file.")  # noqa: E501
+            return False
+        if not self._check_integrity(
+            sum_type=self._get_sum_type(),
+            local_file=self.part,
+        ):
+            logging.warning("Delta update failed verification; downloading the whole file.")  # noqa: E501
+            return False
+        return True
+
     def _check_disk_space(self):
         free = shutil.disk_usage(self.dest.path.parent).free
         logging.info(f"{self.remaining_size} B needed; {free} B available")
@@ -230,96 +507,1205 @@ class Download:
             return False
         return True
 
-    def _check_integrity(self, sum_type=None):
+    def _check_integrity(self, sum_type=None, local_file=None):
+        start = monotonic()
+        if local_file is None:
+            local_file = self.dest
         result = True
-        if not self.dest.path.is_file():
-            logging.error(f"File does not exist: {self.dest.path}")
+        if not local_file.path.is_file():
+            logging.error(f"File does not exist: {local_file.path}")
             result = False
-        if result and self.url.size:
-            result = self.dest.size == self.url.size
-            logging.info(f"Size on server: {self.url.size}; downloaded size: {self.dest.size}")  # noqa: E501
+        if result and self._content_encoding:
+            # The file is saved decoded, but Content-Length gives the size of
+            # the encoded data, so check that against the bytes received.
+            if self._wire_size:
+                result = self._wire_bytes == self._wire_size
+                logging.info(f"Encoded size on server: {self._wire_size}; received: {self._wire_bytes}")  # noqa: E501
+                logging.debug(f"Same size: {result}")
+        elif result and self.url.size and not self.url.encoding:
+            result = local_file.size == self.url.size
+            logging.info(f"Size on server: {self.url.size}; downloaded size: {local_file.size}")  # noqa: E501
             logging.debug(f"Same size: {result}")
         if result and sum_type == 'md5':
-            logging.info(f"MD5 on server: {self.url.md5}; downloaded MD5: {self.dest.md5}")  # noqa: E501
-            result = self.dest.md5 == self.url.md5
+            if local_file.md5 is None:  # not hashed during download
+                local_file.get_md5()
+            logging.info(f"MD5 on server: {self.url.md5}; downloaded MD5: {local_file.md5}")  # noqa: E501
+            result = local_file.md5 == self.url.md5
             logging.debug(f"Same MD5: {result}")
+        if result and self.checksum:
+            algorithm, expected = self.checksum
+            digest = local_file.digests.get(algorithm)
+            if digest is None:  # not hashed during download
+                digest = local_file.get_digest(algorithm)
+            logging.info(f"Expected {algorithm}: {expected}; downloaded {algorithm}: {digest}")  # noqa: E501
+            result = digest == expected
+            logging.debug(f"Same {algorithm}: {result}")
+        if result and self._block_index is not None:
+            digest = local_file.digests.get('sha256')
+            if digest is None:  # not hashed during download
+                digest = local_file.get_digest('sha256')
+            logging.info(f"Block index sha256: {self._block_index.sha256}; downloaded sha256: {digest}")  # noqa: E501
+            result = digest == self._block_index.sha256
+            logging.debug(f"Same sha256: {result}")
+        self.stats.add_time('verify', monotonic() - start)
         return result
 
-    def _get_completed_request_obj(self):
+    def _checkpoint(self, f):
+        """Make sure the data written so far is on disk, then record it in
+        the journal.
+        """
+        if self.journal is None or f.closed:
+            return
+        f.commit()
+        self.journal.committed = f.tell()
+        self.journal.save()
+
+    def _checkpoint_segment(self, f, segment):
+        if f.closed:
+            return
+        if self.journal is not None:
+            f.commit()
+        else:
+            f.flush()
+        with self._journal_lock:
+            segment[2] = f.tell() - segment[0]
+            if self.journal is not None:
+                self.journal.save()
+
+    def _extract_file(self):
+        """Unpack the already downloaded file, if asked to; returns False if
+        that fails.
+        """
+        if not self.extract_to:
+            return True
         try:
-            r = requests.get(
+            members = extract_file(self.dest.path, self.extract_to)
+        except (ExtractError, OSError) as e:
+            logging.error(f"Extraction failed: {e}")
+            return False
+        logging.info(f"Extracted {len(members)} items into: {self.extract_to}")  # noqa: E501
+        return True
+
+    def _finish_extractor(self):
+        """Wait for the rest of the archive to be unpacked; returns False if
+        that fails.
+        """
+        if self._extractor is None:
+            return True
+        extractor = self._extractor
+        self._extractor = None
+        try:
+            members = extractor.close()
+        except ExtractError as e:
+            logging.error(f"Extraction failed: {e}")
+            return False
+        logging.info(f"Extracted {len(members)} items into: {self.extract_to}")  # noqa: E501
+        return True
+
+    def _finish_file(self):
+        """Verify the .part file and move it into place.
+
+        Returns True if the file passed the integrity check.
+        """
+        if self._transfer_failed:
+            logging.error(f"Download incomplete: {self.url}")
+            return False
+        if not self._check_integrity(
+            sum_type=self._get_sum_type(),
+            local_file=self.part,
+        ):
+            logging.critical("Integrity check failed")
+            if self.remove_on_error:
+                self._remove_part()
+            return False
+        # Atomic, so other processes never see a partly-written file.
+        self.part.path.replace(self.dest.path)
+        self.part.path = self.dest.path
+        self.dest = self.part
+        if self.journal is not None:
+            self.journal.remove()
+        logging.info(f"File saved as: {self.dest.path}")
+        return True
+
+    def _finish_transfer(self, last_modified=None):
+        self.part.get_size()  # buffered writes are flushed once file closes
+        self._finish_hashers()
+        self._finish_progress()
+        # Set file's mtime from server.
+        if last_modified:
+            self.part.set_mtime(last_modified)
+
+    def _iter_response(self, r):
+        """Yield the (decoded) content of the streamed response r."""
+        received = 0
+        for chunk in self._iter_chunks(r):
+            # Count bytes as they came over the network.
+            self.stats.add_bytes(r.raw.tell() - received)
+            received = r.raw.tell()
+            yield chunk
+
+    def _open_stream(self):
+        """Return the response to a streamed GET request for the URL, or
+        raise HTTPStatusError if it's an error.
+        """
+        r = self._response
+        self._response = None
+        if r is None:
+            r = self.session.get(
                 str(self.url),
+                stream=True,
                 headers=self.request_headers,
                 timeout=self.timeout,
                 allow_redirects=True,
             )
-        except config.HTTP_ERRORS as e:
-            if isinstance(e, requests.exceptions.ConnectionError):
-                logging.error(e)
-            else:
-                logging.error(f"{type(e)}: {e}")
-                return
+            self.stats.record_response(r)
+        if r.status_code >= 400:
+            r.close()
+        self._check_response_status(r.status_code, r.reason, r.headers)
         return r
 
     def _get_stream_request(self, file_mode='wb'):
         logging.debug(f"Download._get_stream_request for: {self.url}")
         logging.debug(f"{self.request_headers=}")
-        logging.debug(f"{self.chunk_size=}")
+        logging.debug(f"{self.chunk_size=}")  # None means adaptive
         logging.debug(f"{self.timeout=}")
-        try:
-            with requests.get(
-                str(self.url),
+        self._start_hashers(file_mode)
+        self._start_extractor(file_mode)
+        self._start_progress(initial=self._get_part_size(file_mode))
+        attempt = 0
+        while True:
+            try:
+                last_modified = self._stream_to_part(file_mode)
+                break
+            except ExtractError as e:
+                logging.error(f"Extraction failed: {e}")
+                self._handle_extract_error()
+                return
+            except config.HTTP_ERRORS as e:
+                if sys.stdout.isatty():
+                    print()
+                if self._switch_source(e):
+                    self.stats.retries += 1
+                    file_mode = self._get_retry_mode()
+                    continue
+                attempt += 1
+                delay = self._get_retry_delay(e, attempt)
+                if delay is None:
+                    if isinstance(e, requests.exceptions.ConnectionError):
+                        logging.error(e)
+                    else:
+                        logging.error(f"{type(e)}: {e}")
+                    self._handle_transfer_error()
+                    return
+                logging.warning(f"{e}; retrying in {delay:.1f} s")
+                self.stats.retries += 1
+                sleep(delay)
+                file_mode = self._get_retry_mode()
+
+        if not self._finish_extractor():
+            self._handle_extract_error()
+            return
+        self._finish_transfer(last_modified)
+
+    def _stream_to_part(self, file_mode):
+        """Make one attempt at streaming the URL into the .part file.
+
+        Returns the response's Last-Modified header.
+        """
+        r = self._response
+        self._response = None
+        if r is None:
+            r = self.session.get(
+                str(self.source),
                 stream=True,
                 headers=self.request_headers,
-                timeout=self.timeout,
+                timeout=self._get_timeout(),
+                allow_redirects=True,
+            )
+            self.stats.record_response(r)
+        with r:
+            logging.debug(f"Response {r.headers=}")
+            self._check_response_status(r.status_code, r.reason, r.headers)
+            self._set_content_encoding(r.headers)
+            # Decoded data can't be continued from an offset in the encoded
+            # data.
+            if file_mode == 'ab' and (
+                r.status_code != 206 or self._content_encoding
+            ):
+                logging.debug("Range not honored; restarting download.")
+                file_mode = 'wb'
+                self._restart_transfer()
+            if self._content_encoding:
+                # Progress counts encoded bytes, so compare with their total.
+                self.progress_meter.total = self._wire_size
+            with self._open_part(file_mode) as f:
+                if file_mode == 'wb':
+                    verb = 'Writing'
+                elif file_mode == 'ab':
+                    verb = 'Appending'
+                logging.debug(f"{verb} data to file: {self.part.path}")
+                self._start_journal(committed=f.tell())
+                stall_detector = self._get_stall_detector()
+                received = 0
+                try:
+                    for chunk in self._iter_chunks(r):
+                        nbytes = len(chunk)
+                        if self._content_encoding:
+                            # Count bytes as they came over the network.
+                            nbytes = r.raw.tell() - received
+                            received += nbytes
+                        self._write_chunk(f, chunk, nbytes)
+                        waited = self._throttle(nbytes)
+                        stall_detector.update(nbytes, idle=waited)
+                finally:
+                    self._checkpoint(f)
+            self._wire_bytes = r.raw.tell()
+            return r.headers.get('Last-Modified')
+
+    def _get_accept_encoding(self):
+        if self.compress:
+            return ACCEPT_ENCODING  # the codings urllib3 can decode here
+        return 'identity'
+
+    def _get_delta_ranges(self, f, ranges):
+        """Download byte ranges of the file into the open .part file f,
+        asking for several at a time.
+        """
+        request_headers = dict(self.request_headers)
+        request_headers['Accept-Encoding'] = 'identity'
+        for i in range(0, len(ranges), config.DELTA_MAX_RANGES):
+            batch = ranges[i:i + config.DELTA_MAX_RANGES]
+            request_headers['Range'] = 'bytes=' + ','.join(f"{a}-{b}" for a, b in batch)  # noqa: E501
+            expected = sum(b - a + 1 for a, b in batch)
+            received = 0
+            with self.session.get(
+                str(self.source),
+                stream=True,
+                headers=request_headers,
+                timeout=self._get_timeout(),
                 allow_redirects=True,
             ) as r:
-                logging.debug(f"Response {r.headers=}")
-                with self.dest.path.open(mode=file_mode) as f:
-                    if file_mode == 'wb':
-                        verb = 'Writing'
-                    elif file_mode == 'ab':
-                        verb = 'Appending'
-                    logging.debug(f"{verb} data to file: {self.dest.path}")
-                    for chunk in r.iter_content(chunk_size=self.chunk_size):
-                        f.write(chunk)
-                        # Send progress value to queue param.
-                        local_size = self.dest.get_size()
-                        if self.url.size:
-                            size = self.url.size
-                        else:
-                            size = local_size  # fallback shows 100%
-                        percent = round(local_size / size * 100)
-                        self.progress_queue.put(percent)
-                        if self.callback:
-                            self.callback(
-                                *self.callback_args,
-                                **self.callback_kwargs,
-                            )
+                self.stats.record_response(r)
+                self._check_response_status(r.status_code, r.reason, r.headers)
+                if r.status_code != 206:
+                    raise ValueError(
+                        f"Expected 206 for {len(batch)} ranges; "
+                        f"got {r.status_code}: {r.reason}"
+                    )
+                for offset, data in iter_byteranges(self._iter_chunks(r), r.headers):  # noqa: E501
+                    if offset != f.tell():
+                        f.seek(offset)
+                    f.write(data)
+                    received += len(data)
+                    self._update_progress(len(data))
+                    self._throttle(len(data))
+            if received != expected:
+                raise ValueError(f"Received {received} of {expected} bytes of changed blocks")  # noqa: E501
+
+    def _get_delta_request(self, file_mode='wb'):
+        """Build the .part file from the blocks of the existing file that are
+        still current, and download the rest.
+        """
+        index = self._block_index
+        self._hashers = list()
+        try:
+            found = index.find_blocks(self.dest.path)
+            missing = [n for n in range(len(index.blocks)) if n not in found]
+            reused = sum(index.get_block_size(n) for n in found)
+            logging.info(
+                f"Delta update: reusing {format_size(reused)}; downloading "
+                f"{len(missing)} of {len(index.blocks)} blocks"
+            )
+            self.stats.resumed_bytes = reused
+            self._start_progress(initial=reused)
+            with self._open_part('wb') as f:
+                with self.dest.path.open('rb') as local:
+                    for number, offset in sorted(found.items()):
+                        local.seek(offset)
+                        f.seek(number * index.block_size)
+                        f.write(local.read(index.get_block_size(number)))
+                self._get_delta_ranges(f, index.get_ranges(missing))
+                f.seek(index.size)  # the file ends here
         except config.HTTP_ERRORS as e:
+            logging.warning(f"Delta update: {type(e)}: {e}")
+            self._transfer_failed = True
+            return
+        self._finish_transfer(
+            self.url.head_response.headers.get('Last-Modified')
+        )
+
+    def _get_chunk_sizer(self):
+        return ChunkSizer(
+            minimum=self.min_chunk_size,
+            maximum=self.max_chunk_size,
+        )
+
+    def _get_stall_detector(self):
+        return StallDetector(self.speed_limit, self.speed_time)
+
+    def _get_from_store(self):
+        """Link a matching file from the content store into place.
+
+        Returns True if one was found.
+        """
+        if self.store is None:
+            return False
+        # Content-Length of encoded content isn't the file's size.
+        size = None if self.url.encoding else self.url.size
+        obj = self.store.find(self._get_store_keys(), size=size)
+        if obj is None:
+            return False
+        link_or_copy(obj, self.dest.path)
+        self.dest = LocalFile(self.dest.path)
+        if not self._check_integrity(sum_type=self._get_sum_type()):
+            self.dest.path.unlink()
+            return False
+        if self.part.path.is_file():
+            self._remove_part()
+        logging.info(f"File linked from store: {self.dest.path}")
+        return True
+
+    def _get_store_keys(self):
+        """Return the (algorithm, hex digest) pairs the file is known by."""
+        keys = list()
+        if self.checksum:
+            keys.append(self.checksum)
+        if self.url.encoding:
+            return keys  # server digests are of the encoded data
+        if self.url.md5:
+            try:
+                keys.append(('md5', b64decode(self.url.md5, validate=True).hex()))  # noqa: E501
+            except ValueError:
+                logging.debug(f"Invalid Content-MD5: {self.url.md5}")
+        # Some servers (e.g. S3) use the MD5 digest as ETag.
+        etag = self.url.head_response.headers.get('ETag') or ''
+        m = re.fullmatch(r'"([0-9a-fA-F]{32})"', etag)
+        if m:
+            keys.append(('md5', m.group(1).lower()))
+        return list(dict.fromkeys(keys))
+
+    def _get_sum_type(self):
+        # Content-MD5 is the digest of the encoded data.
+        if self.url.md5 and not self.url.encoding:
+            return 'md5'
+
+    def _get_range_sources(self):
+        sources = [u for u in self.sources if accepts_ranges(u)]
+        return sources or [self.source]
+
+    def _get_segments(self, source, pending, errors):
+        """Download segments from source until none are left or it fails."""
+        while source in self._live_sources:
+            with self._journal_lock:
+                if self._segments_left == 0:
+                    return
+            try:
+                segment = pending.get(timeout=0.1)
+            except Empty:
+                continue  # others may give segments back if they fail
+            error = self._get_segment(segment, source)
+            with self._journal_lock:
+                if error is None:
+                    self._segments_left -= 1
+                    continue
+                self._live_sources.discard(source)
+                fallback = bool(self._live_sources)
+                if fallback:
+                    self.stats.retries += 1
+            if fallback:
+                logging.warning(f"Dropping mirror {source}: {error}")
+                pending.put(segment)
+            else:
+                errors.append(error)
+            return
+
+    def _get_segment_ranges(self, count=None):
+        """Split the remote file into inclusive (start, end) byte ranges."""
+        if count is None:
+            count = self.segments
+        count = min(count, max(1, self.url.size // config.SEGMENT_MIN_SIZE))
+        step = -(-self.url.size // count)  # ceiling division
+        return [
+            (start, min(start + step, self.url.size) - 1)
+            for start in range(0, self.url.size, step)
+        ]
+
+    def _get_text_decoder(self, encoding):
+        """Return an incremental decoder for text in encoding, which falls
+        back to UTF-8 if it's unknown or not given.
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')
+        except LookupError:
+            logging.debug(f"Unknown text encoding: {encoding}")
+            decoder = codecs.getincrementaldecoder('utf-8')
+        return decoder(errors='replace')
+
+    def _get_timeout(self):
+        # A connection that sends nothing at all would be dropped by the
+        # stall check anyway, so don't wait longer than that for a read.
+        if self.speed_limit and self.speed_time:
+            return (self.timeout, min(self.timeout, self.speed_time))
+        return self.timeout
+
+    def _get_journal_path(self):
+        return self.part.path.with_name(f"{self.part.path.name}.json")
+
+    def _get_part_size(self, file_mode='ab'):
+        if file_mode == 'wb' or not self.part.path.is_file():
+            return 0
+        return self.part.path.stat().st_size
+
+    def _get_retry_delay(self, error, attempt):
+        """Return the number of seconds to wait before retrying after error,
+        or None if the download should fail.
+        """
+        if not self._is_retryable(error):
+            return None
+        return self.retries.get_delay(
+            attempt,
+            retry_after=getattr(error, 'retry_after', None),
+        )
+
+    def _is_retryable(self, error):
+        if isinstance(error, HTTPStatusError):
+            return error.retryable
+        return isinstance(error, self._retry_errors)
+
+    def _get_retry_mode(self):
+        """Return the mode to reopen the .part file with when reconnecting,
+        continuing from the last byte on disk if the server allows it.
+        """
+        size = self._get_part_size()
+        if (
+            0 < size < (self.url.size or 0)
+            and not self._content_encoding
+            and accepts_ranges(self.source)
+        ):
+            logging.info(f"Reconnecting from byte {size}.")
+            self.request_headers['Range'] = f'bytes={size}-{self.url.size - 1}'  # noqa: E501
+            return 'ab'
+        self.request_headers.pop('Range', None)
+        self._restart_transfer()
+        return 'wb'
+
+    def _get_segment(self, segment, source):
+        """Download the rest of a segment from source.
+
+        Returns the error if it fails. Errors are only retried on the same
+        source if there's no other one to fall back on.
+        """
+        attempt = 0
+        while True:
+            try:
+                self._get_segment_range(segment, source)
+                return None
+            except config.HTTP_ERRORS as e:
+                if len(self._live_sources) > 1:
+                    return e
+                attempt += 1
+                delay = self._get_retry_delay(e, attempt)
+                if delay is None:
+                    return e
+                logging.warning(
+                    f"Segment {segment[0]}-{segment[1]}: {e}; "
+                    f"retrying in {delay:.1f} s"
+                )
+                with self._journal_lock:
+                    self.stats.retries += 1
+                sleep(delay)
+
+    def _get_segment_range(self, segment, source):
+        """Make one attempt at downloading the rest of a segment."""
+        start, end, committed = segment
+        if start + committed > end:
+            return
+        request_headers = dict(self.request_headers)
+        request_headers['Range'] = f'bytes={start + committed}-{end}'
+        # Segments are offsets into the file itself, not encoded data.
+        request_headers['Accept-Encoding'] = 'identity'
+        logging.debug(f"Getting segment from {source}: {request_headers['Range']}")  # noqa: E501
+        with self.session.get(
+            str(source),
+            stream=True,
+            headers=request_headers,
+            timeout=self._get_timeout(),
+            allow_redirects=True,
+        ) as r:
+            self.stats.record_response(r)
+            self._check_response_status(r.status_code, r.reason, r.headers)
+            if r.status_code != 206:
+                raise ValueError(
+                    f"Expected 206 for range {start}-{end}; "
+                    f"got {r.status_code}: {r.reason}"
+                )
+            with self._open_part('r+b', offset=start + committed) as f:
+                stall_detector = self._get_stall_detector()
+                try:
+                    for chunk in self._iter_chunks(r):
+                        f.write(chunk)
+                        self._update_progress(len(chunk))
+                        waited = self._throttle(len(chunk))
+                        stall_detector.update(len(chunk), idle=waited)
+                        if f.tell() - start - segment[2] >= config.JOURNAL_INTERVAL:  # noqa: E501
+                            self._checkpoint_segment(f, segment)
+                finally:
+                    self._checkpoint_segment(f, segment)
+
+    def _get_segmented_request(self, file_mode='wb'):
+        logging.debug(f"Download._get_segmented_request for: {self.url}")
+        sources = self._get_range_sources()
+        # Connections are spread over the sources; with several mirrors the
+        # file is cut into more segments than connections, so that faster
+        # mirrors end up fetching more of them.
+        workers = [
+            sources[i % len(sources)]
+            for i in range(max(self.segments or 1, len(sources)))
+        ]
+        if file_mode == 'r+b':
+            segments = self.journal.segments
+        else:
+            count = len(workers)
+            if len(sources) > 1:
+                count *= config.MIRROR_SEGMENTS
+            segments = [
+                [start, end, 0]
+                for start, end in self._get_segment_ranges(count)
+            ]
+            # Reserve the full file size so that each segment can be written
+            # in place at its own offset.
+            allocate(self.part.path, self.url.size)
+            self._start_journal(segments=segments)
+        logging.debug(f"Downloading in {len(segments)} segments: {segments}")
+        self._start_progress(initial=sum(s[2] for s in segments))
+        pending = Queue()
+        for segment in segments:
+            if segment[0] + segment[2] <= segment[1]:  # not yet complete
+                pending.put(segment)
+        self._segments_left = pending.qsize()
+        self._live_sources = set(sources)
+        errors = []
+        threads = [
+            threading.Thread(
+                target=self._get_segments,
+                args=(source, pending, errors),
+                daemon=True,
+            )
+            for source in workers
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if errors or self.progress_meter.bytes_done != self.url.size:
             if sys.stdout.isatty():
                 print()
-            if isinstance(e, requests.exceptions.ConnectionError):
-                logging.error(e)
-            else:
+            for e in errors:
                 logging.error(f"{type(e)}: {e}")
-            if self.remove_on_error:
-                logging.info(f"Deleting file: {self.dest.path}")
-                self.dest.path.unlink()
+            self._handle_transfer_error()
             return
 
-        # Set file's mtime from server.
-        url_mtime = r.headers.get('Last-Modified')
-        if url_mtime:
-            self.dest.set_mtime(url_mtime)
+        self._finish_transfer(
+            self.url.head_response.headers.get('Last-Modified')
+        )
+
+    def _handle_extract_error(self):
+        # Resuming a download that can't be unpacked would fail again.
+        self._transfer_failed = True
+        self._stop_extractor()
+        self.journal = None
+        self._remove_part()
+
+    def _handle_transfer_error(self):
+        self._transfer_failed = True
+        self._stop_extractor()
+        if self.journal is not None:
+            logging.info(f"Partial download kept for resuming: {self.part.path}")  # noqa: E501
+        elif self.remove_on_error:
+            self._remove_part()
+
+    def _is_not_modified(self):
+        if self.url.head_response is None:
+            return False
+        if (
+            self.url.head_response.status_code != 304
+            or self.validator_cache is None
+        ):
+            return False
+        entry = self.validator_cache.get(
+            self.url.path, self.destdir, self.destname
+        )
+        if entry is None:
+            return False
+        self.dest = LocalFile(entry.get('dest'))
+        logging.info(f"File not modified on server: {self.dest.path}")
+        return True
+
+    def _is_saved_copy(self):
+        """Return True if the destination file is the one saved from the
+        URL's current content: it has the mtime given to it from
+        Last-Modified, or the validator cache has it under the server's
+        current ETag.
+        """
+        headers = self.url.head_response.headers
+        last_modified = headers.get('Last-Modified')
+        if last_modified:
+            try:
+                timestamp = LocalFile.get_timestamp(last_modified)
+            except ValueError:
+                timestamp = None
+            if int(self.dest.get_mtime()) == timestamp:
+                return True
+        if self.validator_cache is None or not headers.get('ETag'):
+            return False
+        entry = self.validator_cache.get(
+            self.url.path, self.destdir, self.destname
+        )
+        return (
+            entry is not None
+            and entry.get('dest') == str(self.dest.path.resolve())
+            and entry.get('etag') == headers.get('ETag')
+        )
+
+    def _iter_chunks(self, r):
+        if self.chunk_size:
+            return r.iter_content(chunk_size=self.chunk_size)
+        return iter_chunks(
+            lambda n: r.raw.read(n, decode_content=True),
+            self._get_chunk_sizer(),
+        )
+
+    def _new_journal(self):
+        """Return a Journal for this download, or None if it could not be
+        resumed anyway.
+        """
+        headers = self.url.head_response.headers
+        if not self.url.size or headers.get('Accept-Ranges') != 'bytes':
+            return None
+        if self._content_encoding or self.url.encoding:
+            return None  # decoded data can't be resumed by offset
+        if not headers.get('ETag') and not headers.get('Last-Modified'):
+            return None
+        return Journal(
+            self._get_journal_path(),
+            url=self.url.path,
+            size=self.url.size,
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+        )
+
+    def _open_response(self):
+        """Start the GET request and take the URL's properties from its
+        response headers, in place of a HEAD request.
+        """
+        logging.debug(f"Getting headers and content from {self.url}.")
+        # The GET is made conditional in place of the HEAD request.
+        headers = dict(self.request_headers)
+        for header in ('If-None-Match', 'If-Modified-Since'):
+            if header in self.url.request_headers:
+                headers[header] = self.url.request_headers.get(header)
+        try:
+            self._response = self.session.get(
+                str(self.source),
+                stream=True,
+                headers=headers,
+                timeout=self._get_timeout(),
+                allow_redirects=True,
+            )
+        except config.HTTP_ERRORS as e:
+            logging.error(f"{type(e)}: {e}")
+            return
+        logging.debug(f"Response headers:{self._response.headers}")
+        self.stats.record_response(self._response)
+        self.url._set_head_response(self._response)
+
+    def _open_part(self, file_mode, offset=0):
+        size = None
+        if (
+            file_mode != 'r+b'
+            and not self._content_encoding
+            and (self.journal is not None or self._new_journal() is not None)
+        ):
+            # Reserve space for the whole file. Without a journal, the file's
+            # size has to show how much of it is written, for resuming.
+            size = self.url.size
+        return FileWriter(
+            self.part.path,
+            mode=file_mode,
+            offset=offset,
+            size=size,
+            fsync=self.fsync,
+        )
+
+    def _probe_mirrors(self):
+        """Send HEAD requests to the URL and its mirrors at the same time and
+        rank the ones that serve the same file by latency and rate.
+        """
+        urls = [self.url] + [
+            Url(
+                m,
+                request_headers=dict(self.request_headers),
+                session=self.session,
+            )
+            for m in self.mirrors
+        ]
+        ranked = probe_mirrors(urls)
+        if (
+            self.url.head_response is not None
+            and self.url.head_response.status_code == 304
+        ):
+            return  # not modified
+        ok = [u for u in ranked if u.head_response.status_code == 200]
+        if not ok:
+            return
+        if self.url not in ok:
+            # The first mirror that answered takes the place of the URL.
+            failed = self.url
+            self.url = [u for u in urls if u in ok][0]
+            logging.warning(f"{failed} failed; using mirror {self.url}")
+        # same_file() always keeps the URL itself, so there's at least one.
+        self.sources = [u for u in ok if same_file(u, self.url)]
+        for url in ok:
+            if url not in self.sources:
+                logging.warning(f"Ignoring mirror that can't be shown to serve the same file: {url}")  # noqa: E501
+        if len(self.sources) > 1:
+            self.sources = rank_mirrors({u: ranked[u] for u in self.sources})
+        self.source = self.sources[0]
+        logging.info(f"Using {len(self.sources)} source(s); fastest: {self.source}")  # noqa: E501
+
+    def _prepare_dest(self, file_mode='wb', accepts_range=None, segmented=True):  # noqa: E501
+        """Decide how to write the download given any existing local data.
+
+        Returns the mode to open the .part file with ('wb' to start afresh,
+        'ab' to continue a single stream, 'r+b' to continue a segmented
+        download), or None if the file is already fully downloaded.
+        """
+        if accepts_range is None:
+            accepts_range = self._check_server_accepts_range
+        accepts_range = _once(accepts_range)
+        self.journal = None
+        self._transfer_failed = False
+        self._content_encoding = None
+        self._wire_bytes = None
+        self._wire_size = None
+        if self.url.size:
+            self.remaining_size = self.url.size
+        else:
+            self.resume = False  # can't resume if filesize is unknown
+            self.remaining_size = 0
+        if self.dest.path.is_file():
+            logging.debug(f"Destination file exists: {self.dest.path}")
+            local_size = self.dest.get_size()
+            logging.debug(f"Current downloaded size [B]: {local_size}")
+            if self.overwrite:
+                # Kept until the new copy is moved into its place.
+                logging.debug("Downloading file again to replace it.")
+            elif self._can_resume(local_size) and accepts_range():
+                # Continue the partial file instead of any older .part data.
+                logging.debug(f"Moving partial file to: {self.part.path}")
+                self.dest.path.replace(self.part.path)
+                self._get_journal_path().unlink(missing_ok=True)
+            elif self._sent_validators():
+                # Server answered the conditional request with new content.
+                logging.debug("File modified on server; restarting download.")
+            elif self.url.encoding:
+                # Content-Length is the size of the encoded data, not that of
+                # the (decoded) file, so go by the validators instead.
+                if self._is_saved_copy() and self._check_integrity(
+                    sum_type=self._get_sum_type()
+                ):
+                    logging.info(f"File already exists: {self.dest.path}")
+                    return None
+                logging.debug("Encoded content not known to be current; restarting download.")  # noqa: E501
+            elif self.url.size and local_size == self.url.size:
+                logging.debug("File already downloaded. Verifying integrity.")
+                if self._check_integrity(sum_type=self._get_sum_type()):
+                    logging.info(f"File already exists: {self.dest.path}")
+                    return None
+                else:
+                    logging.debug("Redownloading file.")
+            else:
+                if self.url.size:
+                    logging.debug("Local file size mismatch; restarting download.")  # noqa: E501
+                else:
+                    logging.debug("File size unknown; starting download.")
+        if self.part.path.is_file():
+            file_mode = self._prepare_part(file_mode, accepts_range, segmented)
+
+        # Log download type.
+        if file_mode != 'wb':
+            verb = "Continuing"
+        else:
+            verb = "Starting new"
+        logging.info(f"{verb} download from: {self.url.path}")
+        return file_mode
+
+    def _prepare_part(self, file_mode, accepts_range, segmented=True):
+        """Work out how much of an existing .part file can be kept."""
+        part_size = self.part.get_size()
+        logging.debug(f"Partial download exists: {self.part.path}; {part_size} B")  # noqa: E501
+        journal = Journal.load(self._get_journal_path())
+        if (
+            journal is not None
+            and journal.matches(self.url)
+            and (segmented or not journal.segments)
+            and accepts_range()
+        ):
+            logging.debug(f"Resuming from journal: {journal}")
+            self.journal = journal
+            self.remaining_size = self.url.size - journal.get_committed_size()
+            if journal.segments:
+                return 'r+b'
+            committed = min(journal.committed, part_size)
+        elif (
+            journal is None
+            and self.resume
+            and not self.url.encoding
+            and part_size < self.url.size
+            and self.url.head_response.headers.get('Accept-Ranges') == 'bytes'
+            and accepts_range()
+        ):
+            committed = part_size
+        else:
+            logging.debug("Discarding partial download.")
+            if journal is not None:
+                journal.remove()
+            return 'wb'
+        # Re-fetch at least the last byte so the transfer completes normally.
+        committed = min(committed, self.url.size - 1)
+        # Drop anything written after the last checkpoint.
+        with self.part.path.open(mode='r+b') as f:
+            f.truncate(committed)
+        self.part.size = committed
+        self.remaining_size = self.url.size - committed
+        self.request_headers['Range'] = f'bytes={committed}-{self.url.size - 1}'  # noqa: E501
+        return 'ab'
+
+    def _finish_progress(self):
+        progress = self.progress_meter.finish()
+        self.stats.add_rate(progress.rate)
+        self._put_progress(progress)
+        if self.callback:
+            self.callback(*self.callback_args, **self.callback_kwargs)
+
+    def _finish_stats(self, status, seconds):
+        self.stats.status = status
+        self.stats.add_time('total', seconds)
+        self.stats.size = self.url.size
+        self.stats.source = str(self.source)
+        response = self.url.head_response
+        if response is not None:
+            self.stats.final_url = self.url.final_url
+            self.stats.redirects = [
+                str(r.url) for r in getattr(response, 'history', list())
+            ]
 
-    def _write_progress_bar(self, percent):
+    def _put_progress(self, progress):
+        self.progress_queue.put(progress)
+
+    def _remove_part(self):
+        logging.info(f"Deleting file: {self.part.path}")
+        self.part.path.unlink(missing_ok=True)
+        self._get_journal_path().unlink(missing_ok=True)
+
+    def _remove_archive(self):
+        if self.extract_to and not self.keep_archive:
+            logging.info(f"Deleting file: {self.dest.path}")
+            self.dest.path.unlink(missing_ok=True)
+
+    def _run_transfer(self, target, file_mode, use_own_queue):
+        """Run target in a thread, showing its progress if the progress
+        queue is our own.
+        """
+        t = threading.Thread(
+            target=target,
+            kwargs={'file_mode': file_mode},
+            daemon=True,
+        )
+        logging.debug(f"Starting download thread: {target.__name__}")
+        with self.stats.timer('transfer'):
+            t.start()
+            # Show download progress.
+            if use_own_queue:
+                while t.is_alive() or not self.progress_queue.empty():
+                    try:
+                        p = self.progress_queue.get(timeout=0.1)
+                    except Empty:
+                        continue  # checks to see if thread is still alive
+                    self._write_progress_bar(p)
+                if sys.stdout.isatty():
+                    print()  # newline after progress bar is done
+            while t.is_alive():
+                t.join(timeout=0.1)
+
+    def _saves_file(self):
+        if self.is_file is not None:
+            return self.is_file
+        return bool(self.url.is_file or self.destname or self.extract_to)
+
+    def _sent_validators(self):
+        return any(
+            h in self.url.request_headers
+            for h in ('If-None-Match', 'If-Modified-Since')
+        )
+
+    def _set_block_index(self):
+        """Fetch the block index for a delta update; the updated file is
+        checked against its digest as well as any given checksum.
+        """
+        self._block_index = None
+        if not self.dest.path.is_file() or not self.url.size:
+            return
+        index_url = self.delta
+        if index_url is True:
+            index_url = f"{self.url.path}{config.DELTA_INDEX_SUFFIX}"
+        try:
+            r = self.session.get(
+                index_url,
+                headers={k: v for k, v in self.request_headers.items() if k != 'Range'},  # noqa: E501
+                timeout=self._get_timeout(),
+            )
+            r.raise_for_status()
+            index = BlockIndex.from_json(r.text)
+        except config.HTTP_ERRORS as e:
+            logging.info(f"No usable block index at {index_url}: {e}")
+            return
+        if index.size != self.url.size:
+            logging.warning(f"Ignoring outdated block index: {index_url}")
+            return
+        if (
+            self.checksum is not None
+            and self.checksum[0] == 'sha256'
+            and self.checksum[1] != index.sha256
+        ):
+            logging.warning(f"Ignoring block index for another file: {index_url}")  # noqa: E501
+            return
+        self._block_index = index
+
+    def _set_conditional_headers(self):
+        """Ask the server to skip the download if the cached file is current.
+        Only the HEAD request (or the GET request, if there's no HEAD) is made
+        conditional.
+        """
+        if self.validator_cache is None or self.url.head_response is not None:
+            return
+        self.url.request_headers.update(
+            self.validator_cache.get_request_headers(
+                self.url.path,
+                self.destdir,
+                self.destname,
+            )
+        )
+
+    def _set_content_encoding(self, response_headers):
+        """Note how the response body is encoded, and its encoded size."""
+        self._content_encoding = Url.get_content_encoding(response_headers)
+        self._wire_size = None
+        if self._content_encoding:
+            logging.debug(f"Decoding '{self._content_encoding}' content.")
+            self._wire_size = Url.get_size(response_headers)
+
+    def _set_dest(self):
+        self.dest = LocalFile(
+            self.destdir / (self.destname or self.url._get_filename())
+        )
+        self.part = LocalFile(f"{self.dest.path}.part")
+        logging.debug(f"{str(self.dest)=}")
+
+    def _restart_transfer(self):
+        """Discard hashes and progress of data that will be downloaded again.
+        """
+        self._start_hashers('wb')
+        if self._extractor is not None:
+            self._start_extractor('wb')
+        self._start_progress()
+        self.stats.resumed_bytes = 0
+
+    def _start_journal(self, committed=0, segments=None):
+        if self.journal is None:
+            self.journal = self._new_journal()
+        if self.journal is None:
+            return
+        self.journal.committed = committed
+        self.journal.segments = segments
+        self.journal.save()
+
+    def _start_progress(self, initial=0):
+        self.progress_meter = ProgressMeter(
+            total=self.url.size,
+            initial=initial,
+            interval=self.progress_interval,
+        )
+
+    def _start_hashers(self, file_mode='wb'):
+        """Set up the digests to compute while the file is written."""
+        algorithms = set()
+        if self._get_sum_type() == 'md5':
+            algorithms.add('md5')
+        if self.checksum:
+            algorithms.add(self.checksum[0])
+        if self._block_index is not None:
+            algorithms.add('sha256')
+        if self.store is not None:
+            algorithms.update(a for a, d in self._get_store_keys())
+        self._hashers = [hashlib.new(a) for a in sorted(algorithms)]
+        if self._hashers and file_mode == 'ab':
+            # Seed digests with the part of the file that's already on disk.
+            with self.part.path.open('rb') as f:
+                for chunk in iter(lambda: f.read(config.READ_SIZE), b''):
+                    for hasher in self._hashers:
+                        hasher.update(chunk)
+
+    def _finish_hashers(self):
+        for hasher in self._hashers:
+            self.part.set_digest(hasher)
+        self._hashers = list()
+
+    def _start_extractor(self, file_mode='wb'):
+        """Set up the extractor that unpacks the file as it's written."""
+        self._stop_extractor()
+        if not self.extract_to:
+            return
+        self._extractor = StreamExtractor(self.extract_to)
+        if file_mode == 'ab':
+            # Feed it the part of the file that's already on disk.
+            try:
+                with self.part.path.open('rb') as f:
+                    for chunk in iter(lambda: f.read(config.READ_SIZE), b''):
+                        self._extractor.write(chunk)
+            except ExtractError:
+                pass  # raised again by the next write
+
+    def _stop_extractor(self):
+        if self._extractor is not None:
+            self._extractor.abort()
+            self._extractor = None
+
+    def _switch_source(self, error):
+        """Drop the current source in favor of the next mirror, if there is
+        one. Returns True if the source was switched.
+        """
+        if len(self.sources) < 2 or not (
+            self._is_retryable(error) or isinstance(error, HTTPStatusError)
+        ):
+            return False
+        self.sources.remove(self.source)
+        logging.warning(f"Dropping mirror {self.source}: {error}")
+        self.source = self.sources[0]
+        logging.info(f"Switching to mirror: {self.source}")
+        return True
+
+    def _throttle(self, nbytes):
+        """Wait as long as the rate limit requires; return the number of
+        seconds waited.
+        """
+        if self.rate_limiter is None:
+            return 0.0
+        delay = self.rate_limiter.reserve(nbytes)
+        if delay:
+            sleep(delay)
+        return delay
+
+    def _update_progress(self, nbytes):
+        self.stats.add_bytes(nbytes)
+        progress = self.progress_meter.update(nbytes)
+        if progress is None:
+            return  # throttled
+        self.stats.add_rate(progress.rate)
+        self._put_progress(progress)
+        if self.callback:
+            self.callback(*self.callback_args, **self.callback_kwargs)
+
+    def _use_segments(self):
+        if self.extract_to:
+            logging.debug("Extracting while downloading; not segmenting.")
+            return False
+        if self.url.encoding:
+            logging.debug("Content is encoded; not segmenting.")
+            return False
+        mirrors = len(self._get_range_sources()) > 1
+        if not mirrors and (not self.segments or self.segments < 2):
+            return False
+        if not self.url.size or self.url.size < 2 * config.SEGMENT_MIN_SIZE:
+            logging.debug("File too small or size unknown; not segmenting.")
+            return False
+        if mirrors:
+            return True  # a mirror that ignores ranges is dropped later
+        if (
+            not accepts_ranges(self.source)
+            or not self._check_server_accepts_range()
+        ):
+            logging.info("Server does not accept ranges; not segmenting.")
+            return False
+        return True
+
+    def _store_chunk(self, f, chunk):
+        """Write chunk to the .part file, hashing it and checkpointing the
+        journal as needed.
+        """
+        f.write(chunk)
+        for hasher in self._hashers:
+            hasher.update(chunk)
+        if self._extractor is not None:
+            self._extractor.write(chunk)
+        if (
+            self.journal is not None
+            and f.tell() - self.journal.committed >= config.JOURNAL_INTERVAL
+        ):
+            self._checkpoint(f)
+
+    def _write_chunk(self, f, chunk, nbytes=None):
+        """Write chunk to the .part file; nbytes is the number of bytes to
+        count as transferred, if not the length of chunk.
+        """
+        self._store_chunk(f, chunk)
+        if nbytes is None:
+            nbytes = len(chunk)
+        self._update_progress(nbytes)
+
+    def _write_progress_bar(self, progress):
+        if not sys.stdout.isatty():
+            return
         screen_width = shutil.get_terminal_size((80, 24)).columns
+        rate = f"{format_size(progress.rate)}/s"
+        if progress.done:
+            rate = f"{format_size(progress.average_rate)}/s"
+        if progress.percent is None:
+            # Unknown total size: show bytes received instead of a bar.
+            status = f" {format_size(progress.bytes_done):>9} {rate:>11}"
+            print(status.ljust(screen_width - 1), end='\r')
+            return
+        eta = ''
+        if progress.eta is not None and not progress.done:
+            eta = f"ETA {format_time(progress.eta)}"
+        status = f" {progress.percent:>3}% {rate:>11} {eta:>11}"
         y = '.'
         n = ' '
-        l_f = int(screen_width * 0.75)  # progress bar length
-        l_y = int(l_f * percent / 100)  # num. of chars. complete
+        l_f = max(10, screen_width - len(status) - 4)  # progress bar length
+        l_y = int(l_f * progress.percent / 100)  # num. of chars. complete
         l_n = l_f - l_y  # num. of chars. incomplete
         # end='\x1b[1K\r' to erase to end of line
-        if sys.stdout.isatty():
-            print(f" [{y * l_y}{n * l_n}] {percent:>3}%", end='\r')
+        print(f" [{y * l_y}{n * l_n}]{status}", end='\r')
+
+
+def _get_charset(headers):
+    """Return the charset named in the Content-Type header, or None."""
+    m = re.search(
+        r';\s*charset\s*=\s*"?([^";\s]+)',
+        headers.get('Content-Type', ''),
+        re.IGNORECASE,
+    )
+    return m.group(1) if m else None
+
+
+def _once(func):
+    """Wrap func so that it's only called once; later calls reuse the result.
+    """
+    result = []
+
+    def wrapper():
+        if not result:
+            result.append(func())
+        return result[0]
+    return wrapper
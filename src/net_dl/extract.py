@@ -0,0 +1,405 @@
+"""Contains the StreamExtractor class, used to unpack archives while they
+download
+
+Data is handed to the extractor as it arrives and unpacked by a background
+thread, so extraction finishes at about the same time as the transfer. Tar
+archives (plain, or compressed with gzip, bzip2 or xz) are read with
+tarfile's streaming mode. Zip archives are read member by member from their
+local headers, since their central directory only comes at the end of the
+file.
+"""
+
+import logging
+import lzma
+import os
+import shutil
+import struct
+import tarfile
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from pathlib import PurePosixPath
+from pathlib import PureWindowsPath
+
+from . import config
+
+_ZIP_LOCAL_HEADER = b'PK\x03\x04'
+_ZIP_DATA_DESCRIPTOR = b'PK\x07\x08'
+# Records that follow the last member: the central directory, and the end of
+# central directory records (also of an empty archive).
+_ZIP_END_RECORDS = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06')
+# ID of the extra field that holds the sizes of a zip64 member.
+_ZIP64_EXTRA_ID = 0x0001
+# Errors raised by the decompressors on corrupt or truncated data.
+_ARCHIVE_ERRORS = (
+    tarfile.TarError,
+    EOFError,
+    OSError,
+    ValueError,
+    zlib.error,
+    lzma.LZMAError,
+)
+
+
+class ExtractError(Exception):
+    """The archive couldn't be unpacked, or one of its members would end up
+    outside of the destination folder.
+    """
+
+
+class _Pipe:
+    """Bytes passed from the writing thread to the reading one; writes wait
+    while more than max_size bytes are unread.
+    """
+    def __init__(self, max_size=config.EXTRACT_BUFFER_SIZE):
+        self.max_size = max_size
+        self._chunks = deque()
+        self._size = 0
+        self._closed = False
+        self._discard = False
+        self._condition = threading.Condition()
+
+    def close(self):
+        """Mark the end of the data."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def discard(self):
+        """Drop any unread data and all later writes, e.g. once the reader
+        has stopped.
+        """
+        with self._condition:
+            self._closed = True
+            self._discard = True
+            self._chunks.clear()
+            self._size = 0
+            self._condition.notify_all()
+
+    def read(self, size=-1):
+        """Return up to size bytes (all that are buffered if size < 0),
+        waiting for some if there are none yet; b'' means the end.
+        """
+        with self._condition:
+            while not self._chunks and not self._closed:
+                self._condition.wait()
+            if size is None or size < 0:
+                size = self._size
+            data = bytearray()
+            while self._chunks and len(data) < size:
+                chunk = self._chunks.popleft()
+                wanted = size - len(data)
+                if len(chunk) > wanted:
+                    self._chunks.appendleft(chunk[wanted:])
+                    chunk = chunk[:wanted]
+                data += chunk
+            self._size -= len(data)
+            self._condition.notify_all()
+            return bytes(data)
+
+    def unread(self, data):
+        """Put data back in front of the unread data."""
+        if not data:
+            return
+        with self._condition:
+            self._chunks.appendleft(bytes(data))
+            self._size += len(data)
+
+    def write(self, data):
+        with self._condition:
+            while self._size >= self.max_size and not self._discard:
+                self._condition.wait()
+            if self._discard or not data:
+                return
+            self._chunks.append(bytes(data))
+            self._size += len(data)
+            self._condition.notify_all()
+
+
+class StreamExtractor:
+    """Unpack a tar or zip archive into destdir as its data is written.
+
+    Members whose path or link target would lead outside of destdir stop the
+    extraction with an ExtractError, as do corrupt or truncated archives.
+    Special files (devices, FIFOs) are skipped. Only the owner and execute
+    permissions of tar members are kept; zip members get default
+    permissions, since theirs are only listed in the central directory.
+
+    :ivar destdir: folder that the archive is unpacked into
+    :ivar members: paths, relative to destdir, of the files, folders and
+        links unpacked so far
+    :ivar error: the ExtractError that stopped the extraction, if any
+    """
+    def __init__(self, destdir, buffer_size=config.EXTRACT_BUFFER_SIZE):
+        self.destdir = Path(destdir)
+        self.destdir.mkdir(parents=True, exist_ok=True)
+        self._root = self.destdir.resolve()
+        self.members = list()
+        self.error = None
+        self._pipe = _Pipe(buffer_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def abort(self):
+        """Stop extracting, leaving what has been unpacked so far."""
+        self._pipe.discard()
+        self._thread.join()
+
+    def close(self):
+        """Wait for the rest of the written data to be unpacked; return
+        `members`, or raise ExtractError if the extraction failed.
+        """
+        self._pipe.close()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.members
+
+    def write(self, data):
+        """Hand the next bytes of the archive to the extractor; raises
+        ExtractError if the extraction has failed.
+        """
+        if self.error is not None:
+            raise self.error
+        self._pipe.write(data)
+
+    def _run(self):
+        try:
+            signature = self._read(4)
+            self._pipe.unread(signature)
+            if signature == _ZIP_LOCAL_HEADER or signature in _ZIP_END_RECORDS:  # noqa: E501
+                self._extract_zip()
+            else:
+                self._extract_tar()
+        except ExtractError as e:
+            self.error = e
+        except _ARCHIVE_ERRORS as e:
+            self.error = ExtractError(f"Can't unpack archive: {e}")
+        finally:
+            # Anything after the end of the archive is ignored, and writes
+            # must not wait on a reader that has stopped.
+            self._pipe.discard()
+
+    def _extract_tar(self):
+        with tarfile.open(fileobj=self._pipe, mode='r|*', bufsize=config.READ_SIZE) as tar:  # noqa: E501
+            for member in tar:
+                path = self._get_path(member.name)
+                if path is None:
+                    continue  # destdir itself
+                if member.isdir():
+                    self._make_dir(path)
+                elif member.isfile():
+                    with tar.extractfile(member) as source:
+                        self._write_file(path, source)
+                    os.chmod(path, (member.mode & 0o755) | 0o600)
+                    os.utime(path, (member.mtime, member.mtime))
+                elif member.issym():
+                    self._make_symlink(path, member.linkname)
+                elif member.islnk():
+                    self._make_hardlink(path, member.linkname)
+                else:
+                    logging.warning(f"Skipping special file in archive: {member.name}")  # noqa: E501
+                    continue
+                self._add_member(path)
+
+    def _extract_zip(self):
+        while True:
+            signature = self._read(4)
+            if signature in _ZIP_END_RECORDS:
+                return
+            if signature != _ZIP_LOCAL_HEADER:
+                raise ExtractError("Can't unpack archive: invalid zip header")
+            (
+                _, flags, method, mtime, mdate, crc, compressed_size, size,
+                name_length, extra_length,
+            ) = struct.unpack('<HHHHHIIIHH', self._read(26))
+            encoding = 'utf-8' if flags & 0x800 else 'cp437'
+            name = self._read(name_length).decode(encoding)
+            extra = self._get_zip_extra(self._read(extra_length))
+            zip64 = _ZIP64_EXTRA_ID in extra
+            if zip64 and len(extra.get(_ZIP64_EXTRA_ID)) >= 16:
+                size, compressed_size = struct.unpack('<QQ', extra.get(_ZIP64_EXTRA_ID)[:16])  # noqa: E501
+            if flags & 0x1:
+                raise ExtractError(f"Can't unpack encrypted zip member: {name}")  # noqa: E501
+            if method not in (0, 8):
+                raise ExtractError(f"Unsupported compression method ({method}) of zip member: {name}")  # noqa: E501
+            has_descriptor = bool(flags & 0x8)
+            if has_descriptor and method == 0:
+                # Its end can't be found without the central directory.
+                raise ExtractError(f"Can't unpack stored zip member of unknown size: {name}")  # noqa: E501
+
+            path = self._get_path(name)
+            if path is None or name.endswith('/'):
+                if path is not None:
+                    self._make_dir(path)
+                actual_crc = self._unpack_zip_data(None, method, compressed_size, has_descriptor)  # noqa: E501
+            else:
+                self._prepare_path(path)
+                with path.open('wb') as f:
+                    actual_crc = self._unpack_zip_data(f, method, compressed_size, has_descriptor)  # noqa: E501
+            if has_descriptor:
+                crc = self._read_zip_descriptor(zip64)
+            if actual_crc != crc:
+                raise ExtractError(f"CRC mismatch of zip member: {name}")
+            if path is None:
+                continue
+            if not name.endswith('/'):
+                timestamp = _get_dos_timestamp(mdate, mtime)
+                if timestamp is not None:
+                    os.utime(path, (timestamp, timestamp))
+            self._add_member(path)
+
+    def _unpack_zip_data(self, f, method, compressed_size, has_descriptor):
+        """Write the data of a zip member to f (or drop it if f is None);
+        returns its CRC-32.
+        """
+        crc = 0
+        remaining = compressed_size
+        decompressor = zlib.decompressobj(-15) if method == 8 else None
+        while True:
+            if has_descriptor:
+                data = self._pipe.read(config.READ_SIZE)
+            elif remaining:
+                data = self._pipe.read(min(remaining, config.READ_SIZE))
+            else:
+                break
+            if not data:
+                raise ExtractError("Can't unpack archive: unexpected end of data")  # noqa: E501
+            remaining -= len(data)
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            crc = zlib.crc32(data, crc)
+            if f is not None:
+                f.write(data)
+            if decompressor is not None and decompressor.eof:
+                self._pipe.unread(decompressor.unused_data)
+                break
+        if decompressor is not None and not decompressor.eof:
+            raise ExtractError("Can't unpack archive: incomplete zip member")
+        return crc
+
+    def _read_zip_descriptor(self, zip64):
+        """Read the data descriptor that follows a member's data; return its
+        CRC-32.
+        """
+        data = self._read(4)
+        if data == _ZIP_DATA_DESCRIPTOR:
+            data = self._read(4)
+        self._read(16 if zip64 else 8)  # sizes, already known
+        return struct.unpack('<I', data)[0]
+
+    def _get_zip_extra(self, data):
+        """Return the extra fields of a zip header, keyed by ID."""
+        fields = dict()
+        while len(data) >= 4:
+            field_id, length = struct.unpack('<HH', data[:4])
+            fields[field_id] = data[4:4 + length]
+            data = data[4 + length:]
+        return fields
+
+    def _add_member(self, path):
+        self.members.append(path.relative_to(self.destdir).as_posix())
+
+    def _get_path(self, name):
+        """Return where the member name belongs in destdir, or None for
+        destdir itself; raise ExtractError if it would be outside of it.
+        """
+        relpath = PurePosixPath(name.replace('\\', '/'))
+        if (
+            relpath.is_absolute()
+            or PureWindowsPath(name).drive
+            or '..' in relpath.parts
+        ):
+            raise ExtractError(f"Unsafe path in archive: {name}")
+        if not relpath.parts:
+            return None
+        path = self.destdir.joinpath(*relpath.parts)
+        # Links unpacked earlier mustn't lead outside of destdir either.
+        if not self._is_inside(path.parent.resolve()):
+            raise ExtractError(f"Unsafe path in archive: {name}")
+        return path
+
+    def _is_inside(self, path):
+        return path == self._root or self._root in path.parents
+
+    def _make_dir(self, path):
+        if path.is_symlink() or path.is_file():
+            path.unlink()
+        path.mkdir(parents=True, exist_ok=True)
+
+    def _make_hardlink(self, path, target):
+        source = self._get_path(target)
+        if source is None or source.is_symlink() or not source.is_file():
+            raise ExtractError(f"Invalid link in archive: {target}")
+        self._prepare_path(path)
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copy2(source, path)
+
+    def _make_symlink(self, path, target):
+        resolved = Path(os.path.normpath(path.parent.resolve() / target))
+        if Path(target).is_absolute() or not self._is_inside(resolved):
+            raise ExtractError(f"Unsafe link in archive: {path.name} -> {target}")  # noqa: E501
+        self._prepare_path(path)
+        path.symlink_to(target)
+
+    def _prepare_path(self, path):
+        """Make way for a new file at path, never writing through an existing
+        link.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_symlink() or path.is_file():
+            path.unlink()
+        elif path.is_dir():
+            raise ExtractError(f"Can't replace folder with a file: {path}")
+
+    def _read(self, size):
+        """Read exactly size bytes of the archive."""
+        data = b''
+        while len(data) < size:
+            chunk = self._pipe.read(size - len(data))
+            if not chunk:
+                raise ExtractError("Can't unpack archive: unexpected end of data")  # noqa: E501
+            data += chunk
+        return data
+
+    def _write_file(self, path, source):
+        self._prepare_path(path)
+        with path.open('wb') as f:
+            shutil.copyfileobj(source, f, config.READ_SIZE)
+
+
+def extract_file(path, destdir):
+    """Unpack the archive at path into destdir; return the paths of its
+    members relative to destdir, or raise ExtractError.
+    """
+    extractor = StreamExtractor(destdir)
+    try:
+        with Path(path).open('rb') as f:
+            for chunk in iter(lambda: f.read(config.READ_SIZE), b''):
+                extractor.write(chunk)
+    except OSError:
+        extractor.abort()
+        raise
+    return extractor.close()
+
+
+def _get_dos_timestamp(date, time_of_day):
+    """Return the POSIX timestamp of a zip member's DOS date and time (local
+    time), or None if it isn't valid.
+    """
+    try:
+        return time.mktime((
+            (date >> 9) + 1980,
+            (date >> 5) & 0xf,
+            date & 0x1f,
+            time_of_day >> 11,
+            (time_of_day >> 5) & 0x3f,
+            (time_of_day & 0x1f) * 2,
+            0, 0, -1,
+        ))
+    except (OverflowError, ValueError):
+        return None
@@ -0,0 +1,142 @@
+"""Contains the DownloadGroup class"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from . import config
+from .cache import get_validator_cache
+from .download import Download
+from .ratelimit import get_rate_limiter
+from .session import Session
+from .store import get_content_store
+
+
+class _DiscardQueue:
+    """Progress queue stand-in; concurrent downloads don't share one bar."""
+    def put(self, item):
+        pass
+
+
+class DownloadGroup:
+    """Download many URLs concurrently.
+
+    Each URL is handled by its own Download object; all of them share one
+    pooled Session. Unless `is_file` is given, every URL is saved as a file,
+    text pages included.
+
+    :ivar urls: the source URLs to download from; an item may also be a
+        list of mirror URLs for the same file
+    :ivar workers: max. number of simultaneous downloads
+    :ivar per_host: max. number of simultaneous downloads from any one host
+    :ivar session: Session shared by all downloads in the group
+    :ivar results: exit status of each URL's download after get() is run
+    :ivar stats: net_dl.DownloadStats of each URL's download after get() is
+        run
+    :ivar download_kwargs: extra keyword arguments passed to each Download;
+        a `rate_limit` given here applies to the group as a whole, and a
+        `validator_cache` is shared and saved once all downloads are done,
+        and so is a content `store`
+    :ivar url_kwargs: keyword arguments for the downloads of particular URLs,
+        keyed by URL, that take precedence over download_kwargs (e.g. a
+        `checksum` and `destname` for each file)
+    """
+    def __init__(
+        self,
+        urls=None,
+        workers=config.GROUP_WORKERS,
+        per_host=config.GROUP_PER_HOST,
+        session=None,
+        url_kwargs=None,
+        **download_kwargs,
+    ):
+        self.urls = list()
+        for url in urls or list():
+            if not isinstance(url, str):
+                url = tuple(url)  # mirrors of one file
+            self.urls.append(url)
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        if session is None:
+            session = Session(pool_size=max(config.POOL_SIZE, self.per_host))
+        self.session = session
+        self.download_kwargs = download_kwargs
+        self.url_kwargs = url_kwargs or dict()
+        self.download_kwargs.setdefault('progress_queue', _DiscardQueue())
+        # Text printed to stdout by several downloads at once would be
+        # interleaved, so content is saved as files instead.
+        self.download_kwargs.setdefault('is_file', True)
+        # One limiter for the whole group caps the combined rate.
+        self.download_kwargs['rate_limit'] = get_rate_limiter(
+            self.download_kwargs.get('rate_limit')
+        )
+        self.validator_cache = get_validator_cache(
+            self.download_kwargs.get('validator_cache')
+        )
+        if self.validator_cache is not None:
+            self.validator_cache.autosave = False
+            self.download_kwargs['validator_cache'] = self.validator_cache
+        self.download_kwargs['store'] = get_content_store(
+            self.download_kwargs.get('store')
+        )
+        self.results = dict()
+        self.stats = dict()
+        self._host_limits = dict()
+        self._host_limits_lock = threading.Lock()
+
+    def get(self):
+        """Download all URLs; return 0 if all succeeded, otherwise 1."""
+        self.results = dict()
+        self.stats = dict()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                url: executor.submit(self._get_one, url)
+                for url in dict.fromkeys(self.urls)  # skip duplicates
+            }
+            for url, future in futures.items():
+                if isinstance(url, tuple):
+                    url = url[0]
+                self.results[url] = future.result()
+        if self.validator_cache is not None:
+            self.validator_cache.save()
+        failed = [u for u, status in self.results.items() if status != 0]
+        logging.info(
+            f"{len(self.results) - len(failed)} of {len(self.results)} "
+            "downloads succeeded"
+        )
+        for url in failed:
+            logging.error(f"Download failed: {url}")
+        return 1 if failed else 0
+
+    def _get_host_limit(self, url):
+        if isinstance(url, tuple):
+            url = url[0]
+        host = urlsplit(url).netloc
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits.get(host)
+
+    def _get_one(self, url):
+        with self._get_host_limit(url):
+            mirrors = None
+            if isinstance(url, tuple):
+                url, mirrors = url[0], url[1:]
+            d = None
+            try:
+                d = Download(
+                    url,
+                    mirrors=mirrors,
+                    session=self.session,
+                    **{**self.download_kwargs, **self.url_kwargs.get(url, {})},
+                )
+                return d.get()
+            except SystemExit as e:  # e.g. failed integrity check
+                return e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                logging.error(f"{url}: {type(e)}: {e}")
+                return 1
+            finally:
+                if d is not None:
+                    self.stats[url] = d.stats
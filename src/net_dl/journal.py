@@ -0,0 +1,100 @@
+"""Contains the Journal class"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+
+class Journal:
+    """Sidecar record of a partial download kept next to its .part file.
+
+    It notes which bytes of the .part file are safely on disk and which
+    server validators they came from, so that an interrupted download can be
+    resumed automatically as long as the file hasn't changed on the server.
+
+    :ivar path: location of the journal file
+    :ivar url: the source URL
+    :ivar size: expected size of the complete file in bytes
+    :ivar etag: the server's ETag for the file, if any
+    :ivar last_modified: the server's Last-Modified for the file, if any
+    :ivar committed: number of bytes at the start of the .part file that
+        are known to be on disk (single-stream downloads)
+    :ivar segments: list of [start, end, committed] for each byte range of a
+        segmented download, or None
+    """
+    def __init__(
+        self,
+        path,
+        url=None,
+        size=None,
+        etag=None,
+        last_modified=None,
+        committed=0,
+        segments=None,
+    ):
+        self.path = Path(path)
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.committed = committed
+        self.segments = segments
+
+    def __str__(self):
+        return str(self.path)
+
+    def load(path):
+        """Return the Journal stored at path, or None if there isn't one."""
+        path = Path(path)
+        if not path.is_file():
+            return None
+        try:
+            data = json.loads(path.read_text())
+            return Journal(
+                path,
+                url=data.get('url'),
+                size=data.get('size'),
+                etag=data.get('etag'),
+                last_modified=data.get('last_modified'),
+                committed=data.get('committed', 0),
+                segments=data.get('segments'),
+            )
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable journal {path}: {e}")
+            return None
+
+    def get_committed_size(self):
+        """Return the total number of bytes known to be on disk."""
+        if self.segments:
+            return sum(s[2] for s in self.segments)
+        return self.committed
+
+    def matches(self, url):
+        """Check that the partial data was fetched from the same version of
+        the file that url (a Url with a head response) now points to.
+        """
+        headers = url.head_response.headers
+        if self.url != url.path or self.size != url.size:
+            return False
+        if self.etag or headers.get('ETag'):
+            return self.etag == headers.get('ETag')
+        if self.last_modified:
+            return self.last_modified == headers.get('Last-Modified')
+        return False  # no way to tell if the file has changed
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+    def save(self):
+        data = {
+            'url': self.url,
+            'size': self.size,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'committed': self.committed,
+            'segments': self.segments,
+        }
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        tmp.replace(self.path)  # atomic, so a crash can't leave half a file
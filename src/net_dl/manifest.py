@@ -0,0 +1,216 @@
+"""Contains the Manifest class"""
+
+import hashlib
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from os import getcwd
+from pathlib import Path
+from pathlib import PurePosixPath
+from urllib.parse import quote
+from urllib.parse import urljoin
+
+from . import config
+from .checksum import ALGORITHMS
+from .checksum import hash_file
+
+# e.g. '<digest>  <name>', or '<digest> *<name>' for files hashed in binary
+# mode (GNU coreutils)
+_GNU_LINE = re.compile(r'([0-9a-fA-F]+) [ *](.+)')
+# e.g. 'SHA256 (<name>) = <digest>' (BSD)
+_BSD_LINE = re.compile(r'([A-Za-z0-9]+) \((.+)\) = ([0-9a-fA-F]+)')
+# Algorithms by the length of their hex digests.
+_DIGEST_ALGORITHMS = {hashlib.new(a).digest_size * 2: a for a in ALGORITHMS}
+
+
+class Manifest:
+    """A list of files and their digests, as in a SHA256SUMS file.
+
+    Files that are already present are verified in parallel on a pool of
+    processes; only those that are missing or don't match are downloaded.
+
+    :ivar entries: list of (name, algorithm, hex digest) for each file
+    :ivar base_url: URL that the file names are relative to, e.g. the URL of
+        the manifest itself or of the folder holding the files
+    :ivar results: outcome for each file name after verify() or get(): 'ok',
+        'missing', 'mismatch', 'downloaded', 'failed' or 'invalid' (the name
+        points outside of the destination folder)
+    :ivar stats: net_dl.DownloadStats of each file downloaded by get(), keyed
+        by URL
+    """
+    def __init__(self, entries=None, base_url=None):
+        self.entries = list(entries or list())
+        self.base_url = base_url
+        self.results = dict()
+        self.stats = dict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(path, base_url=None, session=None):
+        """Return the Manifest in the file at path, which may also be a URL;
+        file names are then relative to it unless base_url is given.
+        """
+        algorithm = _get_algorithm_from_name(str(path).rstrip('/').split('/')[-1])  # noqa: E501
+        if re.match(r'https?://', str(path)):
+            from .download import Download
+            logging.info(f"Getting manifest from {path}")
+            text = Download(path, session=session).get_content().decode()
+            if base_url is None:
+                base_url = path
+        else:
+            text = Path(path).read_text()
+        return Manifest.parse(text, base_url=base_url, algorithm=algorithm)
+
+    def parse(text, base_url=None, algorithm=None):
+        """Return a Manifest of the entries listed in text.
+
+        Both the GNU ('<digest>  <name>') and BSD ('SHA256 (<name>) =
+        <digest>') formats are read. For GNU-style lines the algorithm is
+        worked out from the digest's length, unless it's given.
+        """
+        entries = list()
+        for line in text.splitlines():
+            if not line.strip() or line.startswith('#'):
+                continue
+            m = _BSD_LINE.fullmatch(line.strip())
+            if m:
+                line_algorithm, name, digest = m.groups()
+                line_algorithm = line_algorithm.lower()
+            else:
+                m = _GNU_LINE.fullmatch(line.rstrip('\r\n'))
+                if not m:
+                    logging.warning(f"Ignoring unreadable manifest line: {line}")  # noqa: E501
+                    continue
+                digest, name = m.groups()
+                line_algorithm = algorithm or _DIGEST_ALGORITHMS.get(len(digest))  # noqa: E501
+            digest = digest.lower()
+            if (
+                line_algorithm not in ALGORITHMS
+                or _DIGEST_ALGORITHMS.get(len(digest)) != line_algorithm
+            ):
+                logging.warning(f"Ignoring manifest line with an unsupported digest: {line}")  # noqa: E501
+                continue
+            entries.append((name, line_algorithm, digest))
+        return Manifest(entries, base_url=base_url)
+
+    def get(
+        self,
+        destdir=getcwd(),
+        verify_workers=None,
+        workers=config.GROUP_WORKERS,
+        per_host=config.GROUP_PER_HOST,
+        session=None,
+        **download_kwargs,
+    ):
+        """Verify the files in destdir, then download the ones that are
+        missing or don't match from base_url.
+
+        Downloads are checked against the manifest too. Returns 0 if all
+        files end up matching, otherwise 1; see `results` for each file.
+        """
+        from .group import DownloadGroup
+
+        self.verify(destdir, workers=verify_workers)
+        names = [
+            name for name, result in self.results.items()
+            if result in ('missing', 'mismatch')
+        ]
+        if names and self.base_url is None:
+            logging.error("No URL to download the missing files from.")
+            names = list()
+        entries = {name: (algorithm, digest) for name, algorithm, digest in self.entries}  # noqa: E501
+        urls = dict()
+        url_kwargs = dict()
+        for name in names:
+            algorithm, digest = entries.get(name)
+            url = self.get_url(name)
+            path = self.get_path(name, destdir)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            urls[name] = url
+            url_kwargs[url] = {
+                'destdir': path.parent,
+                'destname': path.name,
+                'checksum': f"{algorithm}:{digest}",
+            }
+        if urls:
+            group = DownloadGroup(
+                list(urls.values()),
+                workers=workers,
+                per_host=per_host,
+                session=session,
+                url_kwargs=url_kwargs,
+                **download_kwargs,
+            )
+            group.get()
+            self.stats = group.stats
+            for name, url in urls.items():
+                if group.results.get(url) == 0:
+                    self.results[name] = 'downloaded'
+        for name, result in self.results.items():
+            if result not in ('ok', 'downloaded'):
+                self.results[name] = 'failed' if result != 'invalid' else result  # noqa: E501
+        failed = [n for n, r in self.results.items() if r not in ('ok', 'downloaded')]  # noqa: E501
+        logging.info(f"{len(self.results) - len(failed)} of {len(self.results)} files OK")  # noqa: E501
+        return 1 if failed else 0
+
+    def get_path(self, name, destdir):
+        """Return where the file name belongs in destdir, or None if that
+        would be outside of destdir.
+        """
+        path = PurePosixPath(name)
+        if path.is_absolute() or '..' in path.parts or not path.parts:
+            return None
+        return Path(destdir).joinpath(*path.parts)
+
+    def get_url(self, name):
+        return urljoin(self.base_url, quote(name))
+
+    def verify(self, destdir=getcwd(), workers=None):
+        """Hash the files that are present in destdir, using up to workers
+        processes (one per CPU by default), and compare them with the
+        manifest.
+
+        Returns `results`, where each file is 'ok', 'missing', 'mismatch' or
+        'invalid'.
+        """
+        results = dict()
+        present = list()
+        for name, algorithm, digest in self.entries:
+            path = self.get_path(name, destdir)
+            if path is None:
+                logging.error(f"Ignoring unsafe file name in manifest: {name}")
+                results[name] = 'invalid'
+            elif path.is_file():
+                present.append((name, path, algorithm, digest))
+            else:
+                results[name] = 'missing'
+        if present:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    (name, digest, executor.submit(_get_digest, path, algorithm))  # noqa: E501
+                    for name, path, algorithm, digest in present
+                ]
+                for name, digest, future in futures:
+                    try:
+                        matches = future.result() == digest
+                    except OSError as e:
+                        logging.error(f"{name}: {e}")
+                        matches = False
+                    results[name] = 'ok' if matches else 'mismatch'
+        # Keep the manifest's order.
+        self.results = {name: results.get(name) for name, a, d in self.entries}
+        return self.results
+
+
+def _get_algorithm_from_name(filename):
+    """Return the algorithm named in a manifest's file name, e.g.
+    'SHA256SUMS', or None.
+    """
+    m = re.search('|'.join(ALGORITHMS), filename.lower())
+    if m:
+        return m.group(0)
+
+
+def _get_digest(path, algorithm):
+    return hash_file(path, algorithm).hexdigest()
@@ -0,0 +1,115 @@
+"""Helpers for downloading one file from several mirrors"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from . import config
+from .session import get_default_session
+
+
+def _timed_head(url):
+    start = monotonic()
+    url._ensure_head_response()
+    return monotonic() - start
+
+
+def _measure_rate(url):
+    """Return the rate in bytes/s at which url sent the start of the file
+    in answer to a Range request, or None if it couldn't be measured.
+    """
+    if (
+        url.head_response is None
+        or url.head_response.status_code != 200
+        or not url.size
+        or not accepts_ranges(url)
+    ):
+        return None
+    size = min(url.size, config.MIRROR_PROBE_SIZE)
+    # Not conditional, so that the server sends the data.
+    headers = {
+        k: v for k, v in url.request_headers.items()
+        if k not in ('If-None-Match', 'If-Modified-Since')
+    }
+    headers['Range'] = f'bytes=0-{size - 1}'
+    session = url.session or get_default_session()
+    start = monotonic()
+    try:
+        with session.get(
+            url.final_url or str(url),
+            stream=True,
+            headers=headers,
+            timeout=url.timeout or 10,
+        ) as r:
+            if r.status_code != 206:
+                return None
+            received = sum(len(c) for c in r.iter_content(64 * 1024))
+    except config.HTTP_ERRORS as e:
+        logging.debug(f"Mirror {url}: {type(e)}: {e}")
+        return None
+    return received / max(monotonic() - start, 1e-6)
+
+
+def probe_mirrors(urls):
+    """Send HEAD requests to all urls (Url objects) at the same time.
+
+    Returns the urls that answered, fastest first, as a dict of their
+    latencies in seconds. Urls that already have a head response are timed
+    with a new request so all are compared fairly.
+    """
+    for url in urls:
+        url.head_response = None
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        latencies = list(executor.map(_timed_head, urls))
+    answered = [
+        (latency, i, url) for i, (latency, url) in enumerate(zip(latencies, urls))  # noqa: E501
+        if url.head_response is not None
+    ]
+    for latency, i, url in sorted(answered):
+        logging.debug(f"Mirror {url}: {url.head_response.status_code} in {latency * 1000:.0f} ms")  # noqa: E501
+    return {url: latency for latency, i, url in sorted(answered)}
+
+
+def rank_mirrors(latencies):
+    """Time a small Range request to each url in latencies (as returned by
+    probe_mirrors()) at the same time.
+
+    Returns the urls ranked by the time it would take to receive
+    MIRROR_PROBE_SIZE bytes at their latency and measured rate, so that a
+    mirror that answers quickly but sends slowly isn't put first. Urls whose
+    rate couldn't be measured follow the others, by latency.
+    """
+    urls = list(latencies)
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        rates = list(executor.map(_measure_rate, urls))
+    ranked = list()
+    for i, (url, rate) in enumerate(zip(urls, rates)):
+        latency = latencies[url]
+        if rate:
+            logging.debug(f"Mirror {url}: {rate / 1024:.0f} KiB/s")
+            ranked.append((0, latency + config.MIRROR_PROBE_SIZE / rate, i, url))  # noqa: E501
+        else:
+            ranked.append((1, latency, i, url))
+    return [url for unknown, cost, i, url in sorted(ranked)]
+
+
+def same_file(url, reference):
+    """Check that url appears to serve the same file as reference.
+
+    Sizes are compared when the reference's is known; otherwise only a
+    matching Content-MD5 shows that it's the same file.
+    """
+    if url is reference:
+        return True
+    if reference.size:
+        if url.size != reference.size:
+            return False
+    elif not (url.md5 and reference.md5):
+        return False
+    if url.md5 and reference.md5 and url.md5 != reference.md5:
+        return False
+    return True
+
+
+def accepts_ranges(url):
+    return url.head_response.headers.get('Accept-Ranges') == 'bytes'
@@ -0,0 +1,125 @@
+"""Contains the download progress classes"""
+
+import threading
+from time import monotonic
+
+from . import config
+
+
+def format_size(size):
+    """Return a byte count as a short human-readable string, e.g. '1.5 MB'."""
+    size = float(size)
+    for unit in ('B', 'kB', 'MB', 'GB', 'TB'):
+        if size < 1000 or unit == 'TB':
+            break
+        size /= 1000
+    if unit == 'B':
+        return f"{int(size)} {unit}"
+    return f"{size:.1f} {unit}"
+
+
+def format_time(seconds):
+    """Return a duration in seconds as 'H:MM:SS' or 'M:SS'."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class Progress:
+    """A snapshot of a download's progress, as put on the progress queue.
+
+    :ivar bytes_done: bytes of the file received so far, including any part
+        that was already on disk when the download was resumed
+    :ivar total: expected size of the file in bytes, or None if unknown
+    :ivar rate: transfer rate since the previous snapshot, in bytes/s
+    :ivar average_rate: transfer rate since the download started, in bytes/s
+    :ivar eta: estimated seconds remaining, or None if unknown
+    :ivar done: True if this is the final snapshot of the download
+    """
+    def __init__(
+        self,
+        bytes_done=0,
+        total=None,
+        rate=0.0,
+        average_rate=0.0,
+        eta=None,
+        done=False,
+    ):
+        self.bytes_done = bytes_done
+        self.total = total
+        self.rate = rate
+        self.average_rate = average_rate
+        self.eta = eta
+        self.done = done
+
+    def __repr__(self):
+        return (
+            f"Progress(bytes_done={self.bytes_done}, total={self.total}, "
+            f"percent={self.percent}, rate={self.rate:.0f}, eta={self.eta})"
+        )
+
+    @property
+    def percent(self):
+        """Integer percent complete, or None if the total size is unknown."""
+        if not self.total:
+            return 100 if self.done else None
+        return min(100, round(self.bytes_done / self.total * 100))
+
+
+class ProgressMeter:
+    """Counts received bytes in memory and emits throttled Progress events.
+
+    Safe to update from several threads, e.g. for segmented downloads.
+
+    :ivar total: expected size of the file in bytes, or None if unknown
+    :ivar bytes_done: bytes of the file received so far
+    :ivar interval: min. number of seconds between emitted events
+    """
+    def __init__(self, total=None, initial=0, interval=config.PROGRESS_INTERVAL):  # noqa: E501
+        self.total = total
+        self.bytes_done = initial
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._start_bytes = initial
+        self._start_time = monotonic()
+        self._last_bytes = initial
+        self._last_time = self._start_time
+
+    def update(self, nbytes):
+        """Count nbytes as received; return a Progress if one is due."""
+        with self._lock:
+            self.bytes_done += nbytes
+            now = monotonic()
+            if now - self._last_time < self.interval:
+                return None
+            return self._snapshot(now)
+
+    def finish(self):
+        """Return the final Progress of the download."""
+        with self._lock:
+            return self._snapshot(monotonic(), done=True)
+
+    def _snapshot(self, now, done=False):
+        elapsed = now - self._last_time
+        rate = (self.bytes_done - self._last_bytes) / elapsed if elapsed else 0.0  # noqa: E501
+        total_elapsed = now - self._start_time
+        average_rate = 0.0
+        if total_elapsed:
+            average_rate = (self.bytes_done - self._start_bytes) / total_elapsed  # noqa: E501
+        eta = None
+        if done:
+            eta = 0.0
+        elif self.total and average_rate:
+            eta = max(0, self.total - self.bytes_done) / average_rate
+        self._last_bytes = self.bytes_done
+        self._last_time = now
+        return Progress(
+            bytes_done=self.bytes_done,
+            total=self.total,
+            rate=rate,
+            average_rate=average_rate,
+            eta=eta,
+            done=done,
+        )
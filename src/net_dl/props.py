@@ -1,4 +1,3 @@
-import hashlib
 import logging
 import re
 import requests
@@ -9,6 +8,8 @@ from pathlib import Path
 from urllib.parse import unquote
 
 from . import config
+from .checksum import hash_file
+from .session import get_default_session
 
 
 class Props:
@@ -23,6 +24,7 @@ class Props:
 class LocalFile(Props):
     def __init__(self, f=None):
         super().__init__(f)
+        self.digests = dict()
         if f:
             self.path = Path(self.path)
             if self.path.is_file():
@@ -38,30 +40,61 @@ class LocalFile(Props):
         self.size = self.path.stat().st_size
         return self.size
 
+    def get_digest(self, algorithm='md5'):
+        """Hash the file on disk; return the hex digest."""
+        if self.path is None:
+            return
+        self.set_digest(hash_file(self.path, algorithm))
+        return self.digests.get(algorithm)
+
     def get_md5(self):
         if self.path is None:
             return
-        md5 = hashlib.md5()
-        with self.path.open('rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                md5.update(chunk)
-        self.md5 = b64encode(md5.digest()).decode('utf-8')
-        logging.debug(f"{self.path} MD5: {self.md5}")
+        self.get_digest('md5')
         return self.md5
 
+    def set_digest(self, hasher):
+        """Record a digest that was computed elsewhere, e.g. while the file
+        was being downloaded, so the file doesn't need to be re-read.
+        """
+        self.digests[hasher.name] = hasher.hexdigest()
+        if hasher.name == 'md5':
+            self.md5 = b64encode(hasher.digest()).decode('utf-8')
+        logging.debug(f"{self.path} {hasher.name}: {hasher.hexdigest()}")
+
     def get_mtime(self):
         if not self.path:
             return
         return self.path.stat().st_mtime
 
+    def get_timestamp(http_timestamp):
+        """Return an HTTP date (e.g. a Last-Modified header) as the
+        timestamp that set_mtime() gives the file.
+        """
+        fmtstr = '%a, %d %b %Y %H:%M:%S %Z'
+        return datetime.strptime(http_timestamp, fmtstr).timestamp()
+
+    def is_current(self, size, http_timestamp):
+        """Return True if the file exists with the given size and an mtime
+        matching the HTTP date.
+        """
+        if self.path is None or not self.path.is_file():
+            return False
+        if size is None or http_timestamp is None:
+            return False
+        try:
+            timestamp = LocalFile.get_timestamp(http_timestamp)
+        except ValueError:
+            return False
+        return self.get_size() == size and int(self.get_mtime()) == int(timestamp)  # noqa: E501
+
     def set_mtime(self, http_timestamp):
         if not self.path.is_file():
             logging.error(
                 f"Could not set timestamp; non-existant file: {self.path}"
             )
             return
-        fmtstr = '%a, %d %b %Y %H:%M:%S %Z'
-        timestamp = datetime.strptime(http_timestamp, fmtstr).timestamp()
+        timestamp = LocalFile.get_timestamp(http_timestamp)
         utime(self.path, (timestamp, timestamp))
 
 
@@ -72,17 +105,20 @@ class Url(Props):
         self,
         url=None,
         request_headers=None,
-        timeout=config.HTTP_TIMEOUT
+        timeout=config.HTTP_TIMEOUT,
+        session=None,
     ):
         super().__init__(url)
         self.request_headers = {}
         if type(request_headers) in Url.HEADER_TYPES:
             self.request_headers = request_headers
         self.timeout = timeout
+        self.session = session
         self.head_response = None
         self.final_url = None
         self.size = None
         self.md5 = None
+        self.encoding = None
         self.is_file = None
 
     def __str__(self):
@@ -118,20 +154,25 @@ class Url(Props):
         # Remove space and double quotes.
         return fname.strip().strip('"')
 
-    def get_head_response(url, request_headers=None, timeout=None):
+    def get_head_response(
+        url,
+        request_headers=None,
+        timeout=None,
+        session=None,
+    ):
         head_response = None
         if not type(request_headers) in Url.HEADER_TYPES:
             request_headers = dict()
         if timeout is None:
             timeout = 10
+        if session is None:
+            session = get_default_session()
         logging.debug(f"Getting headers from {url}.")
-        # NOTE: Adding 'identity' encoding to header so that content will be
-        # uncompressed, which allows for correct progress measurement. However,
-        # this may cause problems with some types of content.
-        request_headers['Accept-Encoding'] = 'identity'
+        # NOTE: Unless compression is asked for, request 'identity' encoding
+        # so that Content-Length is the size of the file itself.
+        request_headers.setdefault('Accept-Encoding', 'identity')
         try:
-            # Force non-compressed txfr
-            head_response = requests.head(
+            head_response = session.head(
                 url,
                 allow_redirects=True,
                 headers=request_headers,
@@ -150,6 +191,15 @@ class Url(Props):
             logging.debug(f"head_response headers:{head_response.headers}")
         return head_response
 
+    def get_content_encoding(response_headers):
+        """Return the response's content coding (e.g. 'gzip'), or None if the
+        body is sent as is.
+        """
+        encoding = response_headers.get('Content-Encoding', '').strip().lower()  # noqa: E501
+        if encoding in ('', 'identity'):
+            return None
+        return encoding
+
     def get_md5(response_headers):
         content_md5 = None
         if response_headers.get('server') == 'AmazonS3':
@@ -181,9 +231,9 @@ class Url(Props):
         content_length = response_headers.get('Content-Length')
         if content_length is None:
             return None
-        content_encoding = response_headers.get('Content-Encoding')
+        content_encoding = Url.get_content_encoding(response_headers)
         if content_encoding is not None:
-            logging.critical(f"The server requires receiving the file compressed as '{content_encoding}'.")  # noqa: E501
+            logging.debug(f"Content-Length is the size of the '{content_encoding}'-encoded content.")  # noqa: E501
         logging.debug(f"{content_length=}")
         if content_length:
             size = int(content_length)
@@ -198,6 +248,13 @@ class Url(Props):
         cd_header_str = self.head_response.headers.get('Content-Disposition')
         return Url.get_content_disposition_filename(cd_header_str)
 
+    def _get_filename(self):
+        self._ensure_head_response()
+        filename = self._get_content_disposition_filename()
+        if filename is None:  # get from URL
+            filename = unquote(self.final_url.split('/')[-1])
+        return filename
+
     def _get_head_response(self):
         if self.path is None:
             logging.error("No URL given.")
@@ -206,13 +263,10 @@ class Url(Props):
             self.path,
             request_headers=self.request_headers,
             timeout=self.timeout,
+            session=self.session,
         )
         if self.head_response is not None:
-            # Set attributes that depend on response headers.
-            self._set_is_file()
-            self.final_url = self.head_response.url
-            self.size = self._get_size()
-            self.md5 = self._get_md5()
+            self._set_head_response(self.head_response)
         return self.head_response
 
     def _get_md5(self):
@@ -224,6 +278,8 @@ class Url(Props):
         if content_type_str is None:
             self._ensure_head_response()
             content_type_str = self.head_response.headers.get('Content-Type')
+        if content_type_str is None:
+            return []
         content_type_parts = [p.strip() for p in content_type_str.split(';')]
         return content_type_parts[0].split('/')
 
@@ -232,6 +288,15 @@ class Url(Props):
         self.size = Url.get_size(self.head_response.headers)
         return self.size
 
+    def _set_head_response(self, head_response):
+        self.head_response = head_response
+        # Set attributes that depend on response headers.
+        self._set_is_file()
+        self.final_url = self.head_response.url
+        self.size = self._get_size()
+        self.md5 = self._get_md5()
+        self.encoding = Url.get_content_encoding(self.head_response.headers)
+
     def _set_is_file(self):
         ''' Determines whether the URL's content is a file or not.
         True: content is downloaded and saved as a local file
@@ -244,6 +309,7 @@ class Url(Props):
         content_type = self.head_response.headers.get('Content-Type')
         logging.debug(f"{content_type=}")
         mime_info = self._get_mime_info()
+        mime_type = mime_subtype = None
         if len(mime_info) >= 2:
             mime_type, mime_subtype = mime_info[:2]
         if cd_filename is not None:
@@ -0,0 +1,73 @@
+"""Contains the RateLimiter class"""
+
+import re
+import threading
+from time import monotonic
+from time import sleep
+
+UNITS = {'': 1, 'k': 1024, 'm': 1024**2, 'g': 1024**3}
+
+
+def parse_rate(rate):
+    """Convert a rate like 2M, 500k or 1048576 into bytes per second.
+
+    Suffixes are binary multiples, as with curl's --limit-rate.
+    """
+    m = re.fullmatch(
+        r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*',
+        str(rate),
+        flags=re.IGNORECASE,
+    )
+    if not m:
+        raise ValueError(f"Invalid rate: {rate}")
+    value = float(m.group(1)) * UNITS.get(m.group(2).lower())
+    if value <= 0:
+        raise ValueError(f"Rate must be positive: {rate}")
+    return value
+
+
+class RateLimiter:
+    """A token bucket that caps the combined transfer rate of all downloads
+    that share it.
+
+    Pass the same RateLimiter as `rate_limit` to several Download objects (or
+    threads) to limit their aggregate rate rather than each one's.
+
+    :ivar rate: max. average number of bytes per second
+    :ivar burst: max. number of bytes that can be sent at once after idling
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = parse_rate(rate)
+        self.burst = self.rate if burst is None else burst
+        self._tokens = self.burst
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """Account for nbytes, sleeping as long as needed to respect rate."""
+        delay = self.reserve(nbytes)
+        if delay:
+            sleep(delay)
+
+    def reserve(self, nbytes):
+        """Account for nbytes; return the number of seconds the caller should
+        wait before continuing. Used directly by async callers.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._last) * self.rate,
+            )
+            self._last = now
+            self._tokens -= nbytes
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def get_rate_limiter(rate_limit):
+    """Return a RateLimiter for rate_limit, which may already be one."""
+    if rate_limit is None or isinstance(rate_limit, RateLimiter):
+        return rate_limit
+    return RateLimiter(rate_limit)
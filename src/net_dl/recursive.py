@@ -0,0 +1,266 @@
+"""Contains the RecursiveDownload class"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from html.parser import HTMLParser
+from os import getcwd
+from pathlib import Path
+from pathlib import PurePosixPath
+from urllib.parse import unquote
+from urllib.parse import urldefrag
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+from . import config
+from .group import DownloadGroup
+from .props import LocalFile
+from .props import Url
+from .session import Session
+
+# Content types of pages that are parsed for links.
+LISTING_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class _LinkParser(HTMLParser):
+    """Collects the targets of <a href="..."> links in a page."""
+    def __init__(self):
+        super().__init__()
+        self.links = list()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        href = dict(attrs).get('href')
+        if href:
+            self.links.append(href)
+
+
+class RecursiveDownload:
+    """Mirror a directory listing, e.g. an Apache or nginx autoindex page,
+    and the folders below it.
+
+    Listing pages are fetched level by level; each link found on them is
+    checked with a HEAD request, and those that turn out to be HTML pages
+    ending in '/' (after any redirect) are followed as folders. The files
+    found are downloaded concurrently by a DownloadGroup into matching
+    folders in destdir, except for those whose local copy already has the
+    server's size and Last-Modified time.
+
+    Only links below url are followed, and links with a query (e.g. the
+    column-sorting links of Apache listings) are ignored.
+
+    :ivar url: URL of the top listing
+    :ivar destdir: local folder that the listing's contents are saved in
+    :ivar depth: max. number of folder levels below url to follow (0 only
+        gets the files listed at url, None has no limit)
+    :ivar include: fnmatch patterns of files to download, matched against
+        their path relative to url and against their name; if empty, all
+        files are downloaded
+    :ivar exclude: fnmatch patterns of files and folders to skip, matched in
+        the same way
+    :ivar workers: max. number of simultaneous requests
+    :ivar per_host: max. number of simultaneous downloads from any one host
+    :ivar session: Session shared by all requests
+    :ivar files: path relative to url of each file found, keyed by URL
+    :ivar skipped: URLs of files that were already up to date
+    :ivar results: exit status of each file's download after get() is run
+    :ivar stats: net_dl.DownloadStats of each file's download after get() is
+        run
+    :ivar download_kwargs: extra keyword arguments passed to each Download,
+        see DownloadGroup
+    """
+    def __init__(
+        self,
+        url=None,
+        destdir=getcwd(),
+        depth=config.RECURSIVE_DEPTH,
+        include=None,
+        exclude=None,
+        workers=config.GROUP_WORKERS,
+        per_host=config.GROUP_PER_HOST,
+        session=None,
+        **download_kwargs,
+    ):
+        if url and not url.endswith('/'):
+            url = f"{url}/"
+        self.url = url
+        self.destdir = Path(destdir)
+        self.depth = depth
+        self.include = list(include or list())
+        self.exclude = list(exclude or list())
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        if session is None:
+            session = Session(pool_size=max(config.POOL_SIZE, self.workers))
+        self.session = session
+        self.download_kwargs = download_kwargs
+        self.request_headers = download_kwargs.get('request_headers') or dict()  # noqa: E501
+        self.files = dict()
+        self.skipped = list()
+        self.results = dict()
+        self.stats = dict()
+        self._errors = list()
+        self._outdated = list()
+
+    def get(self):
+        """Find the files below url and download those that aren't up to
+        date; return 0 if all succeeded, otherwise 1.
+        """
+        self.results = dict()
+        self.stats = dict()
+        self.find_files()
+        url_kwargs = dict()
+        for url, relpath in self.files.items():
+            if url in self.skipped:
+                continue
+            path = self.destdir.joinpath(*PurePosixPath(relpath).parts)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            url_kwargs[url] = {
+                'destdir': path.parent,
+                'destname': path.name,
+                # The file's details are known from the HEAD request made
+                # while crawling.
+                'head_request': False,
+                # Download would take a file of the right size as complete;
+                # it's replaced once the new copy is verified.
+                'overwrite': url in self._outdated,
+            }
+        logging.info(
+            f"Found {len(self.files)} files; {len(self.skipped)} up to date, "
+            f"{len(url_kwargs)} to download"
+        )
+        if url_kwargs:
+            group = DownloadGroup(
+                list(url_kwargs),
+                workers=self.workers,
+                per_host=self.per_host,
+                session=self.session,
+                url_kwargs=url_kwargs,
+                **self.download_kwargs,
+            )
+            status = group.get()
+            self.results = group.results
+            self.stats = group.stats
+            if status != 0:
+                return 1
+        return 1 if self._errors else 0
+
+    def find_files(self):
+        """Walk the listings below url; return `files`."""
+        self.files = dict()
+        self.skipped = list()
+        self._errors = list()
+        self._outdated = list()
+        pages = [self.url]
+        seen = {self.url}
+        level = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pages:
+                links = dict()
+                for page, page_links in zip(pages, executor.map(self._get_links, pages)):  # noqa: E501
+                    if page_links is None:
+                        self._errors.append(page)
+                        continue
+                    for link in page_links:
+                        if link in seen:
+                            continue
+                        seen.add(link)
+                        relpath = self._get_relpath(link)
+                        if relpath is not None and not self._is_excluded(relpath):  # noqa: E501
+                            links[link] = relpath
+                pages = list()
+                heads = executor.map(self._get_head, links)
+                for (link, relpath), url in zip(links.items(), heads):
+                    if url is None:
+                        self._errors.append(link)
+                    elif self._is_listing(url):
+                        if self.depth is None or level < self.depth:
+                            pages.append(url.final_url)
+                            seen.add(url.final_url)
+                    elif self._is_included(relpath):
+                        self._add_file(link, relpath, url)
+                level += 1
+        for url in self._errors:
+            logging.error(f"Failed to check: {url}")
+        return self.files
+
+    def _add_file(self, link, relpath, url):
+        self.files[link] = relpath
+        path = self.destdir.joinpath(*PurePosixPath(relpath).parts)
+        last_modified = url.head_response.headers.get('Last-Modified')
+        local_file = LocalFile(path)
+        if local_file.is_current(url.size, last_modified):
+            logging.debug(f"File is up to date: {path}")
+            self.skipped.append(link)
+        elif local_file.size is not None and local_file.size == url.size:
+            self._outdated.append(link)
+
+    def _get_head(self, link):
+        url = Url(
+            link,
+            request_headers=dict(self.request_headers),
+            session=self.session,
+        )
+        url._get_head_response()
+        if url.head_response is None or url.head_response.status_code >= 400:  # noqa: E501
+            return None
+        return url
+
+    def _get_links(self, page):
+        """Return the absolute URLs linked from the listing page, or None if
+        it can't be read.
+        """
+        logging.info(f"Reading listing: {page}")
+        try:
+            r = self.session.get(
+                page,
+                headers=self.request_headers,
+                timeout=config.HTTP_TIMEOUT,
+            )
+            r.raise_for_status()
+        except config.HTTP_ERRORS as e:
+            logging.error(f"{page}: {e}")
+            return None
+        content_type = r.headers.get('Content-Type', '')
+        if content_type.split(';')[0].strip().lower() not in LISTING_TYPES:
+            logging.error(f"Not a directory listing: {page}")
+            return None
+        parser = _LinkParser()
+        parser.feed(r.text)
+        links = list()
+        for href in parser.links:
+            link = urldefrag(urljoin(r.url, href)).url
+            if not urlsplit(link).query:
+                links.append(link)
+        return links
+
+    def _get_relpath(self, link):
+        """Return the link's path relative to url, or None if it isn't below
+        url.
+        """
+        if not link.startswith(self.url):
+            return None
+        relpath = unquote(link[len(self.url):]).rstrip('/')
+        parts = PurePosixPath(relpath).parts
+        if not parts or '..' in parts or '.' in parts or relpath.startswith('/'):  # noqa: E501
+            return None
+        return relpath
+
+    def _is_excluded(self, relpath):
+        return _matches(relpath, self.exclude)
+
+    def _is_included(self, relpath):
+        return not self.include or _matches(relpath, self.include)
+
+    def _is_listing(self, url):
+        mime_info = url._get_mime_info()
+        return (
+            '/'.join(mime_info[:2]).lower() in LISTING_TYPES
+            and url.final_url.endswith('/')
+        )
+
+
+def _matches(relpath, patterns):
+    name = PurePosixPath(relpath).name
+    return any(fnmatch(relpath, p) or fnmatch(name, p) for p in patterns)
@@ -0,0 +1,139 @@
+"""Contains the RetryPolicy and StallDetector classes"""
+
+import email.utils
+import random
+from time import monotonic
+from time import time
+
+from . import config
+from .progress import format_size
+
+
+class HTTPStatusError(Exception):
+    """The server answered a download request with an error status.
+
+    :ivar status: the HTTP status code
+    :ivar retry_after: value of the response's Retry-After header, if any
+    """
+    def __init__(self, status, reason=None, retry_after=None):
+        super().__init__(f"{status}: {reason}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status in config.RETRY_STATUSES
+
+
+class StallError(Exception):
+    """The transfer rate stayed below the speed limit for too long."""
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or an HTTP date) into a number of
+    seconds to wait, or None if it's missing or invalid.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time())
+
+
+class RetryPolicy:
+    """How many times to reconnect after a transfer fails, and how long to
+    wait before each attempt.
+
+    Delays grow exponentially from `backoff` up to `max_delay`. A server's
+    Retry-After header overrides a shorter delay.
+
+    :ivar attempts: max. number of retries after the first try
+    :ivar backoff: number of seconds to wait before the first retry
+    :ivar max_delay: max. number of seconds between retries, unless the server
+        asks for more
+    :ivar jitter: randomize delays so that many clients don't retry in step
+    """
+    def __init__(
+        self,
+        attempts=config.RETRIES,
+        backoff=config.RETRY_BACKOFF,
+        max_delay=config.RETRY_MAX_DELAY,
+        jitter=True,
+    ):
+        self.attempts = max(0, attempts)
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def get_delay(self, attempt, retry_after=None):
+        """Return the number of seconds to wait before retry number `attempt`
+        (counting from 1), or None if no retries are left.
+        """
+        if attempt > self.attempts:
+            return None
+        delay = min(self.max_delay, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay *= random.uniform(0.5, 1)
+        requested = parse_retry_after(retry_after)
+        if requested is not None:
+            delay = max(delay, requested)
+        return delay
+
+
+def get_retry_policy(retries):
+    """Return a RetryPolicy for retries, which may be a number of attempts or
+    already a RetryPolicy.
+    """
+    if isinstance(retries, RetryPolicy):
+        return retries
+    return RetryPolicy(attempts=retries or 0)
+
+
+class StallDetector:
+    """Detects transfers that have degraded, like curl's --speed-limit and
+    --speed-time options.
+
+    :ivar speed_limit: min. acceptable average rate in bytes/s; 0 disables
+        the check
+    :ivar speed_time: number of seconds the rate may stay below speed_limit
+    """
+    def __init__(
+        self,
+        speed_limit=config.SPEED_LIMIT,
+        speed_time=config.SPEED_TIME,
+    ):
+        self.speed_limit = speed_limit
+        self.speed_time = speed_time
+        self.reset()
+
+    def reset(self):
+        self._start = monotonic()
+        self._bytes = 0
+        self._idle = 0.0
+
+    def update(self, nbytes, idle=0.0):
+        """Account for nbytes received; raise StallError if the rate has been
+        too low for too long.
+
+        :ivar idle: number of seconds the caller deliberately waited (e.g.
+            for a rate limiter), which isn't held against the connection
+        """
+        if not self.speed_limit:
+            return
+        self._bytes += nbytes
+        self._idle += idle
+        elapsed = monotonic() - self._start - self._idle
+        if elapsed < self.speed_time:
+            return
+        rate = self._bytes / elapsed
+        if rate < self.speed_limit:
+            raise StallError(
+                f"Transfer rate {format_size(rate)}/s was below "
+                f"{format_size(self.speed_limit)}/s for {elapsed:.0f} s"
+            )
+        self.reset()
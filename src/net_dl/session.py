@@ -0,0 +1,44 @@
+"""Contains the shared HTTP session"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config
+
+
+class Session(requests.Session):
+    """A requests session with a configurable connection pool.
+
+    Pass the same Session to many Url and Download objects so that repeated
+    requests to the same host reuse warm connections instead of paying for
+    DNS, TCP and TLS setup each time.
+
+    :ivar pool_size: max. number of connections kept open per host
+    :ivar keep_alive: keep connections open between requests
+    """
+    def __init__(self, pool_size=config.POOL_SIZE, keep_alive=True):
+        super().__init__()
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+def get_default_session():
+    """Return the module-wide Session used when none is given explicitly."""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = Session()
+    return _default_session
@@ -0,0 +1,109 @@
+"""Contains the DownloadStats class"""
+
+import json
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+
+class DownloadStats:
+    """Timings and counters recorded during one run of a download, e.g. for
+    feeding into monitoring.
+
+    The `requests` library doesn't report DNS, connect and TLS times
+    separately, so any connection setup is included in 'ttfb'.
+
+    :ivar url: the requested URL
+    :ivar final_url: the URL reached after following any redirects
+    :ivar redirects: the URLs that redirected on the way to final_url, in
+        order
+    :ivar source: the URL the data was fetched from, e.g. a mirror
+    :ivar status: exit status of the download (0 on success), or None while
+        it's running
+    :ivar size: expected size of the file in bytes, or None if unknown
+    :ivar bytes_transferred: bytes received over the network in this run,
+        including any that had to be downloaded again
+    :ivar resumed_bytes: bytes of the file already on disk when the transfer
+        started
+    :ivar retries: number of reconnections and switches to another mirror
+    :ivar peak_rate: highest transfer rate between two progress events, in
+        bytes/s
+    :ivar timings: seconds spent in each phase: 'head' (HEAD request or
+        mirror probe), 'ttfb' (from sending the first GET request until its
+        response headers arrived), 'transfer' (from sending the GET request
+        until the last byte arrived, including retries), 'verify' (integrity
+        checks) and 'total'
+    """
+    def __init__(self, url=None):
+        self.url = url
+        self.final_url = None
+        self.redirects = list()
+        self.source = None
+        self.status = None
+        self.size = None
+        self.bytes_transferred = 0
+        self.resumed_bytes = 0
+        self.retries = 0
+        self.peak_rate = 0.0
+        self.timings = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def average_rate(self):
+        """Bytes received per second of transfer time."""
+        seconds = self.timings.get('transfer')
+        if not seconds:
+            return 0.0
+        return self.bytes_transferred / seconds
+
+    def add_bytes(self, nbytes):
+        with self._lock:
+            self.bytes_transferred += nbytes
+
+    def add_rate(self, rate):
+        with self._lock:
+            self.peak_rate = max(self.peak_rate, rate)
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def record_response(self, response):
+        """Note the time to first byte of a requests response."""
+        elapsed = getattr(response, 'elapsed', None)
+        if elapsed is not None:
+            self.record_ttfb(elapsed.total_seconds())
+
+    def record_ttfb(self, seconds):
+        """Note the time to first byte; only the first request's counts."""
+        with self._lock:
+            self.timings.setdefault('ttfb', seconds)
+
+    @contextmanager
+    def timer(self, phase):
+        """Add the time spent in the with-block to phase."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(phase, monotonic() - start)
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'final_url': self.final_url,
+            'redirects': list(self.redirects),
+            'source': self.source,
+            'status': self.status,
+            'size': self.size,
+            'bytes_transferred': self.bytes_transferred,
+            'resumed_bytes': self.resumed_bytes,
+            'retries': self.retries,
+            'average_rate': self.average_rate,
+            'peak_rate': self.peak_rate,
+            'timings': dict(self.timings),
+        }
+
+    def to_json(self):
+        """Return the stats as a single line of JSON."""
+        return json.dumps(self.to_dict())
@@ -0,0 +1,185 @@
+"""Contains the ContentStore class"""
+
+import errno
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from . import config
+from .props import LocalFile
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl request that clones a file's extents on Linux (btrfs, XFS, etc.).
+FICLONE = 0x40049409
+
+
+def _reflink(src, dest):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "reflinks not supported")
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def link_or_copy(src, dest):
+    """Make dest a hardlink to src; if that's not possible (e.g. on another
+    filesystem), a reflink, or else a copy. dest is replaced atomically.
+    """
+    dest = Path(dest)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        try:
+            _reflink(src, tmp)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            shutil.copy2(src, tmp)
+    tmp.replace(dest)
+
+
+class ContentStore:
+    """Local store of downloaded files addressed by their digests.
+
+    Before a file is downloaded, the store is searched for a file with the
+    digest the server advertises (Content-MD5, or an ETag that is an MD5
+    digest) or the user-supplied checksum. On a hit the stored file is linked
+    into place instead of being downloaded again; finished downloads are
+    added to the store. Files are kept at <path>/<algorithm>/<xx>/<digest>.
+
+    :ivar path: folder where stored files are kept
+    :ivar max_size: max. total size of stored files in bytes; the least
+        recently used files are removed beyond this
+    """
+    def __init__(self, path=None, max_size=config.STORE_MAX_SIZE):
+        if path is None:
+            path = config.STORE_DIR
+        self.path = Path(path).expanduser()
+        self.max_size = max_size
+        self.index_path = self.path / 'index.json'
+        self.entries = dict()
+        self._lock = threading.RLock()
+        self.load()
+
+    def add(self, keys, path):
+        """Add the file at path to the store under each of keys, a list of
+        (algorithm, hex digest) pairs.
+        """
+        with self._lock:
+            for algorithm, digest in keys:
+                obj = self.get_path(algorithm, digest)
+                if not obj.is_file():
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    link_or_copy(path, obj)
+                    logging.debug(f"Added to store: {obj}")
+                self._touch(obj)
+            self.evict()
+            self.save()
+
+    def evict(self):
+        """Remove the least recently used files until the store fits in
+        max_size.
+
+        A file stored under several keys (hardlinks to the same inode) takes
+        up its size once, and all of its keys are removed together.
+        """
+        with self._lock:
+            files = dict()  # (st_dev, st_ino) -> keys
+            for key in list(self.entries):
+                try:
+                    stat = (self.path / key).stat()
+                except OSError:
+                    self.entries.pop(key)
+                    continue
+                files.setdefault((stat.st_dev, stat.st_ino), list()).append(key)  # noqa: E501
+            total = sum(self.entries[keys[0]].get('size') for keys in files.values())  # noqa: E501
+            by_age = sorted(
+                files.values(),
+                key=lambda keys: max(self.entries[k].get('used') for k in keys),  # noqa: E501
+            )
+            for keys in by_age:
+                if total <= self.max_size:
+                    break
+                total -= self.entries[keys[0]].get('size')
+                for key in keys:
+                    logging.debug(f"Evicting from store: {key}")
+                    self._remove(self.path / key)
+
+    def find(self, keys, size=None):
+        """Return the path of a stored file matching any of keys, or None.
+
+        The stored file is hashed again before it's used, in case it was
+        modified through one of its hardlinks.
+        """
+        with self._lock:
+            for algorithm, digest in keys:
+                obj = self.get_path(algorithm, digest)
+                if not obj.is_file():
+                    continue
+                if (
+                    size is not None and obj.stat().st_size != size
+                    or LocalFile(obj).get_digest(algorithm) != digest
+                ):
+                    logging.warning(f"Removing modified file from store: {obj}")  # noqa: E501
+                    self._remove(obj)
+                    self.save()
+                    continue
+                self._touch(obj)
+                self.save()
+                return obj
+        return None
+
+    def get_path(self, algorithm, digest):
+        digest = digest.lower()
+        return self.path / algorithm / digest[:2] / digest
+
+    def load(self):
+        if not self.index_path.is_file():
+            return
+        try:
+            entries = json.loads(self.index_path.read_text())
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable store index {self.index_path}: {e}")  # noqa: E501
+            return
+        with self._lock:
+            self.entries = entries
+
+    def save(self):
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_name(f"index.json.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1))
+            tmp.replace(self.index_path)  # atomic
+
+    def _remove(self, obj):
+        obj.unlink(missing_ok=True)
+        self.entries.pop(obj.relative_to(self.path).as_posix(), None)
+
+    def _touch(self, obj):
+        # Usage is tracked in the index rather than with the file's times,
+        # which are shared with any hardlinked copies.
+        self.entries[obj.relative_to(self.path).as_posix()] = {
+            'size': obj.stat().st_size,
+            'used': time.time(),
+        }
+
+
+def get_content_store(store):
+    """Return a ContentStore for store, which may be True (use the default
+    folder), a folder path, or already a ContentStore.
+    """
+    if not store:
+        return None
+    if isinstance(store, ContentStore):
+        return store
+    if store is True:
+        return ContentStore()
+    return ContentStore(store)
@@ -0,0 +1,179 @@
+"""Contains the FileWriter class"""
+
+import errno
+import logging
+import os
+
+from . import config
+from .ratelimit import parse_rate
+
+FSYNC_POLICIES = ('none', 'end')
+
+
+def parse_fsync(policy):
+    """Check an fsync policy: 'none', 'end', or a number of bytes between
+    syncs (k, M, G suffixes are accepted). Returns 'none', 'end' or an int.
+    """
+    if isinstance(policy, int) and not isinstance(policy, bool):
+        value = policy
+    elif str(policy).lower() in FSYNC_POLICIES:
+        return str(policy).lower()
+    else:
+        try:
+            value = int(parse_rate(policy))
+        except ValueError:
+            raise ValueError(
+                f"Invalid fsync policy: {policy}; use none, end or a size"
+            )
+    if value <= 0:
+        raise ValueError(f"fsync interval must be positive: {policy}")
+    return value
+
+
+def reserve(fd, size):
+    """Reserve size bytes on disk for the open file fd, so that the download
+    can't run out of space midway and the file isn't fragmented. Falls back
+    to setting the file size if the platform or filesystem can't reserve.
+    """
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                raise
+            logging.debug(f"Can't preallocate file: {e}")
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+
+
+def allocate(path, size):
+    """Create an empty file at path with size bytes reserved for it."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        reserve(fd, size)
+    finally:
+        os.close(fd)
+
+
+class FileWriter:
+    """Writes downloaded data to a file at explicit offsets.
+
+    Small chunks are collected in a buffer and written together with
+    positional writes, so several writers (e.g. one per segment) can share a
+    file without seeking.
+
+    :ivar path: the file to write to
+    :ivar mode: 'wb' to start a new file, 'ab' to add to the end of an
+        existing one, or 'r+b' to write into an existing one at `offset`
+    :ivar offset: where to start writing in 'r+b' mode
+    :ivar size: number of bytes to reserve for the whole file; in 'wb' and
+        'ab' mode, any space not written to is released on close()
+    :ivar buffer_size: data is written once this many bytes are buffered
+    :ivar fsync: 'none', 'end' (sync on close) or a number of bytes written
+        between syncs
+    """
+    def __init__(
+        self,
+        path,
+        mode='wb',
+        offset=0,
+        size=None,
+        buffer_size=config.WRITE_BUFFER_SIZE,
+        fsync=config.FSYNC,
+    ):
+        flags = os.O_WRONLY | os.O_CREAT
+        if mode == 'wb':
+            flags |= os.O_TRUNC
+        elif mode not in ('ab', 'r+b'):
+            raise ValueError(f"Invalid file mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.fsync = parse_fsync(fsync)
+        self.size = size
+        self.closed = False
+        self._fd = os.open(path, flags, 0o666)
+        if mode == 'ab':
+            offset = os.fstat(self._fd).st_size
+        self._offset = offset  # where the buffer goes
+        self._buffer = bytearray()
+        self._unsynced = 0
+        if size:
+            try:
+                reserve(self._fd, size)
+            except OSError:
+                os.close(self._fd)
+                raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+            if self.size and self.mode != 'r+b':
+                # Give back reserved space that wasn't written to.
+                os.ftruncate(self._fd, self._offset)
+            if self.fsync != 'none':
+                os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+            self.closed = True
+
+    def commit(self):
+        """Write out buffered data and, unless the fsync policy is 'none',
+        make sure it's on disk.
+        """
+        self.flush()
+        if self.fsync != 'none':
+            os.fsync(self._fd)
+            self._unsynced = 0
+
+    def fileno(self):
+        return self._fd
+
+    def flush(self):
+        """Write out buffered data."""
+        if self._buffer:
+            self._pwrite(self._buffer, self._offset)
+            self._offset += len(self._buffer)
+            self._buffer = bytearray()
+
+    def seek(self, offset):
+        self.flush()
+        self._offset = offset
+
+    def tell(self):
+        return self._offset + len(self._buffer)
+
+    def write(self, data):
+        if not self._buffer and len(data) >= self.buffer_size:
+            self._pwrite(data, self._offset)  # no need to copy big chunks
+            self._offset += len(data)
+        else:
+            self._buffer += data
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+        return len(data)
+
+    def _pwrite(self, data, offset):
+        view = memoryview(data)
+        while view:
+            if hasattr(os, 'pwrite'):
+                n = os.pwrite(self._fd, view, offset)
+            else:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                n = os.write(self._fd, view)
+            view = view[n:]
+            offset += n
+        if isinstance(self.fsync, int):
+            self._unsynced += len(data)
+            if self._unsynced >= self.fsync:
+                os.fsync(self._fd)
+                self._unsynced = 0
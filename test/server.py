@@ -0,0 +1,267 @@
+"""Local HTTP server used by the offline tests."""
+
+import gzip
+import hashlib
+import re
+import zlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass  # keep test output quiet
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body=True):
+        self.server.requests.append((self.command, self.path, self.headers))
+        self.server.clients.add(self.client_address)
+        resource = self.server.files.get(self.path)
+        if resource is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if resource.get('latency'):
+            time.sleep(resource.get('latency'))
+        content = resource.get('content')
+        encoding = resource.get('encoding')
+        if encoding and encoding in self.headers.get('Accept-Encoding', ''):
+            content = resource.get('encoded')
+        else:
+            encoding = None
+        if (
+            self.headers.get('If-None-Match') == resource.get('etag')
+            or self.headers.get('If-Modified-Since') == resource.get('last_modified')  # noqa: E501
+        ):
+            self.send_response(304)
+            self.send_header('ETag', resource.get('etag'))
+            self.end_headers()
+            return
+
+        fault = None
+        if send_body and resource.get('faults'):
+            fault = resource.get('faults').pop(0)
+        if fault and fault[0] == 'status':
+            self.send_response(fault[1])
+            self.send_header('Content-Length', '0')
+            for k, v in fault[2].items():
+                self.send_header(k, v)
+            self.end_headers()
+            return
+
+        status = 200
+        start, end = 0, len(content) - 1
+        chunked = resource.get('chunked')
+        range_header = self.headers.get('Range')
+        if range_header and resource.get('accept_ranges') and not chunked:
+            ranges = _parse_ranges(range_header, len(content))
+            if len(ranges) > 1 and resource.get('multirange'):
+                self._send_byteranges(content, ranges, resource, send_body)
+                return
+            if ranges:
+                start, end = ranges[0]
+                status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', resource.get('content_type'))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Last-Modified', resource.get('last_modified'))
+        self.send_header('ETag', resource.get('etag'))
+        if resource.get('accept_ranges') and not chunked:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header(
+                'Content-Range',
+                f"bytes {start}-{end}/{len(content)}"
+            )
+        for k, v in resource.get('headers').items():
+            self.send_header(k, v)
+        self.end_headers()
+        if not send_body:
+            return
+        body = memoryview(content)[start:end+1]
+        if fault and fault[0] == 'drop':
+            # Send part of the body, then cut the connection.
+            self._write_body(body[:fault[1]], resource)
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if fault and fault[0] == 'stall':
+            # Send part of the body, then go quiet for a while.
+            self._write_body(body[:fault[1]], resource)
+            self.wfile.flush()
+            time.sleep(fault[2])
+            body = body[fault[1]:]
+        self._write_body(body, resource)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _send_byteranges(self, content, ranges, resource, send_body=True):
+        """Answer a request for several ranges with a multipart/byteranges
+        body.
+        """
+        boundary = 'BYTERANGES'
+        body = b''
+        for start, end in ranges:
+            body += (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {resource.get('content_type')}\r\n"
+                f"Content-Range: bytes {start}-{end}/{len(content)}\r\n\r\n"
+            ).encode()
+            body += content[start:end+1]
+        body += f"\r\n--{boundary}--\r\n".encode()
+        self.send_response(206)
+        self.send_header(
+            'Content-Type', f"multipart/byteranges; boundary={boundary}"
+        )
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', resource.get('last_modified'))
+        self.send_header('ETag', resource.get('etag'))
+        self.end_headers()
+        if send_body:
+            self._write_body(body, resource)
+
+    def _write_body(self, body, resource):
+        bandwidth = resource.get('bandwidth')
+        block_size = 64 * 1024
+        if bandwidth:
+            block_size = 16 * 1024  # small, so pacing is smooth
+        start_time = time.monotonic()
+        for i in range(0, len(body), block_size):
+            block = body[i:i+block_size]
+            if bandwidth:
+                # Wait until the block could have arrived at this rate, so
+                # even a body of a single block is throttled.
+                delay = (i + len(block)) / bandwidth
+                delay -= time.monotonic() - start_time
+                if delay > 0:
+                    time.sleep(delay)
+            if resource.get('chunked'):
+                self.wfile.write(f"{len(block):X}\r\n".encode())
+                self.wfile.write(block)
+                self.wfile.write(b'\r\n')
+            else:
+                self.wfile.write(block)
+
+
+class LocalServer:
+    """Serve in-memory files over HTTP on localhost in a background thread."""
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.files = dict()
+        self.httpd.requests = list()
+        self.httpd.clients = set()
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever,
+            daemon=True,
+        )
+
+    @property
+    def clients(self):
+        return self.httpd.clients
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def add_file(
+        self,
+        path,
+        content,
+        content_type='application/octet-stream',
+        accept_ranges=True,
+        headers=None,
+        faults=None,
+        chunked=False,
+        latency=0,
+        bandwidth=None,
+        encoding=None,
+        multirange=True,
+    ):
+        """Serve content at path.
+
+        With chunked=True the response has no Content-Length and ranges are
+        not supported. latency is the number of seconds to wait before each
+        response, and bandwidth caps the rate of each response in bytes/s.
+        With encoding ('gzip' or 'deflate'), content is sent compressed to
+        clients that accept it. Requests for several ranges get a
+        multipart/byteranges response, or just the first range if multirange
+        is False.
+
+        faults is a list of failures to inject into successive GET requests:
+        ('status', code, headers) answers with an error status; ('drop', n)
+        sends n bytes of the body and closes the connection; ('stall', n,
+        seconds) sends n bytes and pauses before sending the rest.
+        """
+        self.httpd.files[path] = {
+            'content': content,
+            'content_type': content_type,
+            'accept_ranges': accept_ranges,
+            'last_modified': formatdate(usegmt=True),
+            'etag': f'"{hashlib.sha1(content).hexdigest()}"',
+            'headers': headers or dict(),
+            'faults': list(faults or list()),
+            'chunked': chunked,
+            'latency': latency,
+            'bandwidth': bandwidth,
+            'encoding': encoding,
+            'encoded': _encode(content, encoding),
+            'multirange': multirange,
+        }
+        return self.url(path)
+
+    def url(self, path):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _parse_ranges(range_header, size):
+    """Return the (start, end) byte ranges asked for in a Range header."""
+    ranges = list()
+    if not range_header.strip().startswith('bytes='):
+        return ranges
+    for spec in range_header.strip()[len('bytes='):].split(','):
+        m = re.match(r'(\d*)-(\d*)$', spec.strip())
+        if not m:
+            return list()
+        start, end = 0, size - 1
+        if m.group(1):
+            start = int(m.group(1))
+        if m.group(2):
+            end = min(int(m.group(2)), size - 1)
+        ranges.append((start, end))
+    return ranges
+
+
+def _encode(content, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(content)
+    if encoding == 'deflate':
+        return zlib.compress(content)
+    return None
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import aio
+from .server import LocalServer
+
+
+@unittest.skipIf(aio.aiohttp is None, "aiohttp not installed")
+class TestAsyncDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_get(self):
+        contents = {f'/file{i}.bin': os.urandom(50_000) for i in range(3)}
+        urls = [self.server.add_file(p, c) for p, c in contents.items()]
+
+        async def get_all():
+            dls = [aio.AsyncDownload(u, destdir=self.tmp.name) for u in urls]
+            return await asyncio.gather(*(d.get() for d in dls))
+
+        self.assertEqual(asyncio.run(get_all()), [0, 0, 0])
+        for p, c in contents.items():
+            dest = Path(self.tmp.name) / p.lstrip('/')
+            self.assertEqual(dest.read_bytes(), c)
+
+    def test_progress(self):
+        url = self.server.add_file('/file.bin', os.urandom(50_000))
+        dl = aio.AsyncDownload(url, destdir=self.tmp.name, chunk_size=10_000)
+
+        async def follow():
+            return [p async for p in dl]
+
+        progress = asyncio.run(follow())
+        self.assertTrue(progress[-1].done)
+        self.assertEqual(progress[-1].percent, 100)
+        self.assertEqual(progress[-1].bytes_done, 50_000)
+        self.assertEqual(dl.status, 0)
+
+    def test_resume(self):
+        content = os.urandom(50_000)
+        url = self.server.add_file('/file.bin', content)
+        dest = Path(self.tmp.name) / 'file.bin'
+        dest.write_bytes(content[:20_000])
+        dl = aio.AsyncDownload(url, destdir=self.tmp.name, resume=True)
+        self.assertEqual(asyncio.run(dl.get()), 0)
+        self.assertEqual(dest.read_bytes(), content)
+        ranges = [h.get('Range') for m, p, h in self.server.requests]
+        self.assertIn('bytes=20000-49999', ranges)
+
+    def test_compressed(self):
+        content = b'net-dl ' * 20_000
+        url = self.server.add_file('/file.bin', content, encoding='gzip')
+        dl = aio.AsyncDownload(url, destdir=self.tmp.name, compress=True)
+        self.assertEqual(asyncio.run(dl.get()), 0)
+        dest = Path(self.tmp.name) / 'file.bin'
+        self.assertEqual(dest.read_bytes(), content)
+        encodings = [h.get('Accept-Encoding') for m, p, h in self.server.requests]  # noqa: E501
+        self.assertIn('gzip', encodings[-1])
+
+    def test_stream_to(self):
+        content = os.urandom(50_000)
+        url = self.server.add_file('/file.bin', content)
+        written = list()
+
+        class Sink:
+            async def write(self, data):
+                written.append(data)
+
+        dl = aio.AsyncDownload(url, chunk_size=10_000)
+        self.assertEqual(asyncio.run(dl.stream_to(Sink())), len(content))
+        self.assertEqual(b''.join(written), content)
+        self.assertEqual(len(written), 5)
+
+    def test_404(self):
+        dl = aio.AsyncDownload(self.server.url('/missing'))
+        self.assertEqual(asyncio.run(dl.get()), 1)
+
+    def test_get_file_without_head_response(self):
+        # Nothing listens on a port that was just released.
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        dl = aio.AsyncDownload(
+            f'http://127.0.0.1:{port}/file.bin', destdir=self.tmp.name
+        )
+        self.assertFalse(asyncio.run(dl.get_file()))
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
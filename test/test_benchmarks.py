@@ -0,0 +1,22 @@
+import unittest
+
+from benchmarks.bench_download import run_benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run(self):
+        results = run_benchmarks(
+            sizes=[100_000],
+            chunk_sizes=[None],
+            methods=['file', 'content'],
+            scenarios=['plain', 'drops'],
+            repeat=1,
+        )
+        self.assertEqual(
+            [(r.get('method'), r.get('scenario')) for r in results],
+            [('file', 'plain'), ('content', 'plain'), ('file', 'drops')],
+        )
+        for r in results:
+            self.assertTrue(r.get('ok'))
+            self.assertGreater(r.get('throughput'), 0)
+            self.assertIsNotNone(r.get('ttfb'))
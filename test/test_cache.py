@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from queue import Queue
+
+from src.net_dl import cache
+from src.net_dl import download
+from .server import LocalServer
+
+
+class TestValidatorCache(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = Path(self.tmp.name) / 'cache' / 'validators.json'
+        self.destdir = Path(self.tmp.name) / 'dest'
+        self.destdir.mkdir()
+        self.dest = self.destdir / 'file.bin'
+
+    def get(self, url):
+        d = download.Download(
+            url,
+            destdir=self.destdir,
+            progress_queue=Queue(),
+            validator_cache=cache.ValidatorCache(self.cache_file),
+        )
+        return d.get()
+
+    def get_count(self):
+        return [m for m, p, h in self.server.requests].count('GET')
+
+    def test_not_modified(self):
+        url = self.server.add_file('/file.bin', os.urandom(10_000))
+        self.assertEqual(self.get(url), 0)
+        self.assertTrue(self.cache_file.is_file())
+        self.assertEqual(self.get(url), 0)
+        self.assertEqual(self.get_count(), 1)
+        self.assertIn('If-None-Match', self.server.requests[-1][2])
+
+    def test_not_modified_without_head(self):
+        content = os.urandom(10_000)
+        url = self.server.add_file('/file.bin', content)
+        for i in range(2):
+            d = download.Download(
+                url,
+                destdir=self.destdir,
+                progress_queue=Queue(),
+                validator_cache=cache.ValidatorCache(self.cache_file),
+                head_request=False,
+            )
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(d.stats.bytes_transferred, 0)
+        self.assertEqual([m for m, p, h in self.server.requests], ['GET', 'GET'])  # noqa: E501
+        self.assertIn('If-None-Match', self.server.requests[-1][2])
+        self.assertEqual(self.dest.read_bytes(), content)
+
+    def test_modified_on_server(self):
+        url = self.server.add_file('/file.bin', os.urandom(10_000))
+        self.assertEqual(self.get(url), 0)
+        content = os.urandom(10_000)
+        self.server.add_file('/file.bin', content)
+        self.server.httpd.files['/file.bin']['last_modified'] = (
+            'Wed, 21 Oct 2015 07:28:00 GMT'
+        )
+        self.assertEqual(self.get(url), 0)
+        self.assertEqual(self.get_count(), 2)
+        self.assertEqual(self.dest.read_bytes(), content)
+
+    def test_other_destination(self):
+        content = os.urandom(10_000)
+        url = self.server.add_file('/file.bin', content)
+        self.assertEqual(self.get(url), 0)
+        other = Path(self.tmp.name) / 'other'
+        other.mkdir()
+        for destdir, destname in ((self.destdir, 'copy.bin'), (other, None)):
+            d = download.Download(
+                url,
+                destdir=destdir,
+                destname=destname,
+                progress_queue=Queue(),
+                validator_cache=cache.ValidatorCache(self.cache_file),
+            )
+            self.assertEqual(d.get(), 0)
+            self.assertNotIn('If-None-Match', self.server.requests[-2][2])
+        self.assertEqual((self.destdir / 'copy.bin').read_bytes(), content)
+        self.assertEqual((other / 'file.bin').read_bytes(), content)
+        # Each copy now has its own entry.
+        self.assertEqual(self.get(url), 0)
+        self.assertEqual(self.get_count(), 3)
+
+    def test_modified_locally(self):
+        content = os.urandom(10_000)
+        url = self.server.add_file('/file.bin', content)
+        self.assertEqual(self.get(url), 0)
+        self.dest.write_bytes(b'changed')
+        self.assertEqual(self.get(url), 0)
+        self.assertNotIn('If-None-Match', self.server.requests[-2][2])
+        self.assertEqual(self.dest.read_bytes(), content)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,39 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import checksum
+
+
+class TestParseChecksum(unittest.TestCase):
+    def test_valid(self):
+        digest = 'ab' * 32
+        self.assertEqual(
+            checksum.parse_checksum(f'SHA256:{digest.upper()}'),
+            ('sha256', digest)
+        )
+
+    def test_invalid(self):
+        for value in ('ab' * 32, 'sha1:' + 'ab' * 20, 'md5:xyz', 'md5:abcd'):
+            with self.assertRaises(ValueError):
+                checksum.parse_checksum(value)
+
+
+class TestHashFile(unittest.TestCase):
+    def test_hash_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data = os.urandom(3 * 1024 + 1)
+            path = Path(tmp) / 'file.bin'
+            path.write_bytes(data)
+            self.assertEqual(
+                checksum.hash_file(path, 'sha256').hexdigest(),
+                hashlib.sha256(data).hexdigest()
+            )
+            # Empty files can't be memory-mapped.
+            path.write_bytes(b'')
+            self.assertEqual(
+                checksum.hash_file(path).hexdigest(),
+                hashlib.md5(b'').hexdigest()
+            )
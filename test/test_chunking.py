@@ -0,0 +1,38 @@
+import io
+import unittest
+
+from src.net_dl import chunking
+
+
+class TestChunkSizer(unittest.TestCase):
+    def test_grow(self):
+        sizer = chunking.ChunkSizer(
+            initial=1024, minimum=1024, maximum=4096, target_time=1
+        )
+        for i in range(5):
+            sizer.update(sizer.size, sizer.size, 0.01)
+        self.assertEqual(sizer.size, 4096)
+
+    def test_shrink(self):
+        sizer = chunking.ChunkSizer(
+            initial=4096, minimum=1024, maximum=4096, target_time=1
+        )
+        for i in range(5):
+            sizer.update(sizer.size, sizer.size, 5)
+        self.assertEqual(sizer.size, 1024)
+
+    def test_short_read(self):
+        sizer = chunking.ChunkSizer(
+            initial=1024, minimum=1024, maximum=4096, target_time=1
+        )
+        sizer.update(10, 1024, 0.01)
+        self.assertEqual(sizer.size, 1024)
+
+    def test_iter_chunks(self):
+        data = bytes(range(256)) * 1000
+        sizer = chunking.ChunkSizer(
+            initial=1024, minimum=1024, maximum=64*1024, target_time=1
+        )
+        chunks = list(chunking.iter_chunks(io.BytesIO(data).read, sizer))
+        self.assertEqual(b''.join(chunks), data)
+        self.assertGreater(max(len(c) for c in chunks), 1024)
@@ -0,0 +1,142 @@
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import daemon
+from .server import LocalServer
+
+
+class TestGetAddress(unittest.TestCase):
+    def test_addresses(self):
+        self.assertEqual(daemon.get_address('8786'), ('127.0.0.1', 8786))
+        self.assertEqual(
+            daemon.get_address('localhost:8786'), ('localhost', 8786)
+        )
+        self.assertEqual(daemon.get_address('/tmp/dl.sock'), '/tmp/dl.sock')
+        with self.assertRaises(ValueError):
+            daemon.get_address('0.0.0.0:8786')
+
+
+class TestDnsCache(unittest.TestCase):
+    def test_cache(self):
+        cache = daemon.DnsCache(ttl=60)
+        cache.install()
+        try:
+            first = socket.getaddrinfo('localhost', 80)
+            self.assertEqual(len(cache._entries), 1)
+            self.assertEqual(socket.getaddrinfo('localhost', 80), first)
+            self.assertEqual(len(cache._entries), 1)
+        finally:
+            cache.uninstall()
+        self.assertIsNot(socket.getaddrinfo, cache.getaddrinfo)
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name)
+        if hasattr(socket, 'AF_UNIX'):
+            address = str(self.destdir / 'net-dl.sock')
+        else:
+            address = ('127.0.0.1', 0)
+        self.daemon = daemon.DownloadDaemon(address, workers=2).start()
+        self.client = daemon.DaemonClient(self.daemon.address)
+
+    def test_get(self):
+        contents = {f'/file{i}.bin': os.urandom(4096) for i in range(3)}
+        urls = [self.server.add_file(p, c) for p, c in contents.items()]
+        self.assertEqual(self.client.get(urls, destdir=self.destdir), 0)
+        self.assertEqual(set(self.client.results.values()), {0})
+        for p, c in contents.items():
+            self.assertEqual((self.destdir / p.lstrip('/')).read_bytes(), c)
+        self.assertEqual(len(self.client.stats), 3)
+
+    def test_text_saved_as_file(self):
+        url = self.server.add_file('/page.txt', b'text\n', content_type='text/plain')  # noqa: E501
+        self.assertEqual(self.client.get([url], destdir=self.destdir), 0)
+        self.assertEqual((self.destdir / 'page.txt').read_bytes(), b'text\n')
+
+    def test_status_and_dedup(self):
+        url = self.server.add_file('/slow.bin', os.urandom(4096), latency=0.5)
+        job = self.client.submit(url, destdir=str(self.destdir))
+        again = self.client.submit(url, destdir=str(self.destdir))
+        self.assertEqual(again.get('id'), job.get('id'))
+        self.assertIn(self.client.status(job.get('id')).get('state'), ('queued', 'running'))  # noqa: E501
+        job = self.client.wait(job.get('id'))
+        self.assertEqual(job.get('state'), 'done')
+        self.assertEqual(job.get('percent'), 100)
+        self.assertEqual(len(self.client.jobs()), 1)
+        gets = [p for c, p, h in self.server.requests if c == 'GET']
+        self.assertEqual(gets, ['/slow.bin'])
+
+    def test_failure(self):
+        url = self.server.url('/missing.bin')
+        self.assertEqual(self.client.get([url], destdir=self.destdir), 1)
+        self.assertEqual(self.client.results, {url: 1})
+
+    def test_bad_requests(self):
+        with self.assertRaises(daemon.DaemonError):
+            self.client.submit('http://localhost/a', destdir='relative')
+        with self.assertRaises(daemon.DaemonError):
+            self.client.submit('http://localhost/a', destdir='/tmp', rate_limit=1)  # noqa: E501
+        with self.assertRaises(daemon.DaemonError):
+            self.client.status('unknown')
+        with self.assertRaises(daemon.DaemonError):
+            self.client.request('unknown')
+
+    def test_shutdown(self):
+        self.client.shutdown()
+        self.daemon.shutdown()
+        with self.assertRaises(daemon.DaemonError):
+            daemon.DaemonClient(self.daemon.address, timeout=1).jobs()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "needs Unix sockets")
+    def test_socket_permissions(self):
+        mode = Path(self.daemon.address).stat().st_mode
+        self.assertEqual(mode & 0o777, 0o600)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.shutdown()
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestTcpDaemon(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name)
+        self.token_file = self.destdir / 'token'
+        self.daemon = daemon.DownloadDaemon(
+            ('127.0.0.1', 0), token_file=self.token_file
+        ).start()
+
+    def get_client(self, token_file=None):
+        return daemon.DaemonClient(
+            self.daemon.address, token_file=token_file or self.token_file
+        )
+
+    def test_token(self):
+        self.assertEqual(self.token_file.stat().st_mode & 0o777, 0o600)
+        url = self.server.add_file('/file.bin', os.urandom(4096))
+        with self.get_client() as client:
+            self.assertEqual(client.get([url], destdir=self.destdir), 0)
+
+    def test_no_token(self):
+        wrong = self.destdir / 'wrong'
+        wrong.write_text('guess')
+        with self.get_client(wrong) as client:
+            with self.assertRaises(daemon.DaemonError):
+                client.jobs()
+        with self.get_client(self.destdir / 'missing') as client:
+            with self.assertRaises(daemon.DaemonError):
+                client.jobs()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.server.stop()
+        self.tmp.cleanup()
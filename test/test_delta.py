@@ -0,0 +1,183 @@
+import hashlib
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+from src.net_dl import config
+from src.net_dl import delta
+from src.net_dl import download
+from .server import LocalServer
+
+BLOCK_SIZE = 1024
+
+
+def make_content(size, seed=0):
+    # Random.randbytes() needs Python 3.9.
+    rng = random.Random(seed)
+    return rng.getrandbits(8 * size).to_bytes(size, 'little')
+
+
+class TestBlockIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'file.bin'
+
+    def _index(self, content):
+        self.path.write_bytes(content)
+        return delta.BlockIndex.build(self.path, block_size=BLOCK_SIZE)
+
+    def test_rolling_checksum(self):
+        data = make_content(300)
+        weak = delta.get_weak_checksum(data[:100])
+        for i in range(200):
+            weak = delta.roll_weak_checksum(weak, data[i], data[i + 100], 100)
+            self.assertEqual(weak, zlib.adler32(data[i + 1:i + 101]))
+
+    def test_json(self):
+        index = self._index(make_content(BLOCK_SIZE * 3 + 10))
+        self.assertEqual(len(index.blocks), 4)
+        loaded = delta.BlockIndex.from_json(index.to_json())
+        self.assertEqual(loaded.blocks, index.blocks)
+        self.assertEqual(loaded.sha256, index.sha256)
+        for text in ('{}', '[]', index.to_json().replace('"size":3082', '"size":9')):  # noqa: E501
+            with self.assertRaises(ValueError):
+                delta.BlockIndex.from_json(text)
+
+    def test_find_shifted_blocks(self):
+        new = make_content(BLOCK_SIZE * 8 + 100)
+        index = self._index(new)
+        # Old copy: 10 bytes inserted at the start, block 3 changed, and a
+        # different tail.
+        old = b'x' * 10 + new[:BLOCK_SIZE * 3] + os.urandom(BLOCK_SIZE) + new[BLOCK_SIZE * 4:BLOCK_SIZE * 8]  # noqa: E501
+        self.path.write_bytes(old)
+        found = index.find_blocks(self.path)
+        self.assertEqual(sorted(found), [0, 1, 2, 4, 5, 6, 7])
+        self.assertEqual(found.get(4), 10 + BLOCK_SIZE * 4)
+        self.assertEqual(index.get_ranges([3, 8]), [
+            (BLOCK_SIZE * 3, BLOCK_SIZE * 4 - 1),
+            (BLOCK_SIZE * 8, BLOCK_SIZE * 8 + 99),
+        ])
+        self.assertEqual(index.get_ranges([1, 2]), [(BLOCK_SIZE, BLOCK_SIZE * 3 - 1)])  # noqa: E501
+
+    def test_find_short_last_block(self):
+        new = make_content(BLOCK_SIZE * 2 + 100)
+        index = self._index(new)
+        self.path.write_bytes(os.urandom(50) + new[-100:])
+        self.assertEqual(index.find_blocks(self.path), {2: 50})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestByteRanges(unittest.TestCase):
+    def test_single_range(self):
+        headers = {'Content-Range': 'bytes 10-14/100'}
+        self.assertEqual(
+            list(delta.iter_byteranges([b'abc', b'de'], headers)),
+            [(10, b'abc'), (13, b'de')]
+        )
+
+    def test_multipart(self):
+        body = (
+            b'\r\n--XY\r\nContent-Type: application/octet-stream\r\n'
+            b'Content-Range: bytes 0-3/100\r\n\r\nabcd'
+            b'\r\n--XY\r\nContent-Range: bytes 50-51/100\r\n\r\nef'
+            b'\r\n--XY--\r\n'
+        )
+        headers = {'Content-Type': 'multipart/byteranges; boundary=XY'}
+        chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+        data = dict()
+        for offset, piece in delta.iter_byteranges(chunks, headers):
+            for i, b in enumerate(piece):
+                data[offset + i] = b
+        self.assertEqual(bytes(data.get(i) for i in range(4)), b'abcd')
+        self.assertEqual(bytes([data.get(50), data.get(51)]), b'ef')
+        self.assertEqual(len(data), 6)
+
+
+class TestDeltaDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / 'image.bin'
+        self.new = make_content(BLOCK_SIZE * 64, seed=1)
+        index_path = Path(self.tmp.name) / 'index.json'
+        index_path.write_bytes(self.new)
+        self.index = delta.BlockIndex.build(index_path, block_size=BLOCK_SIZE)
+        index_path.unlink()
+        self.old = bytearray(self.new)
+        self.old[BLOCK_SIZE * 10:BLOCK_SIZE * 10 + 5] = b'xxxxx'
+        self.old[BLOCK_SIZE * 40:BLOCK_SIZE * 40 + 5] = b'yyyyy'
+
+    def _serve(self, **kwargs):
+        url = self.server.add_file('/image.bin', self.new, **kwargs)
+        self.server.add_file(
+            f'/image.bin{config.DELTA_INDEX_SUFFIX}',
+            self.index.to_json().encode(),
+            content_type='application/json',
+        )
+        return url
+
+    def _get(self, url):
+        d = download.Download(url, destdir=self.tmp.name, delta=True)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.new)
+        return d
+
+    def test_same_size(self):
+        self.dest.write_bytes(self.old)
+        d = self._get(self._serve())
+        self.assertEqual(d.stats.bytes_transferred, BLOCK_SIZE * 2)
+        self.assertEqual(d.stats.resumed_bytes, BLOCK_SIZE * 62)
+        ranges = [
+            h.get('Range') for c, p, h in self.server.requests
+            if c == 'GET' and p == '/image.bin'
+        ]
+        self.assertEqual(ranges, [
+            f'bytes={BLOCK_SIZE * 10}-{BLOCK_SIZE * 11 - 1},'
+            f'{BLOCK_SIZE * 40}-{BLOCK_SIZE * 41 - 1}'
+        ])
+
+    def test_checksum_unchanged(self):
+        self.dest.write_bytes(self.old)
+        d = self._get(self._serve())
+        self.assertIsNone(d.checksum)
+        md5 = hashlib.md5(self.new).hexdigest()
+        self.dest.write_bytes(self.old)
+        d = download.Download(
+            self._serve(),
+            destdir=self.tmp.name,
+            delta=True,
+            checksum=f"md5:{md5}",
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(d.checksum, ('md5', md5))
+        self.assertEqual(d.stats.bytes_transferred, BLOCK_SIZE * 2)
+
+    def test_shorter_file(self):
+        self.dest.write_bytes(self.old[BLOCK_SIZE:])
+        d = self._get(self._serve())
+        self.assertEqual(d.stats.bytes_transferred, BLOCK_SIZE * 3)
+
+    def test_no_multirange_support(self):
+        self.dest.write_bytes(self.old)
+        d = self._get(self._serve(multirange=False))
+        # Falls back to downloading the whole file.
+        self.assertGreaterEqual(d.stats.bytes_transferred, len(self.new))
+
+    def test_no_index(self):
+        self.dest.write_bytes(self.old[:-1])
+        url = self.server.add_file('/image.bin', self.new)
+        self._get(url)
+
+    def test_current_file(self):
+        self.dest.write_bytes(self.new)
+        d = self._get(self._serve())
+        self.assertEqual(d.stats.bytes_transferred, 0)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -1,7 +1,25 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
 import unittest
+from base64 import b64encode
+from contextlib import redirect_stdout
+from io import BytesIO
+from io import StringIO
 from pathlib import Path
+from queue import Queue
 
+from src.net_dl import config
 from src.net_dl import download
+from src.net_dl.journal import Journal
+from src.net_dl.ratelimit import RateLimiter
+from src.net_dl.retry import HTTPStatusError
+from src.net_dl.retry import RetryPolicy
+from src.net_dl.session import Session
+from .server import LocalServer
 
 
 class TestDownload(unittest.TestCase):
@@ -44,3 +62,628 @@ class TestDownload(unittest.TestCase):
         self.assertTrue(dest.is_file())
         if dest.is_file():
             dest.unlink()
+
+
+class TestSegmentedDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(3 * config.SEGMENT_MIN_SIZE + 123)
+
+    def test_segments(self):
+        url = self.server.add_file('/big.bin', self.content)
+        d = download.Download(url, destdir=self.tmp.name, segments=4)
+        self.assertEqual(d.get(), 0)
+        dest = Path(self.tmp.name) / 'big.bin'
+        self.assertEqual(dest.read_bytes(), self.content)
+        ranges = [
+            h.get('Range') for m, p, h in self.server.requests
+            if m == 'GET'
+        ]
+        self.assertEqual(len(ranges), 3)
+        self.assertTrue(all(r.startswith('bytes=') for r in ranges))
+
+    def test_segments_no_range_support(self):
+        url = self.server.add_file(
+            '/big.bin', self.content, accept_ranges=False
+        )
+        d = download.Download(url, destdir=self.tmp.name, segments=4)
+        self.assertEqual(d.get(), 0)
+        dest = Path(self.tmp.name) / 'big.bin'
+        self.assertEqual(dest.read_bytes(), self.content)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_shared_connection(self):
+        session = Session()
+        for i in range(3):
+            url = self.server.add_file(f'/file{i}.bin', os.urandom(1024))
+            d = download.Download(url, destdir=self.tmp.name, session=session)
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(len(self.server.requests), 6)  # HEAD + GET each
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_no_keep_alive(self):
+        session = Session(keep_alive=False)
+        url = self.server.add_file('/file.bin', os.urandom(1024))
+        d = download.Download(url, destdir=self.tmp.name, session=session)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(len(self.server.clients), 2)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestChecksum(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(100_000)
+        self.dest = Path(self.tmp.name) / 'file.bin'
+
+    def test_checksum(self):
+        url = self.server.add_file('/file.bin', self.content)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        d = download.Download(
+            url, destdir=self.tmp.name, checksum=f'sha256:{sha256}'
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(d.dest.digests.get('sha256'), sha256)
+
+    def test_checksum_mismatch(self):
+        url = self.server.add_file('/file.bin', self.content)
+        d = download.Download(
+            url, destdir=self.tmp.name, checksum=f"sha512:{'0' * 128}"
+        )
+        with self.assertRaises(SystemExit):
+            d.get()
+
+    def test_resume_md5(self):
+        md5 = b64encode(hashlib.md5(self.content).digest()).decode()
+        url = self.server.add_file(
+            '/file.bin', self.content, headers={'Content-MD5': md5}
+        )
+        self.dest.write_bytes(self.content[:40_000])
+        d = download.Download(url, destdir=self.tmp.name, resume=True)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(d.dest.md5, md5)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestProgressQueue(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_progress_events(self):
+        url = self.server.add_file('/file.bin', os.urandom(200_000))
+        q = Queue()
+        calls = []
+        d = download.Download(
+            url,
+            destdir=self.tmp.name,
+            chunk_size=100,
+            progress_queue=q,
+            progress_interval=60,
+            callback=calls.append,
+            callback_args=[1],
+        )
+        self.assertEqual(d.get(), 0)
+        events = [q.get() for i in range(q.qsize())]
+        self.assertEqual(len(events), 1)  # only the final event
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(events[-1].done)
+        self.assertEqual(events[-1].bytes_done, 200_000)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_shared_rate_limit(self):
+        limiter = RateLimiter(400_000, burst=100_000)
+        downloads = []
+        for i in range(2):
+            url = self.server.add_file(f'/file{i}.bin', os.urandom(150_000))
+            downloads.append(download.Download(
+                url,
+                destdir=self.tmp.name,
+                chunk_size=10_000,
+                progress_queue=Queue(),
+                rate_limit=limiter,
+            ))
+        start = time.monotonic()
+        threads = [threading.Thread(target=d.get) for d in downloads]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 300 kB at 400 kB/s after a 100 kB burst takes at least 0.5 s.
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+        for i in range(2):
+            self.assertTrue((Path(self.tmp.name) / f'file{i}.bin').is_file())
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class _InterruptedDownload(download.Download):
+    """Fails with a connection error after the first chunk."""
+    def _iter_chunks(self, r):
+        for i, chunk in enumerate(super()._iter_chunks(r)):
+            if i == 1:
+                raise ConnectionError("connection lost")
+            yield chunk
+
+
+class TestNoHead(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_single_request(self):
+        content = os.urandom(100_000)
+        url = self.server.add_file(
+            '/file', content, headers={
+                'Content-Disposition': 'attachment; filename="named.bin"',
+            }
+        )
+        d = download.Download(url, destdir=self.tmp.name, head_request=False)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(d.url.size, len(content))
+        dest = Path(self.tmp.name) / 'named.bin'
+        self.assertEqual(dest.read_bytes(), content)
+        self.assertEqual([m for m, p, h in self.server.requests], ['GET'])
+
+    def test_text(self):
+        url = self.server.add_file(
+            '/page.html', b'<p>hi</p>', content_type='text/html'
+        )
+        d = download.Download(url, destdir=self.tmp.name, head_request=False)
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(out.getvalue(), '<p>hi</p>\n')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    def test_404(self):
+        url = self.server.url('/missing')
+        d = download.Download(url, destdir=self.tmp.name, head_request=False)
+        self.assertEqual(d.get(), 1)
+
+    def test_is_file(self):
+        url = self.server.add_file(
+            '/page.html', b'<p>hi</p>', content_type='text/html'
+        )
+        d = download.Download(url, destdir=self.tmp.name, is_file=True)
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(out.getvalue(), '')
+        dest = Path(self.tmp.name) / 'page.html'
+        self.assertEqual(dest.read_bytes(), b'<p>hi</p>')
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestServerConditions(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(300_000)
+
+    def test_chunked(self):
+        url = self.server.add_file('/file.bin', self.content, chunked=True)
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        dest = Path(self.tmp.name) / 'file.bin'
+        self.assertEqual(dest.read_bytes(), self.content)
+
+    def test_bandwidth(self):
+        url = self.server.add_file(
+            '/file.bin', self.content, bandwidth=1_000_000
+        )
+        d = download.Download(url, destdir=self.tmp.name)
+        start = time.monotonic()
+        self.assertEqual(d.get(), 0)
+        self.assertGreater(time.monotonic() - start, 0.25)
+        dest = Path(self.tmp.name) / 'file.bin'
+        self.assertEqual(dest.read_bytes(), self.content)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestPreallocation(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def get_part_size(self, **kwargs):
+        """Return the size of the .part file while 10 bytes are written."""
+        url = self.server.add_file('/file.bin', os.urandom(100_000), **kwargs)
+        d = download.Download(url, destdir=self.tmp.name)
+        d.url._ensure_head_response()
+        d._set_dest()
+        with d._open_part('wb') as f:
+            f.write(b'x' * 10)
+            f.flush()
+            return d.part.path.stat().st_size
+
+    def test_with_journal(self):
+        self.assertEqual(self.get_part_size(), 100_000)
+
+    def test_without_journal(self):
+        # A crash leaves a file whose size is what was written, so that it
+        # can be resumed with resume=True.
+        self.assertEqual(self.get_part_size(accept_ranges=False), 10)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(200_000)
+
+    def test_file(self):
+        url = self.server.add_file('/file.bin', self.content)
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        stats = d.stats.to_dict()
+        self.assertEqual(stats.get('status'), 0)
+        self.assertEqual(stats.get('final_url'), url)
+        self.assertEqual(stats.get('redirects'), [])
+        self.assertEqual(stats.get('size'), len(self.content))
+        self.assertEqual(stats.get('bytes_transferred'), len(self.content))
+        self.assertEqual(stats.get('resumed_bytes'), 0)
+        self.assertEqual(stats.get('retries'), 0)
+        self.assertGreater(stats.get('average_rate'), 0)
+        self.assertEqual(
+            set(stats.get('timings')),
+            {'head', 'ttfb', 'transfer', 'verify', 'total'},
+        )
+
+    def test_resumed(self):
+        url = self.server.add_file('/file.bin', self.content)
+        d = _InterruptedDownload(
+            url, destdir=self.tmp.name, chunk_size=10_000, retries=0
+        )
+        with self.assertRaises(SystemExit):
+            d.get()
+        self.assertEqual(d.stats.status, 1)
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        self.assertGreater(d.stats.resumed_bytes, 0)
+        self.assertEqual(
+            d.stats.resumed_bytes + d.stats.bytes_transferred,
+            len(self.content),
+        )
+
+    def test_failed(self):
+        d = download.Download(self.server.url('/missing'))
+        self.assertEqual(d.get(), 1)
+        self.assertEqual(d.stats.status, 1)
+        self.assertEqual(d.stats.bytes_transferred, 0)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        # Partly compressible, so the encoded data is still sizeable.
+        self.content = os.urandom(100_000) + b'net-dl ' * 30_000
+        self.encoded = gzip.compress(self.content)
+        self.dest = Path(self.tmp.name) / 'file.bin'
+
+    def get_headers(self, name):
+        return [h.get(name) for m, p, h in self.server.requests if m == 'GET']
+
+    def test_identity_by_default(self):
+        url = self.server.add_file('/file.bin', self.content, encoding='gzip')
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertEqual(self.get_headers('Accept-Encoding'), ['identity'])
+        self.assertEqual(d.stats.bytes_transferred, len(self.content))
+
+    def test_gzip(self):
+        url = self.server.add_file('/file.bin', self.content, encoding='gzip')
+        progress_queue = Queue()
+        d = download.Download(
+            url,
+            destdir=self.tmp.name,
+            compress=True,
+            progress_queue=progress_queue,
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertIn('gzip', self.get_headers('Accept-Encoding')[0])
+        self.assertEqual(d.url.size, len(self.encoded))
+        self.assertEqual(d.stats.bytes_transferred, len(self.encoded))
+        last = list(progress_queue.queue)[-1]
+        self.assertEqual(last.bytes_done, len(self.encoded))
+        self.assertEqual(last.percent, 100)
+
+    def test_already_downloaded(self):
+        url = self.server.add_file('/file.bin', self.content, encoding='gzip')
+        d = download.Download(url, destdir=self.tmp.name, compress=True)
+        self.assertEqual(d.get(), 0)
+        d = download.Download(url, destdir=self.tmp.name, compress=True)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(d.stats.bytes_transferred, 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+
+    def test_deflate_checksum(self):
+        url = self.server.add_file('/file.bin', self.content, encoding='deflate')  # noqa: E501
+        checksum = f"sha256:{hashlib.sha256(self.content).hexdigest()}"
+        d = download.Download(
+            url, destdir=self.tmp.name, compress=True, checksum=checksum
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+
+    def test_retry_restarts(self):
+        url = self.server.add_file(
+            '/file.bin',
+            self.content,
+            encoding='gzip',
+            faults=[('drop', 50_000)],
+        )
+        d = download.Download(
+            url,
+            destdir=self.tmp.name,
+            compress=True,
+            chunk_size=10_000,
+            retries=RetryPolicy(attempts=2, backoff=0.01),
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        # Decoded data can't be continued from an encoded offset.
+        self.assertEqual(self.get_headers('Range'), [None, None])
+        self.assertFalse(Path(f"{self.dest}.part.json").exists())
+
+    def test_text(self):
+        text = b'<p>net-dl</p>' * 1000
+        url = self.server.add_file(
+            '/page.html', text, content_type='text/html', encoding='gzip'
+        )
+        d = download.Download(url, destdir=self.tmp.name, compress=True)
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(out.getvalue(), f"{text.decode()}\n")
+        self.assertEqual(d.stats.bytes_transferred, len(gzip.compress(text)))
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.content = os.urandom(100_000)
+
+    def test_iter_content(self):
+        url = self.server.add_file('/file.bin', self.content)
+        d = download.Download(url, chunk_size=10_000)
+        chunks = list(d.iter_content())
+        self.assertEqual(b''.join(chunks), self.content)
+        self.assertEqual(max(len(c) for c in chunks), 10_000)
+        self.assertEqual(d.stats.bytes_transferred, len(self.content))
+
+    def test_stream_to(self):
+        url = self.server.add_file('/file.bin', self.content, chunked=True)
+        d = download.Download(url)
+        sink = BytesIO()
+        self.assertEqual(d.stream_to(sink), len(self.content))
+        self.assertEqual(sink.getvalue(), self.content)
+
+    def test_get_content(self):
+        url = self.server.add_file('/file.bin', self.content)
+        self.assertEqual(download.Download(url).get_content(), self.content)
+
+    def test_text_decoding(self):
+        # Odd-sized chunks split the two-byte characters.
+        text = 'naïve café ' * 10_000
+        url = self.server.add_file(
+            '/page.txt',
+            text.encode('utf-8'),
+            content_type='text/plain; charset=utf-8',
+        )
+        d = download.Download(url, chunk_size=999)
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(d.get(), 0)
+        self.assertEqual(out.getvalue(), f"{text}\n")
+
+    def test_text_without_charset(self):
+        text = 'héllo wörld'
+        url = self.server.add_file(
+            '/page.txt', text.encode('utf-8'), content_type='text/plain'
+        )
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(download.Download(url).get(), 0)
+        self.assertEqual(out.getvalue(), f"{text}\n")
+
+    def test_error_status(self):
+        url = self.server.url('/missing')
+        with self.assertRaises(HTTPStatusError):
+            list(download.Download(url).iter_content())
+
+    def tearDown(self):
+        self.server.stop()
+
+
+class TestPartFile(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(100_000)
+        self.dest = Path(self.tmp.name) / 'file.bin'
+        self.part = Path(self.tmp.name) / 'file.bin.part'
+        self.journal = Path(self.tmp.name) / 'file.bin.part.json'
+
+    def test_interrupted_resume(self):
+        url = self.server.add_file('/file.bin', self.content)
+        d = _InterruptedDownload(
+            url, destdir=self.tmp.name, chunk_size=10_000, retries=0
+        )
+        with self.assertRaises(SystemExit):
+            d.get()
+        self.assertFalse(self.dest.exists())
+        self.assertTrue(self.part.is_file())
+        self.assertTrue(self.journal.is_file())
+
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertFalse(self.part.exists())
+        self.assertFalse(self.journal.exists())
+        ranges = [h.get('Range') for m, p, h in self.server.requests]
+        self.assertIn('bytes=10000-99999', ranges)
+
+    def test_stale_journal(self):
+        url = self.server.add_file('/file.bin', self.content)
+        self.part.write_bytes(os.urandom(30_000))
+        Journal(
+            self.journal,
+            url=url,
+            size=len(self.content),
+            etag='"old"',
+            committed=30_000,
+        ).save()
+        d = download.Download(url, destdir=self.tmp.name)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertFalse(self.journal.exists())
+        ranges = [
+            h.get('Range') for m, p, h in self.server.requests if m == 'GET'
+        ]
+        self.assertEqual(ranges, [None])
+
+    def test_segmented_resume(self):
+        content = os.urandom(2 * config.SEGMENT_MIN_SIZE)
+        half = config.SEGMENT_MIN_SIZE
+        url = self.server.add_file('/file.bin', content)
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        # First segment done, second one not started.
+        self.part.write_bytes(content[:half] + bytes(half))
+        Journal(
+            self.journal,
+            url=url,
+            size=len(content),
+            etag=etag,
+            segments=[[0, half - 1, half], [half, 2 * half - 1, 0]],
+        ).save()
+        d = download.Download(url, destdir=self.tmp.name, segments=2)
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        ranges = [
+            h.get('Range') for m, p, h in self.server.requests if m == 'GET'
+        ]
+        self.assertEqual(ranges, [f'bytes={half}-{2 * half - 1}'])
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.urandom(200_000)
+        self.dest = Path(self.tmp.name) / 'file.bin'
+        self.retries = RetryPolicy(attempts=2, backoff=0.01)
+
+    def get_ranges(self):
+        return [
+            h.get('Range') for m, p, h in self.server.requests if m == 'GET'
+        ]
+
+    def test_reconnect_with_range(self):
+        url = self.server.add_file(
+            '/file.bin', self.content, faults=[('drop', 55_000)]
+        )
+        d = download.Download(
+            url,
+            destdir=self.tmp.name,
+            chunk_size=10_000,
+            retries=self.retries,
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertEqual(self.get_ranges(), [None, 'bytes=50000-199999'])
+        self.assertEqual(d.stats.retries, 1)
+        self.assertEqual(d.stats.bytes_transferred, len(self.content))
+
+    def test_retry_after(self):
+        url = self.server.add_file(
+            '/file.bin',
+            self.content,
+            faults=[('status', 503, {'Retry-After': '1'})],
+        )
+        d = download.Download(url, destdir=self.tmp.name, retries=self.retries)
+        start = time.monotonic()
+        self.assertEqual(d.get(), 0)
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+
+    def test_no_retry_on_client_error(self):
+        url = self.server.add_file(
+            '/file.bin', self.content, faults=[('status', 403, {})]
+        )
+        d = download.Download(url, destdir=self.tmp.name, retries=self.retries)
+        with self.assertRaises(SystemExit):
+            d.get()
+        self.assertEqual(len(self.get_ranges()), 1)
+        self.assertFalse(self.dest.exists())
+
+    def test_stall(self):
+        url = self.server.add_file(
+            '/file.bin', self.content, faults=[('stall', 50_000, 3)]
+        )
+        d = download.Download(
+            url,
+            destdir=self.tmp.name,
+            retries=self.retries,
+            speed_limit=1000,
+            speed_time=1,
+        )
+        start = time.monotonic()
+        self.assertEqual(d.get(), 0)
+        self.assertLess(time.monotonic() - start, 2.5)
+        self.assertEqual(self.dest.read_bytes(), self.content)
+        self.assertEqual(len(self.get_ranges()), 2)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from base64 import b64encode
+from pathlib import Path
+
+from src.net_dl import download
+from src.net_dl import extract
+from src.net_dl import store
+from src.net_dl.retry import RetryPolicy
+from .server import LocalServer
+
+
+def make_tar(members, mode='w:gz'):
+    """Return a tar archive of members, given as {name: data}; data may be
+    ('symlink', target) instead.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            if isinstance(data, tuple):
+                info.type = tarfile.SYMTYPE
+                info.linkname = data[1]
+                tar.addfile(info)
+                continue
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class _Unseekable(io.RawIOBase):
+    """Makes zipfile write data descriptors, as when zipping to a pipe."""
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def make_zip(members, seekable=True):
+    out = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            with z.open(name, 'w') as f:
+                f.write(data)
+    return out.getvalue() if seekable else out.buffer.getvalue()
+
+
+class TestStreamExtractor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name) / 'out'
+        self.members = {
+            'pkg/README': b'read me\n',
+            'pkg/data.bin': os.urandom(300_000),
+        }
+
+    def _extract(self, archive, chunk_size=4096):
+        extractor = extract.StreamExtractor(self.destdir, buffer_size=8192)
+        for i in range(0, len(archive), chunk_size):
+            extractor.write(archive[i:i + chunk_size])
+        return extractor.close()
+
+    def _check_members(self):
+        for name, data in self.members.items():
+            self.assertEqual((self.destdir / name).read_bytes(), data)
+
+    def test_tar(self):
+        for mode in ('w', 'w:gz', 'w:bz2', 'w:xz'):
+            with self.subTest(mode=mode):
+                archive = make_tar(self.members, mode=mode)
+                self.assertEqual(self._extract(archive), list(self.members))
+                self._check_members()
+
+    def test_zip(self):
+        for seekable in (True, False):
+            with self.subTest(seekable=seekable):
+                archive = make_zip(self.members, seekable=seekable)
+                self.assertEqual(self._extract(archive), list(self.members))
+                self._check_members()
+
+    def test_unsafe_paths(self):
+        archives = [
+            make_tar({'../evil': b'x'}),
+            make_tar({'/tmp/evil': b'x'}),
+            make_zip({'../evil': b'x'}),
+            make_tar({'link': ('symlink', '../..'), 'link/evil': b'x'}),
+        ]
+        for archive in archives:
+            with self.assertRaises(extract.ExtractError):
+                self._extract(archive)
+        self.assertFalse((Path(self.tmp.name) / 'evil').exists())
+
+    def test_internal_symlink(self):
+        self.members['pkg/link'] = ('symlink', 'README')
+        self._extract(make_tar(self.members))
+        self.assertEqual((self.destdir / 'pkg/link').read_bytes(), b'read me\n')  # noqa: E501
+
+    def test_invalid_archive(self):
+        for archive in (b'not an archive' * 100, make_tar(self.members)[:-20_000]):  # noqa: E501
+            with self.assertRaises(extract.ExtractError):
+                self._extract(archive)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestExtractDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name)
+        self.extract_to = self.destdir / 'unpacked'
+        self.members = {
+            'pkg/README': b'read me\n',
+            'pkg/data.bin': os.urandom(500_000),
+        }
+
+    def _check_members(self):
+        for name, data in self.members.items():
+            self.assertEqual((self.extract_to / name).read_bytes(), data)
+
+    def test_tar_gz(self):
+        url = self.server.add_file('/pkg.tar.gz', make_tar(self.members))
+        d = download.Download(
+            url, destdir=self.destdir, extract_to=self.extract_to
+        )
+        self.assertEqual(d.get(), 0)
+        self._check_members()
+        # The archive isn't kept by default.
+        self.assertEqual(sorted(os.listdir(self.destdir)), ['unpacked'])
+
+    def test_zip_keep_archive(self):
+        archive = make_zip(self.members)
+        url = self.server.add_file('/pkg.zip', archive)
+        d = download.Download(
+            url,
+            destdir=self.destdir,
+            extract_to=self.extract_to,
+            keep_archive=True,
+            segments=4,
+        )
+        self.assertEqual(d.get(), 0)
+        self._check_members()
+        self.assertEqual((self.destdir / 'pkg.zip').read_bytes(), archive)
+
+    def test_reconnect(self):
+        archive = make_tar(self.members, mode='w:xz')
+        url = self.server.add_file(
+            '/pkg.tar.xz', archive, faults=[('drop', 100_000)]
+        )
+        d = download.Download(
+            url,
+            destdir=self.destdir,
+            extract_to=self.extract_to,
+            chunk_size=10_000,
+            retries=RetryPolicy(attempts=2, backoff=0.01),
+        )
+        self.assertEqual(d.get(), 0)
+        self._check_members()
+        ranges = [
+            h.get('Range') for c, p, h in self.server.requests if c == 'GET'
+        ]
+        self.assertEqual(ranges, [None, f'bytes=100000-{len(archive) - 1}'])
+
+    def test_existing_archive(self):
+        archive = make_tar(self.members)
+        (self.destdir / 'pkg.tar.gz').write_bytes(archive)
+        url = self.server.add_file('/pkg.tar.gz', archive)
+        d = download.Download(
+            url, destdir=self.destdir, extract_to=self.extract_to
+        )
+        self.assertEqual(d.get(), 0)
+        self._check_members()
+        self.assertEqual(d.stats.bytes_transferred, 0)
+
+    def test_unsafe_archive(self):
+        archive = make_tar({'../evil': b'x', **self.members})
+        url = self.server.add_file('/pkg.tar.gz', archive)
+        d = download.Download(
+            url, destdir=self.destdir, extract_to=self.extract_to
+        )
+        with self.assertRaises(SystemExit):
+            d.get()
+        self.assertFalse((self.destdir / 'evil').exists())
+        # Nothing is left to resume.
+        self.assertFalse((self.destdir / 'pkg.tar.gz.part').exists())
+        self.assertFalse((self.destdir / 'pkg.tar.gz.part.json').exists())
+
+    def test_from_store(self):
+        archive = make_tar(self.members)
+        md5 = b64encode(hashlib.md5(archive).digest()).decode()
+        url = self.server.add_file(
+            '/pkg.tar.gz', archive, headers={'Content-MD5': md5}
+        )
+        content_store = store.ContentStore(self.destdir / 'store')
+        d = download.Download(url, destdir=self.destdir, store=content_store)
+        self.assertEqual(d.get(), 0)
+        (self.destdir / 'pkg.tar.gz').unlink()
+        d = download.Download(
+            url,
+            destdir=self.destdir,
+            store=content_store,
+            extract_to=self.extract_to,
+        )
+        self.assertEqual(d.get(), 0)
+        self._check_members()
+        self.assertEqual(d.stats.bytes_transferred, 0)
+        self.assertEqual(sorted(os.listdir(self.destdir)), ['store', 'unpacked'])  # noqa: E501
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from src.net_dl import group
+from src.net_dl import read_url_list
+from .server import LocalServer
+
+
+class TestDownloadGroup(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def test_group(self):
+        contents = {f'/file{i}.bin': os.urandom(2048) for i in range(5)}
+        urls = [self.server.add_file(p, c) for p, c in contents.items()]
+        g = group.DownloadGroup(urls, workers=3, destdir=self.tmp.name)
+        self.assertEqual(g.get(), 0)
+        self.assertEqual(set(g.results.values()), {0})
+        for p, c in contents.items():
+            dest = Path(self.tmp.name) / p.lstrip('/')
+            self.assertEqual(dest.read_bytes(), c)
+
+    def test_text_saved_as_file(self):
+        pages = {f'/page{i}.html': b'<p>net-dl</p>' * 100 for i in range(3)}
+        urls = [
+            self.server.add_file(p, c, content_type='text/html')
+            for p, c in pages.items()
+        ]
+        g = group.DownloadGroup(urls, destdir=self.tmp.name)
+        with redirect_stdout(StringIO()) as out:
+            self.assertEqual(g.get(), 0)
+        self.assertEqual(out.getvalue(), '')
+        for p, c in pages.items():
+            dest = Path(self.tmp.name) / p.lstrip('/')
+            self.assertEqual(dest.read_bytes(), c)
+
+    def test_group_failure(self):
+        urls = [
+            self.server.add_file('/file.bin', os.urandom(2048)),
+            self.server.url('/missing.bin'),
+        ]
+        g = group.DownloadGroup(urls, destdir=self.tmp.name)
+        self.assertEqual(g.get(), 1)
+        self.assertEqual(g.results.get(urls[0]), 0)
+        self.assertEqual(g.results.get(urls[1]), 1)
+
+    def test_read_url_list(self):
+        f = Path(self.tmp.name) / 'urls.txt'
+        f.write_text(
+            "# comment\nhttps://a.example/1\n\n  https://b.example/2\n"
+        )
+        self.assertEqual(
+            read_url_list(f),
+            ['https://a.example/1', 'https://b.example/2']
+        )
+
+    def test_read_url_list_mirrors(self):
+        f = Path(self.tmp.name) / 'urls.txt'
+        f.write_text("https://a.example/1\thttps://b.example/1\n")
+        self.assertEqual(
+            read_url_list(f),
+            [('https://a.example/1', 'https://b.example/1')]
+        )
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,52 @@
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+import src.net_dl
+
+HEAVY_MODULES = ('aiohttp', 'requests', 'urllib3')
+
+
+def get_heavy_modules(code):
+    """Return the heavy modules loaded by running code in a new interpreter.
+    """
+    check = (
+        f"{code}\n"
+        "import json, sys\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"  # noqa: E501
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', check],
+        cwd=Path(__file__).parents[1],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import(self):
+        self.assertEqual(get_heavy_modules("import src.net_dl"), [])
+
+    def test_version(self):
+        code = (
+            "import sys; sys.argv = ['net-dl', '--version']\n"
+            "import src.net_dl\n"
+            "try:\n"
+            "    src.net_dl.main()\n"
+            "except SystemExit:\n"
+            "    pass"
+        )
+        self.assertEqual(get_heavy_modules(code), [])
+
+    def test_exports(self):
+        from src.net_dl import download
+        self.assertIs(src.net_dl.Download, download.Download)
+        for name in src.net_dl.__all__:
+            self.assertIn(name, dir(src.net_dl))
+            self.assertIsNotNone(getattr(src.net_dl, name))
+        with self.assertRaises(AttributeError):
+            src.net_dl.missing
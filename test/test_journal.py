@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl.journal import Journal
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _Url:
+    def __init__(self, path, size, headers):
+        self.path = path
+        self.size = size
+        self.head_response = _Response(headers)
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'file.bin.part.json'
+        self.url = 'http://example.com/file.bin'
+
+    def test_save_load(self):
+        Journal(self.path, url=self.url, size=10, etag='"a"', committed=4).save()  # noqa: E501
+        j = Journal.load(self.path)
+        self.assertEqual(j.url, self.url)
+        self.assertEqual(j.get_committed_size(), 4)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [self.path])
+        j.remove()
+        self.assertIsNone(Journal.load(self.path))
+
+    def test_segments(self):
+        j = Journal(self.path, segments=[[0, 4, 5], [5, 9, 2]])
+        self.assertEqual(j.get_committed_size(), 7)
+
+    def test_unreadable(self):
+        self.path.write_text('{')
+        self.assertIsNone(Journal.load(self.path))
+
+    def test_matches(self):
+        j = Journal(self.path, url=self.url, size=10, etag='"a"')
+        self.assertTrue(j.matches(_Url(self.url, 10, {'ETag': '"a"'})))
+        self.assertFalse(j.matches(_Url(self.url, 10, {'ETag': '"b"'})))
+        self.assertFalse(j.matches(_Url(self.url, 11, {'ETag': '"a"'})))
+        j = Journal(self.path, url=self.url, size=10)
+        self.assertFalse(j.matches(_Url(self.url, 10, {})))
+
+    def tearDown(self):
+        self.tmp.cleanup()
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import manifest
+from .server import LocalServer
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestParseManifest(unittest.TestCase):
+    def test_gnu(self):
+        m = manifest.Manifest.parse(
+            f"# comment\n{'ab' * 32}  a.iso\n{'CD' * 32} *sub/b file.bin\n\n"
+        )
+        self.assertEqual(m.entries, [
+            ('a.iso', 'sha256', 'ab' * 32),
+            ('sub/b file.bin', 'sha256', 'cd' * 32),
+        ])
+
+    def test_bsd(self):
+        m = manifest.Manifest.parse(f"MD5 (a.iso) = {'ab' * 16}\n")
+        self.assertEqual(m.entries, [('a.iso', 'md5', 'ab' * 16)])
+
+    def test_invalid_lines(self):
+        m = manifest.Manifest.parse(
+            f"not a checksum\n{'ab' * 20}  sha1.bin\n{'ab' * 16}  a.iso\n",
+            algorithm='sha256',
+        )
+        self.assertEqual(m.entries, [])
+
+    def test_algorithm_from_filename(self):
+        self.assertEqual(manifest._get_algorithm_from_name('SHA512SUMS'), 'sha512')  # noqa: E501
+        self.assertIsNone(manifest._get_algorithm_from_name('CHECKSUMS'))
+
+    def test_unsafe_names(self):
+        m = manifest.Manifest()
+        for name in ('../a.iso', '/etc/passwd', 'sub/../../a.iso'):
+            self.assertIsNone(m.get_path(name, '/tmp/dest'))
+        self.assertEqual(
+            m.get_path('sub/a.iso', '/tmp/dest'),
+            Path('/tmp/dest/sub/a.iso')
+        )
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name)
+        self.contents = {
+            'ok.bin': os.urandom(4096),
+            'missing.bin': os.urandom(4096),
+            'corrupt.bin': os.urandom(4096),
+            'sub/nested.bin': os.urandom(4096),
+        }
+        for name, data in self.contents.items():
+            self.server.add_file(f'/files/{name}', data)
+        text = ''.join(
+            f"{sha256(data)}  {name}\n" for name, data in self.contents.items()
+        )
+        text += f"{'ab' * 32}  ../outside.bin\n"
+        self.manifest_url = self.server.add_file('/files/SHA256SUMS', text.encode())  # noqa: E501
+        (self.destdir / 'ok.bin').write_bytes(self.contents.get('ok.bin'))
+        (self.destdir / 'corrupt.bin').write_bytes(b'x' * 4096)
+
+    def test_verify(self):
+        m = manifest.Manifest.load(self.manifest_url)
+        self.assertEqual(m.verify(self.destdir, workers=2), {
+            'ok.bin': 'ok',
+            'missing.bin': 'missing',
+            'corrupt.bin': 'mismatch',
+            'sub/nested.bin': 'missing',
+            '../outside.bin': 'invalid',
+        })
+
+    def test_get(self):
+        m = manifest.Manifest.load(self.manifest_url)
+        self.assertEqual(m.get(self.destdir, verify_workers=2), 1)
+        self.assertEqual(m.results, {
+            'ok.bin': 'ok',
+            'missing.bin': 'downloaded',
+            'corrupt.bin': 'downloaded',
+            'sub/nested.bin': 'downloaded',
+            '../outside.bin': 'invalid',
+        })
+        for name, data in self.contents.items():
+            self.assertEqual((self.destdir / name).read_bytes(), data)
+        self.assertFalse((self.destdir.parent / 'outside.bin').exists())
+        # Files that were already correct aren't downloaded again.
+        got = [p for c, p, h in self.server.requests if c == 'GET']
+        self.assertNotIn('/files/ok.bin', got)
+        self.assertEqual(len(m.stats), 3)
+
+    def test_get_without_url(self):
+        path = self.destdir / 'SHA256SUMS'
+        path.write_text(f"{sha256(self.contents.get('ok.bin'))}  ok.bin\n")
+        m = manifest.Manifest.load(path)
+        self.assertEqual(m.get(self.destdir), 0)
+        self.assertEqual(m.results, {'ok.bin': 'ok'})
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from queue import Queue
+
+from src.net_dl import config
+from src.net_dl import download
+from src.net_dl import group
+from .server import LocalServer
+
+
+class TestMirrors(unittest.TestCase):
+    def setUp(self):
+        self.servers = [LocalServer().start() for i in range(2)]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / 'file.bin'
+
+    def get_gets(self, server):
+        return [h.get('Range') for m, p, h in server.requests if m == 'GET']
+
+    def get(self, content, faults=(None, None), segments=1):
+        urls = [
+            server.add_file('/file.bin', content, faults=f)
+            for server, f in zip(self.servers, faults)
+        ]
+        d = download.Download(
+            urls[0],
+            mirrors=urls[1:],
+            destdir=self.tmp.name,
+            progress_queue=Queue(),
+            segments=segments,
+        )
+        return d.get()
+
+    def test_spread_segments(self):
+        content = os.urandom(4 * config.SEGMENT_MIN_SIZE)
+        self.assertEqual(self.get(content), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        for server in self.servers:
+            gets = self.get_gets(server)
+            self.assertTrue(gets)
+            self.assertTrue(all(r.startswith('bytes=') for r in gets))
+
+    def test_segment_failover(self):
+        content = os.urandom(4 * config.SEGMENT_MIN_SIZE)
+        faults = ([('status', 500, {})] * 20, None)
+        self.assertEqual(self.get(content, faults), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        # The Range request that measured its rate, and one segment.
+        self.assertEqual(len(self.get_gets(self.servers[0])), 2)
+
+    def test_rank_by_rate(self):
+        content = os.urandom(config.SEGMENT_MIN_SIZE)
+        slow = self.servers[0].add_file(
+            '/file.bin', content, bandwidth=config.MIRROR_PROBE_SIZE
+        )
+        fast = self.servers[1].add_file('/file.bin', content)
+        d = download.Download(
+            slow,
+            mirrors=[fast],
+            destdir=self.tmp.name,
+            progress_queue=Queue(),
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        self.assertEqual([str(u) for u in d.sources], [fast, slow])
+        # Only the rate was measured on the slow mirror.
+        self.assertEqual(
+            self.get_gets(self.servers[0]),
+            [f'bytes=0-{config.MIRROR_PROBE_SIZE - 1}'],
+        )
+
+    def test_stream_failover(self):
+        content = os.urandom(100_000)
+        faults = ([('status', 503, {})], None)
+        self.assertEqual(self.get(content, faults), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+
+    def test_primary_missing(self):
+        content = os.urandom(100_000)
+        url = self.servers[1].add_file('/file.bin', content)
+        d = download.Download(
+            self.servers[0].url('/file.bin'),
+            mirrors=[url],
+            destdir=self.tmp.name,
+            progress_queue=Queue(),
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+
+    def test_different_file(self):
+        content = os.urandom(4 * config.SEGMENT_MIN_SIZE)
+        url = self.servers[0].add_file('/file.bin', content)
+        other = self.servers[1].add_file('/file.bin', content[:-1])
+        d = download.Download(
+            url,
+            mirrors=[other],
+            destdir=self.tmp.name,
+            progress_queue=Queue(),
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        self.assertEqual(self.get_gets(self.servers[1]), [])
+
+    def test_unknown_size(self):
+        content = os.urandom(100_000)
+        urls = [
+            s.add_file('/file.bin', content, chunked=True)
+            for s in self.servers
+        ]
+        d = download.Download(
+            urls[0],
+            mirrors=urls[1:],
+            destdir=self.tmp.name,
+            progress_queue=Queue(),
+        )
+        self.assertEqual(d.get(), 0)
+        self.assertEqual(self.dest.read_bytes(), content)
+        # The mirror can't be compared, so only the URL itself is used.
+        self.assertEqual(d.sources, [d.url])
+        self.assertEqual(self.get_gets(self.servers[1]), [])
+
+    def test_group(self):
+        content = os.urandom(100_000)
+        urls = tuple(s.add_file('/file.bin', content) for s in self.servers)
+        g = group.DownloadGroup([urls], destdir=self.tmp.name)
+        self.assertEqual(g.get(), 0)
+        self.assertEqual(g.results, {urls[0]: 0})
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,34 @@
+import unittest
+
+from src.net_dl import progress
+
+
+class TestProgress(unittest.TestCase):
+    def test_percent(self):
+        self.assertEqual(progress.Progress(50, 200).percent, 25)
+        self.assertIsNone(progress.Progress(50, None).percent)
+        self.assertEqual(progress.Progress(50, None, done=True).percent, 100)
+
+    def test_format(self):
+        self.assertEqual(progress.format_size(999), '999 B')
+        self.assertEqual(progress.format_size(1_500_000), '1.5 MB')
+        self.assertEqual(progress.format_time(75), '1:15')
+        self.assertEqual(progress.format_time(3725), '1:02:05')
+
+
+class TestProgressMeter(unittest.TestCase):
+    def test_throttle(self):
+        meter = progress.ProgressMeter(total=1000, interval=60)
+        events = [meter.update(1) for i in range(1000)]
+        self.assertEqual(events, [None] * 1000)
+        final = meter.finish()
+        self.assertTrue(final.done)
+        self.assertEqual(final.bytes_done, 1000)
+        self.assertEqual(final.percent, 100)
+        self.assertEqual(final.eta, 0)
+
+    def test_no_throttle(self):
+        meter = progress.ProgressMeter(total=1000, initial=500, interval=0)
+        event = meter.update(100)
+        self.assertEqual(event.bytes_done, 600)
+        self.assertEqual(event.percent, 60)
@@ -1,5 +1,7 @@
+import hashlib
 import requests
 import unittest
+from base64 import b64encode
 from pathlib import Path
 
 import src.net_dl
@@ -29,6 +31,16 @@ class TestLocalFile(unittest.TestCase):
         self.assertIsNotNone(self.p.size)
         self.assertEqual(self.p.size, len(self.f_text))
 
+    def test_digest(self):
+        self.assertEqual(
+            self.p.get_digest('sha256'),
+            hashlib.sha256(self.f_text.encode()).hexdigest()
+        )
+        self.assertEqual(
+            self.p.get_md5(),
+            b64encode(hashlib.md5(self.f_text.encode()).digest()).decode()
+        )
+
     def test_mtime(self):
         old = self.p.get_mtime()
         self.assertIsNotNone(old)
@@ -75,6 +87,14 @@ class TestUrl(unittest.TestCase):
             )
 
 
+class TestContentEncoding(unittest.TestCase):
+    def test_encoding(self):
+        get_encoding = src.net_dl.props.Url.get_content_encoding
+        self.assertEqual(get_encoding({'Content-Encoding': 'GZIP'}), 'gzip')
+        for headers in ({}, {'Content-Encoding': 'identity'}):
+            self.assertIsNone(get_encoding(headers))
+
+
 class TestContentDispositionName(unittest.TestCase):
     def test_dropbox(self):
         # TODO: Find a more permanent URL?
@@ -0,0 +1,39 @@
+import threading
+import unittest
+from time import monotonic
+
+from src.net_dl import ratelimit
+
+
+class TestParseRate(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(ratelimit.parse_rate('2M'), 2 * 1024**2)
+        self.assertEqual(ratelimit.parse_rate('500k'), 500 * 1024)
+        self.assertEqual(ratelimit.parse_rate('1.5KB/s'), 1536)
+        self.assertEqual(ratelimit.parse_rate(1000), 1000)
+        for rate in ('fast', '0', '-1M'):
+            with self.assertRaises(ValueError):
+                ratelimit.parse_rate(rate)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_shared(self):
+        limiter = ratelimit.RateLimiter(100_000, burst=10_000)
+
+        def consume():
+            for i in range(10):
+                limiter.consume(1_000)
+
+        start = monotonic()
+        threads = [threading.Thread(target=consume) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 40 kB at 100 kB/s after a 10 kB burst takes at least 0.3 s.
+        self.assertGreaterEqual(monotonic() - start, 0.28)
+
+    def test_reserve(self):
+        limiter = ratelimit.RateLimiter(1000, burst=1000)
+        self.assertEqual(limiter.reserve(1000), 0)
+        self.assertAlmostEqual(limiter.reserve(500), 0.5, places=1)
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import recursive
+from .server import LocalServer
+
+
+def listing(*names):
+    links = ''.join(f'<a href="{n}">{n}</a>\n' for n in names)
+    return (
+        '<html><body><a href="?C=N;O=D">Name</a>\n'
+        f'<a href="../">Parent Directory</a>\n{links}</body></html>'
+    ).encode()
+
+
+class TestRecursiveDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destdir = Path(self.tmp.name)
+        self.contents = {
+            'a.iso': os.urandom(4096),
+            'notes.txt': b'some notes\n',
+            'sub/b.iso': os.urandom(4096),
+            'sub/deeper/c.iso': os.urandom(4096),
+            'skip/d.iso': os.urandom(4096),
+        }
+        for name, data in self.contents.items():
+            content_type = 'text/plain' if name.endswith('.txt') else 'application/octet-stream'  # noqa: E501
+            self.server.add_file(f'/pub/{name}', data, content_type=content_type)  # noqa: E501
+        pages = {
+            '/pub/': listing('a.iso', 'notes.txt', 'sub/', 'skip/'),
+            '/pub/sub/': listing('b.iso', 'deeper/', '/elsewhere/'),
+            '/pub/sub/deeper/': listing('c.iso'),
+            '/pub/skip/': listing('d.iso'),
+        }
+        for path, page in pages.items():
+            self.server.add_file(path, page, content_type='text/html; charset=utf-8')  # noqa: E501
+        self.url = self.server.url('/pub/')
+
+    def _get_paths(self):
+        return sorted(
+            p.relative_to(self.destdir).as_posix()
+            for p in self.destdir.rglob('*') if p.is_file()
+        )
+
+    def test_mirror(self):
+        r = recursive.RecursiveDownload(self.url, destdir=self.destdir)
+        self.assertEqual(r.get(), 0)
+        self.assertEqual(self._get_paths(), sorted(self.contents))
+        for name, data in self.contents.items():
+            self.assertEqual((self.destdir / name).read_bytes(), data)
+        self.assertEqual(len(r.stats), len(self.contents))
+
+    def test_depth_and_patterns(self):
+        r = recursive.RecursiveDownload(
+            self.url[:-1],  # a trailing slash is added
+            destdir=self.destdir,
+            depth=1,
+            include=['*.iso'],
+            exclude=['skip'],
+        )
+        self.assertEqual(r.get(), 0)
+        self.assertEqual(self._get_paths(), ['a.iso', 'sub/b.iso'])
+
+    def test_skips_current_files(self):
+        recursive.RecursiveDownload(self.url, destdir=self.destdir).get()
+        changed = self.destdir / 'a.iso'
+        changed.write_bytes(b'x' * 4096)
+        os.utime(changed, (0, 0))
+        self.server.requests.clear()
+        r = recursive.RecursiveDownload(self.url, destdir=self.destdir)
+        self.assertEqual(r.get(), 0)
+        self.assertEqual(len(r.skipped), len(self.contents) - 1)
+        got = [p for c, p, h in self.server.requests if c == 'GET']
+        self.assertIn('/pub/a.iso', got)
+        self.assertNotIn('/pub/sub/b.iso', got)
+        self.assertEqual(
+            (self.destdir / 'a.iso').read_bytes(), self.contents.get('a.iso')
+        )
+
+    def test_keeps_outdated_file_on_failure(self):
+        recursive.RecursiveDownload(self.url, destdir=self.destdir).get()
+        outdated = self.destdir / 'a.iso'
+        outdated.write_bytes(b'x' * 4096)
+        os.utime(outdated, (0, 0))
+        self.server.add_file(
+            '/pub/a.iso',
+            self.contents.get('a.iso'),
+            faults=[('status', 404, {})],
+        )
+        r = recursive.RecursiveDownload(self.url, destdir=self.destdir)
+        self.assertEqual(r.get(), 1)
+        self.assertEqual(outdated.read_bytes(), b'x' * 4096)
+
+    def test_missing_listing(self):
+        r = recursive.RecursiveDownload(
+            self.server.url('/missing/'), destdir=self.destdir
+        )
+        self.assertEqual(r.get(), 1)
+        self.assertEqual(r.files, {})
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,52 @@
+import time
+import unittest
+from email.utils import formatdate
+
+from src.net_dl import retry
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_backoff(self):
+        policy = retry.RetryPolicy(attempts=3, backoff=1, max_delay=3, jitter=False)  # noqa: E501
+        delays = [policy.get_delay(i) for i in range(1, 5)]
+        self.assertEqual(delays, [1, 2, 3, None])
+
+    def test_jitter(self):
+        policy = retry.RetryPolicy(attempts=1, backoff=2)
+        self.assertTrue(1 <= policy.get_delay(1) <= 2)
+
+    def test_retry_after(self):
+        policy = retry.RetryPolicy(attempts=1, backoff=1, jitter=False)
+        self.assertEqual(policy.get_delay(1, retry_after='5'), 5)
+        self.assertEqual(policy.get_delay(1, retry_after='soon'), 1)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(retry.parse_retry_after('120'), 120)
+        self.assertIsNone(retry.parse_retry_after(None))
+        date = formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(retry.parse_retry_after(date), 30, delta=2)
+        date = formatdate(time.time() - 30, usegmt=True)
+        self.assertEqual(retry.parse_retry_after(date), 0)
+
+    def test_get_retry_policy(self):
+        policy = retry.RetryPolicy()
+        self.assertIs(retry.get_retry_policy(policy), policy)
+        self.assertEqual(retry.get_retry_policy(None).attempts, 0)
+        self.assertEqual(retry.get_retry_policy(3).attempts, 3)
+
+
+class TestStallDetector(unittest.TestCase):
+    def test_stall(self):
+        detector = retry.StallDetector(speed_limit=1000, speed_time=0.1)
+        time.sleep(0.15)
+        with self.assertRaises(retry.StallError):
+            detector.update(10)
+
+    def test_idle_time_ignored(self):
+        detector = retry.StallDetector(speed_limit=1000, speed_time=0.1)
+        time.sleep(0.15)
+        detector.update(10, idle=0.15)
+
+    def test_disabled(self):
+        detector = retry.StallDetector(speed_limit=0, speed_time=0)
+        detector.update(0)
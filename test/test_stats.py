@@ -0,0 +1,45 @@
+import json
+import unittest
+from datetime import timedelta
+
+from src.net_dl.stats import DownloadStats
+
+
+class _Response:
+    def __init__(self, seconds):
+        self.elapsed = timedelta(seconds=seconds)
+
+
+class TestDownloadStats(unittest.TestCase):
+    def test_average_rate(self):
+        stats = DownloadStats('http://example.com/file')
+        self.assertEqual(stats.average_rate, 0.0)
+        stats.add_bytes(1000)
+        stats.add_bytes(1000)
+        stats.add_time('transfer', 1.5)
+        stats.add_time('transfer', 0.5)
+        self.assertEqual(stats.average_rate, 1000)
+
+    def test_first_ttfb(self):
+        stats = DownloadStats()
+        stats.record_response(_Response(0.25))
+        stats.record_response(_Response(2))
+        self.assertEqual(stats.timings.get('ttfb'), 0.25)
+
+    def test_timer(self):
+        stats = DownloadStats()
+        with self.assertRaises(ValueError):
+            with stats.timer('verify'):
+                raise ValueError
+        self.assertIn('verify', stats.timings)
+
+    def test_to_json(self):
+        stats = DownloadStats('http://example.com/file')
+        stats.add_rate(500.0)
+        stats.add_rate(100.0)
+        line = stats.to_json()
+        self.assertNotIn('\n', line)
+        data = json.loads(line)
+        self.assertEqual(data.get('url'), 'http://example.com/file')
+        self.assertEqual(data.get('peak_rate'), 500.0)
+        self.assertIsNone(data.get('status'))
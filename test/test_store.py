@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from base64 import b64encode
+from pathlib import Path
+from queue import Queue
+
+from src.net_dl import download
+from src.net_dl import store
+from .server import LocalServer
+
+
+class TestContentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_dir = Path(self.tmp.name) / 'store'
+        self.src = Path(self.tmp.name) / 'src.bin'
+
+    def add(self, s, content, algorithms=('sha256',)):
+        # A new file, as the last one is hardlinked into the store.
+        self.src.unlink(missing_ok=True)
+        self.src.write_bytes(content)
+        keys = [(a, hashlib.new(a, content).hexdigest()) for a in algorithms]
+        s.add(keys, self.src)
+        return keys[0]
+
+    def test_add_find(self):
+        s = store.ContentStore(self.store_dir)
+        content = os.urandom(1000)
+        key = self.add(s, content)
+        obj = s.find([('md5', '0' * 32), key], size=1000)
+        self.assertEqual(obj.read_bytes(), content)
+        self.assertIsNone(s.find([key], size=999))  # and it's removed
+        self.assertIsNone(s.find([key]))
+
+    def test_modified(self):
+        s = store.ContentStore(self.store_dir)
+        key = self.add(s, os.urandom(1000))
+        s.get_path(*key).write_bytes(os.urandom(1000))
+        self.assertIsNone(s.find([key]))
+        self.assertFalse(s.get_path(*key).exists())
+
+    def test_evict(self):
+        s = store.ContentStore(self.store_dir, max_size=2500)
+        keys = [self.add(s, os.urandom(1000)) for i in range(3)]
+        self.assertFalse(s.get_path(*keys[0]).exists())
+        self.assertTrue(s.get_path(*keys[2]).exists())
+        self.assertEqual(len(store.ContentStore(self.store_dir).entries), 2)
+
+    def test_evict_hardlinks(self):
+        s = store.ContentStore(self.store_dir, max_size=2500)
+        keys = [
+            self.add(s, os.urandom(1000), algorithms=('sha256', 'md5'))
+            for i in range(2)
+        ]
+        # Each file counts once, though it's stored under two keys.
+        self.assertEqual(len(s.entries), 4)
+        self.assertTrue(s.get_path(*keys[0]).exists())
+
+    def test_link_or_copy(self):
+        self.src.write_bytes(b'data')
+        dest = Path(self.tmp.name) / 'dest.bin'
+        dest.write_bytes(b'old')
+        store.link_or_copy(self.src, dest)
+        self.assertEqual(dest.read_bytes(), b'data')
+        self.assertTrue(os.path.samefile(self.src, dest))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestDownloadStore(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = store.ContentStore(Path(self.tmp.name) / 'store')
+        self.content = os.urandom(50_000)
+        md5 = b64encode(hashlib.md5(self.content).digest()).decode()
+        self.headers = {'Content-MD5': md5}
+
+    def get(self, path, destdir):
+        url = self.server.add_file(path, self.content, headers=self.headers)
+        d = download.Download(
+            url,
+            destdir=Path(self.tmp.name) / destdir,
+            progress_queue=Queue(),
+            store=self.store,
+        )
+        d.destdir.mkdir()
+        return d.get()
+
+    def test_dedup(self):
+        self.assertEqual(self.get('/a/file.bin', 'one'), 0)
+        self.assertEqual(self.get('/b/file.bin', 'two'), 0)
+        gets = [p for m, p, h in self.server.requests if m == 'GET']
+        self.assertEqual(gets, ['/a/file.bin'])
+        first = Path(self.tmp.name) / 'one' / 'file.bin'
+        second = Path(self.tmp.name) / 'two' / 'file.bin'
+        self.assertEqual(second.read_bytes(), self.content)
+        self.assertTrue(os.path.samefile(first, second))
+
+    def test_no_digest(self):
+        self.headers = dict()
+        self.assertEqual(self.get('/a/file.bin', 'one'), 0)
+        self.assertEqual(self.get('/b/file.bin', 'two'), 0)
+        gets = [p for m, p, h in self.server.requests if m == 'GET']
+        self.assertEqual(len(gets), 2)
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.net_dl import writer
+
+
+class TestFileWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'file.bin'
+
+    def test_coalesce(self):
+        with writer.FileWriter(self.path, buffer_size=100) as f:
+            for i in range(10):
+                f.write(b'x' * 30)
+                self.assertEqual(f.tell(), 30 * (i + 1))
+            # Only whole buffers have reached the file so far.
+            self.assertEqual(self.path.stat().st_size, 240)
+        self.assertEqual(self.path.read_bytes(), b'x' * 300)
+
+    def test_preallocate_and_trim(self):
+        with writer.FileWriter(self.path, size=1000) as f:
+            self.assertEqual(self.path.stat().st_size, 1000)
+            f.write(b'a' * 400)
+        self.assertEqual(self.path.read_bytes(), b'a' * 400)
+        with writer.FileWriter(self.path, mode='ab', size=1000) as f:
+            self.assertEqual(f.tell(), 400)
+            f.write(b'b' * 600)
+        self.assertEqual(self.path.read_bytes(), b'a' * 400 + b'b' * 600)
+
+    def test_positional(self):
+        writer.allocate(self.path, 10)
+        with writer.FileWriter(self.path, mode='r+b', offset=5) as f:
+            f.write(b'56789')
+        with writer.FileWriter(self.path, mode='r+b') as f:
+            f.write(b'01234')
+        self.assertEqual(self.path.read_bytes(), b'0123456789')
+
+    def test_fsync_interval(self):
+        with writer.FileWriter(self.path, buffer_size=1, fsync=10) as f:
+            f.write(os.urandom(25))
+            self.assertEqual(f._unsynced, 0)
+            f.write(os.urandom(5))
+            self.assertEqual(f._unsynced, 5)
+
+    def test_parse_fsync(self):
+        self.assertEqual(writer.parse_fsync('END'), 'end')
+        self.assertEqual(writer.parse_fsync('none'), 'none')
+        self.assertEqual(writer.parse_fsync('64M'), 64 * 1024**2)
+        self.assertEqual(writer.parse_fsync(4096), 4096)
+        with self.assertRaises(ValueError):
+            writer.parse_fsync('sometimes')
+
+    def tearDown(self):
+        self.tmp.cleanup()